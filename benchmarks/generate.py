@@ -0,0 +1,196 @@
+# Генератор синтетических GLB-файлов для бенчмарков.
+#
+# Структура файла задается числом материалов, текстур, изображений и мешей
+# и размером BIN-чанка. Связи устроены так, чтобы замена текстур проходила
+# по всем веткам GLBTexturesRepository:
+# - текстуры с номерами от images и выше ссылаются на уже занятые изображения
+#   (общие изображения - _change_texture_in_material);
+# - материалы с номерами от textures и выше ссылаются на уже занятые текстуры
+#   (общие текстуры - _change_texture_in_material);
+# - остальные материалы с текстурой владеют ею единолично
+#   (_add_image_to_texture);
+# - каждый седьмой материал без текстуры (_add_texture_map_to_material).
+#
+# Пример:
+#     python -m benchmarks.generate /tmp/model.glb --materials 2000 --bin-mb 64
+import argparse
+import os
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Настройки приложения читаются при импорте src, а эти переменные обязательны.
+os.environ.setdefault("UVICORN_PORT", "9596")
+os.environ.setdefault("UVICORN_WORKERS", "1")
+
+from src.data.glb import BinChunk, write_glb  # noqa: E402
+
+UNSIGNED_BYTE = 5121
+FLOAT = 5126
+ARRAY_BUFFER = 34962
+
+# Треугольник - вершины одного меша.
+_TRIANGLE = struct.pack("<9f", 0, 0, 0, 1, 0, 0, 0, 1, 0)
+
+
+@dataclass
+class ModelSpec:
+    materials: int = 20
+    textures: int = 15
+    images: int = 10
+    meshes: int = 20
+    bin_bytes: int = 1024 * 1024
+    image_size: int = 64
+
+
+def make_png(size: int, seed: int) -> bytes:
+    """Однотонное изображение size x size в формате PNG (без Pillow)."""
+    color = bytes(((seed * 67) % 256, (seed * 131) % 256, (seed * 197) % 256))
+    row = b"\x00" + color * size
+    raw = row * size
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def material_name(index: int) -> str:
+    return f"Material_{index:05d}"
+
+
+def has_texture(material_index: int) -> bool:
+    return material_index % 7 != 6
+
+
+def generate(filepath: str, spec: ModelSpec) -> None:
+    bin_chunk = BinChunk()
+    document = {
+        "asset": {"version": "2.0", "generator": "glb-editor benchmarks"},
+        "scene": 0,
+        "scenes": [{"nodes": list(range(spec.meshes))}],
+        "nodes": [],
+        "meshes": [],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+        "images": [],
+        "samplers": [{}],
+        "textures": [],
+        "materials": [],
+    }
+
+    def add_buffer_view(data: bytes, **extra) -> int:
+        offset = bin_chunk.append_bytes(data)
+        document["bufferViews"].append(
+            {"buffer": 0, "byteOffset": offset, "byteLength": len(data), **extra}
+        )
+        return len(document["bufferViews"]) - 1
+
+    positions = add_buffer_view(_TRIANGLE, target=ARRAY_BUFFER)
+    document["accessors"].append(
+        {
+            "bufferView": positions,
+            "componentType": FLOAT,
+            "count": 3,
+            "type": "VEC3",
+            "max": [1, 1, 0],
+            "min": [0, 0, 0],
+        }
+    )
+
+    for image_index in range(spec.images):
+        document["images"].append(
+            {
+                "name": f"image_{image_index}",
+                "mimeType": "image/png",
+                "bufferView": add_buffer_view(make_png(spec.image_size, image_index)),
+            }
+        )
+    for texture_index in range(spec.textures):
+        document["textures"].append(
+            {"sampler": 0, "source": texture_index % max(spec.images, 1)}
+        )
+    for material_index in range(spec.materials):
+        material = {
+            "name": material_name(material_index),
+            "pbrMetallicRoughness": {
+                "baseColorFactor": [1.0, 1.0, 1.0, 1.0],
+                "metallicFactor": 0.0,
+                "roughnessFactor": 0.5,
+            },
+        }
+        if spec.textures and has_texture(material_index):
+            material["pbrMetallicRoughness"]["baseColorTexture"] = {
+                "index": material_index % spec.textures
+            }
+        document["materials"].append(material)
+    for mesh_index in range(spec.meshes):
+        document["meshes"].append(
+            {
+                "primitives": [
+                    {
+                        "attributes": {"POSITION": 0},
+                        "material": mesh_index % max(spec.materials, 1),
+                    }
+                ]
+            }
+        )
+        document["nodes"].append({"mesh": mesh_index})
+
+    # Остаток BIN-чанка - "геометрия": данные accessor, на который не
+    # ссылается ни один меш (на сам bufferView ссылается accessor, поэтому
+    # сжатие файла его не удаляет).
+    filler = spec.bin_bytes - bin_chunk.length
+    if filler > 0:
+        document["accessors"].append(
+            {
+                "bufferView": add_buffer_view(bytes(filler)),
+                "componentType": UNSIGNED_BYTE,
+                "count": filler,
+                "type": "SCALAR",
+            }
+        )
+    document["buffers"].append({"byteLength": bin_chunk.length})
+
+    document = {key: value for key, value in document.items() if value != []}
+    write_glb(filepath, document, bin_chunk)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синтетический GLB-файл")
+    parser.add_argument("filepath")
+    parser.add_argument("--materials", type=int, default=ModelSpec.materials)
+    parser.add_argument("--textures", type=int, default=ModelSpec.textures)
+    parser.add_argument("--images", type=int, default=ModelSpec.images)
+    parser.add_argument("--meshes", type=int, default=ModelSpec.meshes)
+    parser.add_argument("--bin-mb", type=float, default=ModelSpec.bin_bytes / 2**20)
+    parser.add_argument("--image-size", type=int, default=ModelSpec.image_size)
+    args = parser.parse_args()
+    generate(
+        args.filepath,
+        ModelSpec(
+            materials=args.materials,
+            textures=args.textures,
+            images=args.images,
+            meshes=args.meshes,
+            bin_bytes=int(args.bin_mb * 2**20),
+            image_size=args.image_size,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Бенчмарки правки параметров и текстур.
+#
+# Для каждого размера модели (см. PRESETS) генерируется синтетический GLB-файл
+# (benchmarks/generate), после чего change_parameters и change_textures
+# выполняются по iterations раз. Каждый случай запускается в отдельном
+# процессе, чтобы пиковая память (ru_maxrss) относилась только к нему.
+# Методы репозиториев вызываются напрямую, без HTTP и пула процессов.
+#
+# Каждая итерация пишет результат в свою директорию, иначе хранилище
+# результатов (data/results) вернуло бы уже записанный файл. Кэши исходных
+# файлов и текстур при этом работают так же, как в приложении; --cold
+# отключает их, чтобы измерить первую правку файла.
+#
+# Пример:
+#     python -m benchmarks.run --presets small medium --output before.json
+#     python -m benchmarks.run --presets small medium --compare before.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("UVICORN_PORT", "9596")
+os.environ.setdefault("UVICORN_WORKERS", "1")
+
+from benchmarks.generate import (ModelSpec, generate,  # noqa: E402
+                                 has_texture, make_png, material_name)
+
+PRESETS = {
+    "small": ModelSpec(
+        materials=20, textures=15, images=10, meshes=20,
+        bin_bytes=1 * 2**20, image_size=64,
+    ),
+    "medium": ModelSpec(
+        materials=500, textures=300, images=200, meshes=1000,
+        bin_bytes=32 * 2**20, image_size=128,
+    ),
+    "large": ModelSpec(
+        materials=5000, textures=2000, images=1000, meshes=10000,
+        bin_bytes=256 * 2**20, image_size=256,
+    ),
+}
+OPERATIONS = ("parameters", "textures")
+
+
+def run_case(
+    operation: str, spec: ModelSpec, iterations: int, changed: int, cold: bool
+) -> dict:
+    """Выполняется в отдельном процессе: настройки читаются при импорте src."""
+    if cold:
+        os.environ["SOURCE_CACHE_MAX_BYTES"] = "0"
+        os.environ["TEXTURE_CACHE_MAX_BYTES"] = "0"
+        os.environ["DIGEST_CACHE_MAX_ENTRIES"] = "0"
+
+    from src.core import metrics
+    from src.data.repositories import (GLBParamsRepository,
+                                       GLBTexturesRepository)
+    from src.domain.entities import (PropertiesData, TexturesData,
+                                     _SingleTextureChange)
+
+    workdir = tempfile.mkdtemp(prefix="glbeditor-bench-")
+    try:
+        source_filepath = os.path.join(workdir, "model.glb")
+        generate(source_filepath, spec)
+        texture_filepaths = []
+        for texture_number in range(2):
+            texture_filepath = os.path.join(workdir, f"texture_{texture_number}.png")
+            with open(texture_filepath, "wb") as texture_file:
+                texture_file.write(make_png(spec.image_size, 1000 + texture_number))
+            texture_filepaths.append(texture_filepath)
+
+        names = [material_name(index) for index in range(min(changed, spec.materials))]
+        textured_names = [
+            material_name(index)
+            for index in range(spec.materials)
+            if not spec.textures or has_texture(index) or index < changed
+        ][:changed]
+
+        def make_request(iteration: int):
+            result_filepath = os.path.join(workdir, "results", str(iteration))
+            if operation == "parameters":
+                factor = (iteration % 100) / 100
+                return PropertiesData(
+                    source_filepath=source_filepath,
+                    result_filepath=result_filepath,
+                    materials=[
+                        {"name": name, "pbrMetallicRoughness": {"baseColorFactor": [factor, 0, 0, 1]}}
+                        for name in names
+                    ],
+                )
+            return TexturesData(
+                source_glbfilepath=source_filepath,
+                result_filepath=result_filepath,
+                files=[
+                    _SingleTextureChange(
+                        texturefilepath=texture_filepaths[iteration % 2],
+                        materials=[
+                            {"name": name, "pbrMetallicRoughness": {"baseColorTexture": {}}}
+                            for name in textured_names
+                        ],
+                    )
+                ],
+            )
+
+        if operation == "parameters":
+            execute = GLBParamsRepository()._change_parameters
+        else:
+            execute = GLBTexturesRepository()._change_textures
+
+        latencies = []
+        stages = {}
+        # Первая итерация - прогрев (импорт модулей, заполнение кэшей),
+        # в результаты не входит.
+        for iteration in range(iterations + 1):
+            request = make_request(iteration)
+            record = metrics.start_record()
+            started_at = time.perf_counter()
+            result = execute(request)
+            elapsed = time.perf_counter() - started_at
+            shutil.rmtree(request.result_filepath, ignore_errors=True)
+            if iteration == 0:
+                continue
+            latencies.append(elapsed)
+            for name, seconds in record.stages.items():
+                stages.setdefault(name, []).append(seconds)
+        assert result["status"] == "Готово", result
+
+        return {
+            "source_bytes": os.path.getsize(source_filepath),
+            "iterations": iterations,
+            "latency_ms": _summarize(latencies),
+            "stages_ms": {
+                name: round(statistics.fmean(values) * 1000, 3)
+                for name, values in stages.items()
+            },
+            "throughput_per_second": round(iterations / sum(latencies), 3),
+            "peak_rss_bytes": metrics.get_peak_rss_bytes(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _summarize(latencies: list) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(share: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))
+        return ordered[index]
+
+    return {
+        name: round(value * 1000, 3)
+        for name, value in (
+            ("min", ordered[0]),
+            ("mean", statistics.fmean(ordered)),
+            ("p50", percentile(0.50)),
+            ("p90", percentile(0.90)),
+            ("p99", percentile(0.99)),
+            ("max", ordered[-1]),
+        )
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_comparison(results: list, baseline_filepath: str) -> None:
+    with open(baseline_filepath, encoding="utf-8") as baseline_file:
+        baseline = {
+            (case["preset"], case["operation"]): case
+            for case in json.load(baseline_file)["results"]
+        }
+    print(f"\nСравнение с {baseline_filepath} (p50, мс):")
+    for case in results:
+        previous = baseline.get((case["preset"], case["operation"]))
+        if previous is None:
+            continue
+        before = previous["latency_ms"]["p50"]
+        after = case["latency_ms"]["p50"]
+        change = (after - before) / before * 100 if before else 0.0
+        print(
+            f"  {case['preset']:>8} {case['operation']:<10} "
+            f"{before:10.3f} -> {after:10.3f} ({change:+.1f}%)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки правки GLB-файлов")
+    parser.add_argument("--presets", nargs="+", choices=PRESETS, default=["small", "medium"])
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--changed", type=int, default=50, help="сколько материалов изменяется")
+    parser.add_argument("--cold", action="store_true", help="отключить кэши")
+    parser.add_argument(
+        "--output", help="файл JSON с результатами, по умолчанию benchmarks/results/<время>.json"
+    )
+    parser.add_argument("--compare", help="файл JSON предыдущего запуска")
+    args = parser.parse_args()
+
+    # spawn: каждый случай начинается в чистом процессе, с собственным
+    # пиком памяти и без унаследованных кэшей.
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for preset in args.presets:
+        for operation in args.operations:
+            with context.Pool(1) as pool:
+                case = pool.apply(
+                    run_case,
+                    (operation, PRESETS[preset], args.iterations, args.changed, args.cold),
+                )
+            case = {"preset": preset, "operation": operation, **case}
+            results.append(case)
+            latency = case["latency_ms"]
+            print(
+                f"{preset:>8} {operation:<10} p50 {latency['p50']:9.3f} мс"
+                f"  p99 {latency['p99']:9.3f} мс"
+                f"  {case['throughput_per_second']:9.2f} оп/с"
+                f"  RSS {case['peak_rss_bytes'] / 2**20:7.1f} МБ"
+            )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cold": args.cold,
+        "changed": args.changed,
+        "presets": {preset: asdict(PRESETS[preset]) for preset in args.presets},
+        "results": results,
+    }
+    output_filepath = args.output or os.path.join(
+        ROOT, "benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_filepath)), exist_ok=True)
+    with open(output_filepath, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {output_filepath}")
+    if args.compare:
+        _print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
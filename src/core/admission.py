@@ -0,0 +1,117 @@
+# Допуск задач в пул процессов по бюджету памяти.
+#
+# Пиковая память задачи зависит от размера исходного файла, файлов текстур
+# и способа правки: загрузка BIN-чанка средствами pygltflib и кодирование
+# изображений в DataURI требуют памяти в несколько раз больше размера файла.
+# Несколько одновременных правок больших моделей могут исчерпать память
+# сервера, поэтому каждая задача перед отправкой в пул получает оценку
+# пиковой памяти (см. data/memory) и ждет, пока бюджет не освободится.
+#
+# Ожидающие задачи допускаются строго в порядке поступления: большая задача
+# не пропускает вперед маленькие, и поэтому не ждет бесконечно.
+#
+# Бюджет (settings.memory.budget_bytes) общий на все воркеры uvicorn и делится
+# между ними поровну: каждый воркер распоряжается своей долей независимо,
+# без обмена состоянием с остальными.
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Tuple
+
+from src.core import metrics
+from src.core.settings import settings
+
+
+class MemoryAdmission:
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._admitted_bytes = 0
+        self._running = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @asynccontextmanager
+    async def admit(self, estimated_bytes: int) -> AsyncIterator[None]:
+        """
+        Ожидает, пока в бюджете не освободится estimated_bytes, и занимает их
+        до выхода из контекста. Задача, оценка которой больше всего бюджета,
+        выполняется, когда других задач нет.
+        """
+        if self.budget_bytes <= 0:
+            yield
+            return
+        estimated_bytes = min(estimated_bytes, self.budget_bytes)
+        if not self._waiters and self._fits(estimated_bytes):
+            self._take(estimated_bytes)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append((estimated_bytes, waiter))
+            try:
+                with metrics.stage("admission"):
+                    await waiter
+            except asyncio.CancelledError:
+                if waiter.cancelled():
+                    # Задачу отменили до допуска (например, клиент разорвал
+                    # соединение): ее место в очереди освобождается.
+                    if (estimated_bytes, waiter) in self._waiters:
+                        self._waiters.remove((estimated_bytes, waiter))
+                    self._wake_up()
+                else:
+                    # Бюджет уже был выделен - возвращаем его.
+                    self._release(estimated_bytes)
+                raise
+        try:
+            yield
+        finally:
+            self._release(estimated_bytes)
+
+    def stats(self) -> dict:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "admitted_bytes": self._admitted_bytes,
+            "running": self._running,
+            "waiting": len(self._waiters),
+        }
+
+    def _fits(self, estimated_bytes: int) -> bool:
+        return self._admitted_bytes + estimated_bytes <= self.budget_bytes
+
+    def _take(self, estimated_bytes: int) -> None:
+        self._admitted_bytes += estimated_bytes
+        self._running += 1
+
+    def _release(self, estimated_bytes: int) -> None:
+        self._admitted_bytes -= estimated_bytes
+        self._running -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        while self._waiters:
+            estimated_bytes, waiter = self._waiters[0]
+            if waiter.cancelled():
+                self._waiters.popleft()
+                continue
+            if not self._fits(estimated_bytes):
+                break
+            self._waiters.popleft()
+            self._take(estimated_bytes)
+            waiter.set_result(None)
+
+
+memory_admission = MemoryAdmission(
+    settings.memory.budget_bytes // max(settings.uvicorn.workers, 1)
+)
+metrics.register_gauge(
+    "glbeditor_memory_budget_bytes",
+    "Бюджет памяти задач пула воркера uvicorn.",
+    lambda: memory_admission.budget_bytes,
+)
+metrics.register_gauge(
+    "glbeditor_memory_admitted_bytes",
+    "Сумма оценок памяти выполняющихся задач пула воркера uvicorn.",
+    lambda: memory_admission.stats()["admitted_bytes"],
+)
+metrics.register_gauge(
+    "glbeditor_memory_waiting_tasks",
+    "Задач пула, ожидающих освобождения бюджета памяти.",
+    lambda: memory_admission.stats()["waiting"],
+)
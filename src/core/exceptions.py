@@ -16,3 +16,9 @@ class GLBEditorException(HTTPException):
         status_code = status_code or self.default_status_code
         detail = detail or self.default_detail
         super().__init__(status_code, detail, headers)
+
+    def __reduce__(self):
+        # Исключение может возникнуть в процессе из пула и должно пережить
+        # передачу в родительский процесс. HTTPException не передает свои
+        # аргументы в Exception.__init__, поэтому восстанавливаем их явно.
+        return self.__class__, (self.status_code, self.detail, self.headers)
@@ -0,0 +1,120 @@
+# Пул процессов, в котором выполняется вся тяжелая работа с GLB-файлами:
+# чтение, разбор, редактирование и запись. Обработчики запросов только
+# ожидают результат, поэтому цикл событий воркера uvicorn продолжает
+# принимать запросы, пока модель обрабатывается, а сам воркер может
+# задействовать сразу несколько ядер.
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import status
+
+from src.core import metrics
+from src.core.admission import memory_admission
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Статистика (например, кэшей) живет в процессах пула. Каждый процесс
+# возвращает ее снимок вместе с результатом задачи, а родительский процесс
+# хранит последний снимок каждого процесса пула.
+_stats_providers: Dict[str, Callable[[], dict]] = {}
+_workers_stats: Dict[int, Dict[str, dict]] = {}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    # Пул создается лениво - при первом обращении, уже внутри воркера uvicorn,
+    # а не при импорте модуля в родительском процессе.
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.pool.workers)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        _workers_stats.clear()
+
+
+def register_stats_provider(name: str, provider: Callable[[], dict]) -> None:
+    """
+    Регистрирует функцию, возвращающую словарь числовых счетчиков. Вызывается
+    при импорте модуля, поэтому провайдер доступен и в процессах пула.
+    """
+    _stats_providers[name] = provider
+
+
+def get_workers_stats() -> dict:
+    """Счетчики всех провайдеров, просуммированные по процессам пула."""
+    totals = {}
+    for worker_stats in _workers_stats.values():
+        for name, counters in worker_stats.items():
+            total = totals.setdefault(name, {})
+            for counter, value in counters.items():
+                total[counter] = total.get(counter, 0) + value
+    return {"workers": len(_workers_stats), **totals}
+
+
+def _call_with_stats(func: Callable, args: tuple):
+    record = metrics.start_record() if settings.metrics.enabled else None
+    # Пик памяти процесса сбрасывается перед задачей, чтобы сравнить
+    # фактическую память задачи с ее оценкой (см. core/admission).
+    rss_before = metrics.reset_peak_rss() if record is not None else None
+    result = func(*args)
+    if record is not None:
+        record.add_value("peak_rss_bytes", metrics.get_peak_rss_bytes())
+        if rss_before is not None:
+            record.add_value(
+                "memory_used_bytes",
+                max(metrics.get_rss_high_water_bytes() - rss_before, 0),
+            )
+    stats = {name: provider() for name, provider in _stats_providers.items()}
+    return result, os.getpid(), stats, record
+
+
+async def run_in_pool(func: Callable, *args, memory_bytes: int = 0) -> Any:
+    """
+    Выполняет func(*args) в пуле процессов и возвращает результат.
+    Функция и аргументы должны сериализоваться pickle: это функции и методы
+    уровня модуля и датаклассы из domain/entities.
+
+    memory_bytes - оценка пиковой памяти задачи (см. data/memory): задача
+    отправляется в пул, только когда она укладывается в бюджет памяти.
+    """
+    global _executor
+    loop = asyncio.get_running_loop()
+    try:
+        # Этап "pool" - все время задачи в пуле, включая ожидание свободного
+        # процесса; этапы внутри задачи измеряются в самом процессе пула.
+        async with memory_admission.admit(memory_bytes):
+            with metrics.stage("pool"):
+                result, pid, stats, record = await loop.run_in_executor(
+                    get_executor(), _call_with_stats, func, args
+                )
+    except BrokenProcessPool:
+        # Если один из процессов пула аварийно завершился (например, его
+        # убил OOM killer), пул становится непригодным. Пересоздаем его
+        # при следующем запросе, а текущему сообщаем об ошибке.
+        _executor = None
+        _workers_stats.clear()
+        raise GLBEditorException(
+            detail="Процесс обработки файла аварийно завершился",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    _workers_stats[pid] = stats
+    if record is not None and "memory_used_bytes" in record.values:
+        metrics.observe_memory(
+            func.__name__.lstrip("_"),
+            memory_bytes,
+            record.values["memory_used_bytes"],
+        )
+    request_record = metrics.get_record()
+    if record is not None and request_record is not None:
+        request_record.merge(record)
+    return result
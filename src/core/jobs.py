@@ -0,0 +1,263 @@
+# Асинхронные задания. В асинхронном режиме (settings.jobs.enabled) обработчик
+# запроса не ждет записи итогового файла: задание ставится в ограниченную
+# очередь, клиент сразу получает идентификатор задания и затем опрашивает его
+# состояние. Так долгие правки текстур не упираются в таймауты обратного
+# прокси, а всплеск нагрузки не копит в памяти неограниченное число ожидающих
+# запросов - при переполненной очереди новые задания отклоняются.
+#
+# Очередь и исполнители живут в каждом воркере uvicorn, а состояние заданий
+# записывается в небольшие JSON-файлы общей директории: запрос состояния может
+# попасть в любой воркер, не только в тот, что принял задание.
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from fastapi import status
+
+from src.core import metrics
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+INTERRUPTED_ERROR = "Задание прервано остановкой сервера, повторите запрос"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = QUEUED
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    status_code: Optional[int] = None
+    error: Any = None
+    # Процесс воркера, выполняющего задание.
+    pid: Optional[int] = None
+    # Длительности этапов выполнения (см. core/metrics), секунд.
+    stages: Dict[str, float] = field(default_factory=dict)
+    # Длительности этапов правки, итоговый файл которой уже был записан.
+    replayed_stages: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        job = asdict(self)
+        # Длительности ожидания в очереди и выполнения, секунд.
+        now = time.time()
+        job["queued_seconds"] = round((self.started_at or now) - self.created_at, 3)
+        if self.started_at is not None:
+            job["running_seconds"] = round(
+                (self.finished_at or now) - self.started_at, 3
+            )
+        return job
+
+
+class JobManager:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._runners: List[asyncio.Task] = []
+        self._last_cleanup = 0.0
+
+    def submit(self, kind: str, run: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Ставит задание в очередь. run - функция без аргументов, возвращающая
+        корутину с результатом задания (ответом соответствующего use case).
+        """
+        self._start()
+        job = Job(
+            id=uuid.uuid4().hex, kind=kind, created_at=time.time(), pid=os.getpid()
+        )
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise GLBEditorException(
+                detail="Очередь заданий переполнена, повторите запрос позже",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.jobs.retry_after)},
+            )
+        self._save(job)
+        self._cleanup()
+        return job
+
+    @staticmethod
+    def get(job_id: str) -> dict:
+        # Идентификатор - шестнадцатеричная строка uuid4, иначе из него
+        # можно было бы собрать путь за пределами директории заданий.
+        try:
+            job_id = uuid.UUID(hex=job_id).hex
+            with open(_get_job_filepath(job_id), "rb") as job_file:
+                return orjson.loads(job_file.read())
+        except (ValueError, FileNotFoundError):
+            raise GLBEditorException(
+                detail='Задание "%s" не найдено' % job_id,
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+    async def shutdown(self) -> None:
+        # Прерванные исполнители сами отмечают свои задания невыполненными,
+        # а оставшиеся в очереди задания уже некому выполнить.
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                job, _ = self._queue.get_nowait()
+                _interrupt(job)
+                self._save(job)
+        self._queue = None
+
+    def recover(self) -> None:
+        """
+        Отмечает невыполненными ожидающие и выполняющиеся задания, воркер
+        которых завершился, не успев их выполнить (например, был убит).
+        Вызывается при запуске воркера.
+        """
+        if not os.path.isdir(settings.jobs.directory):
+            return
+        with os.scandir(settings.jobs.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path, "rb") as job_file:
+                        job = Job(**_get_fields(orjson.loads(job_file.read())))
+                except (FileNotFoundError, orjson.JSONDecodeError, TypeError):
+                    continue
+                if job.status in (QUEUED, RUNNING) and not _is_alive(job.pid):
+                    _interrupt(job)
+                    self._save(job)
+
+    def _start(self) -> None:
+        # Очередь и исполнители создаются лениво - внутри цикла событий
+        # воркера uvicorn.
+        if self._queue is not None:
+            return
+        os.makedirs(settings.jobs.directory, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=settings.jobs.queue_size)
+        self._runners = [
+            asyncio.create_task(self._run_jobs())
+            for _ in range(settings.jobs.concurrency)
+        ]
+
+    async def _run_jobs(self) -> None:
+        while True:
+            job, run = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._save(job)
+            # Исполнитель создан в контексте первого запроса, поставившего
+            # задание, поэтому метрики каждого задания записываются отдельно.
+            record = metrics.start_record()
+            try:
+                job.result = await run()
+                job.status = DONE
+            except GLBEditorException as e:
+                job.status = FAILED
+                job.status_code = e.status_code
+                job.error = e.detail
+            except Exception as e:
+                job.status = FAILED
+                job.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+                job.error = f"Exception occurred: {e}"
+            except asyncio.CancelledError:
+                _interrupt(job)
+                raise
+            finally:
+                job.finished_at = time.time()
+                job.stages = record.stages
+                job.replayed_stages = record.replayed_stages
+                metrics.observe_request(
+                    f"job:{job.kind}", record, job.finished_at - job.started_at
+                )
+                self._save(job)
+                self._queue.task_done()
+
+    @staticmethod
+    def _save(job: Job) -> None:
+        # Запись через временный файл: читающий воркер никогда не увидит
+        # наполовину записанное состояние.
+        filepath = _get_job_filepath(job.id)
+        temp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with open(temp_filepath, "wb") as job_file:
+            job_file.write(orjson.dumps(job.to_dict()))
+        os.replace(temp_filepath, filepath)
+
+    def _cleanup(self) -> None:
+        # Состояния завершенных (done, failed) заданий удаляются, когда
+        # с момента завершения прошло settings.jobs.result_ttl, - не чаще
+        # раза в минуту. Ожидающие и выполняющиеся задания не удаляются,
+        # сколько бы они ни ждали.
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        with os.scandir(settings.jobs.directory) as entries:
+            for entry in entries:
+                try:
+                    # Состояние записывается при завершении задания, поэтому
+                    # недавно измененные файлы можно не читать.
+                    if now - entry.stat().st_mtime <= settings.jobs.result_ttl:
+                        continue
+                    if entry.name.endswith(".json") and not _is_expired(
+                        entry.path, now
+                    ):
+                        continue
+                    # Остальное - устаревшие временные файлы _save.
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def _is_expired(filepath: str, now: float) -> bool:
+    try:
+        with open(filepath, "rb") as job_file:
+            job = orjson.loads(job_file.read())
+    except orjson.JSONDecodeError:
+        return False
+    return (
+        job.get("status") in (DONE, FAILED)
+        and job.get("finished_at") is not None
+        and now - job["finished_at"] > settings.jobs.result_ttl
+    )
+
+
+def _interrupt(job: Job) -> None:
+    job.status = FAILED
+    job.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    job.error = INTERRUPTED_ERROR
+    job.finished_at = time.time()
+
+
+def _get_fields(job: dict) -> dict:
+    # В файле состояния кроме полей Job есть вычисляемые длительности.
+    return {name: job[name] for name in Job.__dataclass_fields__ if name in job}
+
+
+def _is_alive(pid: Optional[int]) -> bool:
+    # Новый воркер может получить идентификатор процесса завершившегося,
+    # но своих заданий до запуска у него еще нет.
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _get_job_filepath(job_id: str) -> str:
+    return os.path.join(settings.jobs.directory, f"{job_id}.json")
+
+
+job_manager = JobManager()
@@ -0,0 +1,294 @@
+# Метрики обработки запросов: длительности этапов (загрузка, правка, запись
+# и т.д.), прочитанные и записанные байты, число измененных материалов
+# и текстур, пиковая память процессов пула.
+#
+# Этапы измеряются там, где выполняются, - чаще всего в процессе пула. Каждая
+# задача пула собирает свою запись метрик и возвращает ее вместе с результатом
+# (см. core/executor), а воркер uvicorn добавляет ее к записи текущего запроса.
+# По завершении запроса запись попадает в гистограммы (/glbeditor/metrics)
+# и в заголовок ответа Server-Timing.
+#
+# Гистограммы живут в каждом воркере uvicorn отдельно.
+import resource
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from src.core.settings import settings
+
+# Значения, которые при объединении записей не суммируются, а берется
+# наибольшее.
+_MAX_VALUES = {"peak_rss_bytes"}
+
+
+@dataclass
+class MetricsRecord:
+    # Суммарная длительность каждого этапа, секунд.
+    stages: Dict[str, float] = field(default_factory=dict)
+    # Прочие значения: bytes_read, bytes_written, materials_changed и т.д.
+    values: Dict[str, float] = field(default_factory=dict)
+    # Этапы правки, итоговый файл которой уже был записан (см.
+    # data/results.load_replay), - длительности исходной правки. Отдаются
+    # клиенту, но не попадают в гистограммы: заново эти этапы не выполнялись.
+    replayed_stages: Dict[str, float] = field(default_factory=dict)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_value(self, name: str, value: float) -> None:
+        if name in _MAX_VALUES:
+            self.values[name] = max(self.values.get(name, 0), value)
+        else:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def merge(self, other: "MetricsRecord") -> None:
+        for name, seconds in other.stages.items():
+            self.add_stage(name, seconds)
+        for name, value in other.values.items():
+            self.add_value(name, value)
+        for name, seconds in other.replayed_stages.items():
+            self.replayed_stages[name] = self.replayed_stages.get(name, 0.0) + seconds
+
+
+_current_record: ContextVar[Optional[MetricsRecord]] = ContextVar(
+    "metrics_record", default=None
+)
+
+
+def start_record() -> MetricsRecord:
+    """Начинает запись метрик текущего запроса (или задачи пула)."""
+    record = MetricsRecord()
+    _current_record.set(record)
+    return record
+
+
+def get_record() -> Optional[MetricsRecord]:
+    return _current_record.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Измеряет длительность этапа name и добавляет ее к текущей записи."""
+    record = _current_record.get()
+    if record is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add_stage(name, time.perf_counter() - started_at)
+
+
+def add_value(name: str, value: float) -> None:
+    record = _current_record.get()
+    if record is not None:
+        record.add_value(name, value)
+
+
+def replay_stages(stages: Dict[str, float]) -> None:
+    """Добавляет к текущей записи этапы ранее выполненной правки."""
+    record = _current_record.get()
+    if record is not None:
+        for name, seconds in stages.items():
+            record.replayed_stages[name] = (
+                record.replayed_stages.get(name, 0.0) + seconds
+            )
+
+
+def get_peak_rss_bytes() -> int:
+    # Наибольший размер резидентной памяти процесса за все время его работы
+    # (в Linux ru_maxrss - в килобайтах). Это дешево, в отличие от
+    # tracemalloc, но отражает пик процесса, а не одного запроса.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss() -> Optional[int]:
+    """
+    Сбрасывает пик резидентной памяти процесса (Linux: /proc/self/clear_refs),
+    чтобы затем get_rss_high_water_bytes вернул пик одной задачи пула.
+
+    Returns:
+        Optional[int]: текущий размер резидентной памяти процесса, байт;
+        None - если сброс недоступен.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return _read_proc_status("VmRSS")
+    except OSError:
+        return None
+
+
+def get_rss_high_water_bytes() -> int:
+    """Пик резидентной памяти процесса с последнего reset_peak_rss, байт."""
+    return _read_proc_status("VmHWM")
+
+
+def _read_proc_status(field_name: str) -> int:
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith(field_name + ":"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field_name} отсутствует в /proc/self/status")
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # Метка -> (счетчики корзин, сумма, число наблюдений).
+        self._series: Dict[str, Tuple[list, float, int]] = {}
+
+    def observe(self, label: str, value: float) -> None:
+        counts, total, count = self._series.get(
+            label, ([0] * (len(self.buckets) + 1), 0.0, 0)
+        )
+        counts[bisect_left(self.buckets, value)] += 1
+        self._series[label] = (counts, total + value, count + 1)
+
+    def render(self, label_name: str) -> str:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(
+                    f'{self.name}_bucket{{{label_name}="{label}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {count}')
+        return "\n".join(lines)
+
+
+_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(13))  # 1 КБ - 16 ГБ
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+_RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.25, 1.5, 2, 3, 5, 10)
+
+_lock = threading.Lock()
+_request_seconds = Histogram(
+    "glbeditor_request_duration_seconds",
+    "Длительность обработки запроса.",
+    _SECONDS_BUCKETS,
+)
+_stage_seconds = Histogram(
+    "glbeditor_stage_duration_seconds",
+    "Длительность этапа обработки запроса.",
+    _SECONDS_BUCKETS,
+)
+_value_histograms = {
+    "bytes_read": Histogram(
+        "glbeditor_read_bytes", "Байт прочитано с диска за запрос.", _BYTES_BUCKETS
+    ),
+    "bytes_written": Histogram(
+        "glbeditor_written_bytes", "Байт записано на диск за запрос.", _BYTES_BUCKETS
+    ),
+    "materials_changed": Histogram(
+        "glbeditor_materials_changed", "Материалов изменено за запрос.", _COUNT_BUCKETS
+    ),
+    "textures_added": Histogram(
+        "glbeditor_textures_added",
+        "Изображений текстур добавлено за запрос.",
+        _COUNT_BUCKETS,
+    ),
+    "bytes_saved": Histogram(
+        "glbeditor_compaction_saved_bytes",
+        "Байт сэкономлено сжатием итогового файла за запрос.",
+        _BYTES_BUCKETS,
+    ),
+    "peak_rss_bytes": Histogram(
+        "glbeditor_pool_peak_rss_bytes",
+        "Пиковая резидентная память процесса пула, выполнявшего запрос.",
+        _BYTES_BUCKETS,
+    ),
+}
+
+# Оценка пиковой памяти задач пула и фактический прирост памяти процесса
+# пула (см. core/admission) - по видам задач, для подстройки оценки.
+_memory_histograms = (
+    Histogram(
+        "glbeditor_memory_estimated_bytes",
+        "Оценка пиковой памяти задачи пула.",
+        _BYTES_BUCKETS,
+    ),
+    Histogram(
+        "glbeditor_memory_used_bytes",
+        "Прирост пиковой резидентной памяти процесса пула за задачу.",
+        _BYTES_BUCKETS,
+    ),
+    Histogram(
+        "glbeditor_memory_estimate_ratio",
+        "Отношение фактической памяти задачи пула к ее оценке.",
+        _RATIO_BUCKETS,
+    ),
+)
+# Текущие значения (например, занятая часть бюджета памяти): имя ->
+# (описание, функция, возвращающая значение).
+_gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+
+def register_gauge(name: str, description: str, getter: Callable[[], float]) -> None:
+    _gauges[name] = (description, getter)
+
+
+def observe_memory(kind: str, estimated_bytes: int, used_bytes: int) -> None:
+    if not settings.metrics.enabled or estimated_bytes <= 0:
+        return
+    estimated, used, ratio = _memory_histograms
+    with _lock:
+        estimated.observe(kind, estimated_bytes)
+        used.observe(kind, used_bytes)
+        ratio.observe(kind, used_bytes / estimated_bytes)
+
+
+def observe_request(endpoint: str, record: MetricsRecord, seconds: float) -> None:
+    if not settings.metrics.enabled:
+        return
+    with _lock:
+        _request_seconds.observe(endpoint, seconds)
+        for name, stage_seconds in record.stages.items():
+            _stage_seconds.observe(name, stage_seconds)
+        for name, value in record.values.items():
+            histogram = _value_histograms.get(name)
+            if histogram is not None:
+                histogram.observe(endpoint, value)
+
+
+def render_prometheus() -> str:
+    """Гистограммы и текущие значения в текстовом формате Prometheus."""
+    with _lock:
+        parts = [
+            _request_seconds.render("endpoint"),
+            _stage_seconds.render("stage"),
+            *(histogram.render("endpoint") for histogram in _value_histograms.values()),
+            *(histogram.render("kind") for histogram in _memory_histograms),
+        ]
+    for name, (description, getter) in _gauges.items():
+        parts.append(
+            f"# HELP {name} {description}\n# TYPE {name} gauge\n{name} {getter()}"
+        )
+    return "\n".join(parts) + "\n"
+
+
+def format_server_timing(record: MetricsRecord, seconds: float) -> str:
+    """Значение заголовка Server-Timing: этапы и общая длительность, мс."""
+    timings = [
+        f"{name};dur={stage_seconds * 1000:.1f}"
+        for name, stage_seconds in record.stages.items()
+    ]
+    timings.extend(
+        f"{name};desc=replay;dur={stage_seconds * 1000:.1f}"
+        for name, stage_seconds in record.replayed_stages.items()
+    )
+    timings.append(f"total;dur={seconds * 1000:.1f}")
+    return ", ".join(timings)
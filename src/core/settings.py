@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dataclasses import dataclass, field
 
 from dotenv import find_dotenv, load_dotenv
@@ -18,10 +19,113 @@ class UvicornConfig:
     workers: int = int(os.getenv("UVICORN_WORKERS"))
 
 
+@dataclass
+class ProcessPoolConfig:
+    # Число процессов, в которых каждый воркер uvicorn выполняет загрузку,
+    # редактирование и сохранение GLB-файлов.
+    workers: int = int(os.getenv("PROCESS_POOL_WORKERS", os.cpu_count() or 1))
+
+
+@dataclass
+class MemoryConfig:
+    # Бюджет памяти задач пула на всех воркеров uvicorn, байт. Задача
+    # допускается к выполнению, только пока сумма оценок пиковой памяти
+    # выполняющихся задач укладывается в бюджет. 0 - без ограничения.
+    budget_bytes: int = int(os.getenv("MEMORY_BUDGET_BYTES", 0))
+
+
+@dataclass
+class BatchConfig:
+    # Сколько заданий пакетного запроса выполняются одновременно.
+    concurrency: int = int(os.getenv("BATCH_CONCURRENCY", ProcessPoolConfig.workers))
+
+
+@dataclass
+class GLBConfig:
+    # Правка параметров GLB-файла без загрузки BIN-чанка в память: исходный
+    # файл отображается в память, заменяется только JSON-чанк.
+    zero_copy: bool = os.getenv("GLB_ZERO_COPY", "True") == "True"
+    # Способ встраивания новых изображений текстур: "bufferview" - дописать
+    # в BIN-чанк, "datauri" - закодировать в base64 внутри JSON-чанка.
+    textures_embedding: str = os.getenv("GLB_TEXTURES_EMBEDDING", "bufferview")
+    # Сжатие файла при замене текстур: удаление изображений, текстур,
+    # сэмплеров и bufferView, на которые никто не ссылается, и объединение
+    # одинаковых изображений.
+    compaction: bool = os.getenv("GLB_COMPACTION", "True") == "True"
+    # Внешние буферы и изображения GLTF-файлов (не GLB) в итоговом файле:
+    # "embed" - встроить в виде DataURI, "reference" - сослаться на файлы
+    # исходного файла, "link" - жесткие ссылки на них рядом с итоговым файлом
+    # (см. data/resources).
+    gltf_resources: str = os.getenv("GLTF_RESOURCES", "embed")
+
+
+@dataclass
+class TexturesConfig:
+    # Сколько изображений текстур одного запроса обрабатываются
+    # (масштабируются и перекодируются) одновременно в каждом процессе пула.
+    processing_threads: int = int(os.getenv("TEXTURE_PROCESSING_THREADS", 4))
+    # Сколько файлов текстур одного запроса читаются одновременно в каждом
+    # процессе пула.
+    prefetch_threads: int = int(os.getenv("TEXTURE_PREFETCH_THREADS", 8))
+
+
+@dataclass
+class CacheConfig:
+    # Объем кэша разобранных исходных файлов в каждом процессе пула, байт.
+    # 0 - кэш отключен.
+    source_max_bytes: int = int(os.getenv("SOURCE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    # Объем кэша содержимого файлов текстур в каждом процессе пула, байт.
+    texture_max_bytes: int = int(os.getenv("TEXTURE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    # Сколько хэшей содержимого исходных файлов помнит каждый процесс пула.
+    digest_max_entries: int = int(os.getenv("DIGEST_CACHE_MAX_ENTRIES", 4096))
+
+
+@dataclass
+class JobsConfig:
+    # Асинхронный режим: /parameters, /textures и /edit ставят задание
+    # в очередь и сразу отвечают 202 с идентификатором задания.
+    enabled: bool = os.getenv("ASYNC_JOBS", "False") == "True"
+    # Сколько заданий может ожидать в очереди каждого воркера uvicorn.
+    # Задания сверх этого отклоняются с кодом 503.
+    queue_size: int = int(os.getenv("JOBS_QUEUE_SIZE", 100))
+    # Сколько заданий выполняются одновременно.
+    concurrency: int = int(os.getenv("JOBS_CONCURRENCY", ProcessPoolConfig.workers))
+    # Значение заголовка Retry-After при переполненной очереди, секунд.
+    retry_after: int = int(os.getenv("JOBS_RETRY_AFTER", 5))
+    # Сколько хранится состояние завершенного задания, секунд.
+    result_ttl: int = int(os.getenv("JOBS_RESULT_TTL", 3600))
+    # Директория состояний заданий, общая для всех воркеров uvicorn.
+    directory: str = os.getenv(
+        "JOBS_DIRECTORY", os.path.join(tempfile.gettempdir(), "glbeditor-jobs")
+    )
+
+
+@dataclass
+class StreamConfig:
+    # Наибольший размер GLB-файла, принимаемого в теле запроса, байт.
+    max_bytes: int = int(os.getenv("STREAM_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+@dataclass
+class MetricsConfig:
+    # Сбор метрик этапов обработки запросов (/glbeditor/metrics
+    # и заголовок Server-Timing).
+    enabled: bool = os.getenv("METRICS_ENABLED", "True") == "True"
+
+
 @dataclass
 class Settings:
     app: FastAPIAppConfig = field(default_factory=FastAPIAppConfig)
     uvicorn: UvicornConfig = field(default_factory=UvicornConfig)
+    pool: ProcessPoolConfig = field(default_factory=ProcessPoolConfig)
+    memory: MemoryConfig = field(default_factory=MemoryConfig)
+    batch: BatchConfig = field(default_factory=BatchConfig)
+    glb: GLBConfig = field(default_factory=GLBConfig)
+    textures: TexturesConfig = field(default_factory=TexturesConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    jobs: JobsConfig = field(default_factory=JobsConfig)
+    stream: StreamConfig = field(default_factory=StreamConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
 
 
 settings = Settings()
@@ -0,0 +1,52 @@
+# Объединение одновременных одинаковых запросов (single-flight). Двойная
+# отправка формы или повтор запроса шлюзом по таймауту не должны заново
+# загружать, изменять и записывать файл: пока правка выполняется, такие же
+# запросы ждут ее результат и получают его же - или ту же ошибку.
+#
+# Запросы объединяются внутри одного воркера uvicorn. Одинаковые правки
+# из разных воркеров выполняются по очереди под блокировкой итогового файла
+# (см. data/results.result_lock) и вторая из них возвращает уже записанный
+# файл.
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+import orjson
+
+from src.core import metrics
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[bytes, asyncio.Future] = {}
+
+    async def run(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет call() или, если выполнение с таким же ключом уже идет,
+        дожидается его результата. Ключ - любое значение, которое
+        сериализует orjson (например, кортеж из вида правки и датакласса
+        запроса): ключи словарей упорядочиваются, поэтому одинаковые
+        изменения в разном порядке полей дают один ключ.
+        """
+        key = orjson.dumps(key, option=orjson.OPT_SORT_KEYS)
+        future = self._calls.get(key)
+        if future is not None:
+            with metrics.stage("coalesced"):
+                return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(call())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        # Отмена запроса (клиент разорвал соединение) не отменяет общую
+        # правку, которую ждут другие запросы.
+        return await asyncio.shield(future)
+
+    def _forget(self, key: bytes, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Ошибку получат ожидающие запросы; если их не осталось, она
+        # не должна попасть в журнал как "никем не полученная".
+        if not future.cancelled():
+            future.exception()
+
+
+single_flight = SingleFlight()
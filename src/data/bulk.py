@@ -0,0 +1,207 @@
+# Массовые операции над факторами материалов (operations в запросах
+# /parameters и /edit). Материалы отбираются по шаблону имени, значения
+# фактора всех отобранных материалов собираются в один массив NumPy
+# и изменяются одним векторным вычислением - размер запроса не зависит
+# от числа подходящих материалов.
+#
+# Материалы - объекты Material или их json-представление, как
+# и в GLBParamsRepository._apply_material_changes.
+import fnmatch
+import re
+from copy import copy
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from fastapi import status
+from pygltflib import PbrMetallicRoughness
+
+from src.core.exceptions import GLBEditorException
+from src.domain.entities import MaterialOperation
+
+# Фактор: путь к полю в материале и значение по умолчанию по спецификации
+# GLTF - оно изменяется, если фактора в файле нет.
+FACTORS: Dict[str, Tuple[Tuple[str, ...], Any]] = {
+    "baseColorFactor": (
+        ("pbrMetallicRoughness", "baseColorFactor"), [1.0, 1.0, 1.0, 1.0]
+    ),
+    "metallicFactor": (("pbrMetallicRoughness", "metallicFactor"), 1.0),
+    "roughnessFactor": (("pbrMetallicRoughness", "roughnessFactor"), 1.0),
+    "emissiveFactor": (("emissiveFactor",), [0.0, 0.0, 0.0]),
+}
+# Факторы-цвета, для которых определен сдвиг в пространстве HSV.
+COLOR_FACTORS = ("baseColorFactor", "emissiveFactor")
+
+
+def apply_operations(
+    materials: list, operations: Iterable[MaterialOperation], copied: Set[int]
+) -> None:
+    """
+    Применяет операции к материалам по порядку.
+
+    Args:
+        materials (list): материалы файла. Изменяемые материалы могут
+        принадлежать закэшированному исходному файлу, поэтому они заменяются
+        в списке копиями.
+        operations (Iterable[MaterialOperation]): операции
+        copied (Set[int]): индексы материалов, которые уже заменены копиями.
+        Пополняется индексами материалов, измененных операциями.
+    """
+    names = [_get(material, "name") for material in materials]
+    for operation in operations:
+        indices = select(names, operation)
+        if not indices:
+            continue
+        path, _ = FACTORS[operation.factor]
+        values = np.array(
+            [
+                _get_values(materials[index], names[index], operation.factor)
+                for index in indices
+            ]
+        )
+        values = _OPERATIONS[operation.op](
+            values, np.asarray(operation.value, dtype=np.float64)
+        )
+        # Все факторы по спецификации лежат в диапазоне [0, 1].
+        np.clip(values, 0.0, 1.0, out=values)
+        for index, value in zip(indices, values.tolist()):
+            if index not in copied:
+                materials[index] = _copy_material(materials[index])
+                copied.add(index)
+            _set_factor(materials[index], path, value)
+
+
+def select(names: List[Optional[str]], operation: MaterialOperation) -> List[int]:
+    """Индексы материалов, имена которых целиком подходят под шаблон."""
+    if operation.match == "regex":
+        pattern = re.compile(operation.pattern)
+    else:
+        pattern = re.compile(fnmatch.translate(operation.pattern))
+    return [
+        index
+        for index, name in enumerate(names)
+        if name is not None and pattern.fullmatch(name)
+    ]
+
+
+def _set(values: np.ndarray, value: np.ndarray) -> np.ndarray:
+    return np.broadcast_to(value, values.shape).copy()
+
+
+def _clamp(values: np.ndarray, value: np.ndarray) -> np.ndarray:
+    return np.clip(values, value[0], value[1])
+
+
+def _hsv_shift(values: np.ndarray, value: np.ndarray) -> np.ndarray:
+    # Альфа-канал baseColorFactor не изменяется. Тон сдвигается в градусах
+    # по кругу, насыщенность и яркость - в долях и ограничиваются [0, 1].
+    hsv = _rgb_to_hsv(np.clip(values[:, :3], 0.0, 1.0))
+    hsv[:, 0] = (hsv[:, 0] + value[0] / 360.0) % 1.0
+    hsv[:, 1:] = np.clip(hsv[:, 1:] + value[1:], 0.0, 1.0)
+    values[:, :3] = _hsv_to_rgb(hsv)
+    return values
+
+
+_OPERATIONS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "set": _set,
+    "multiply": np.multiply,
+    "add": np.add,
+    "clamp": _clamp,
+    "hsv_shift": _hsv_shift,
+}
+
+
+def _rgb_to_hsv(rgb: np.ndarray) -> np.ndarray:
+    maximum = rgb.max(axis=1)
+    delta = maximum - rgb.min(axis=1)
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    red, green, blue = rgb.T
+    hue = np.select(
+        [maximum == red, maximum == green],
+        [(green - blue) / safe_delta, 2.0 + (blue - red) / safe_delta],
+        4.0 + (red - green) / safe_delta,
+    )
+    hue = np.where(delta > 0, hue / 6.0 % 1.0, 0.0)
+    saturation = np.where(maximum > 0, delta / np.where(maximum > 0, maximum, 1.0), 0.0)
+    return np.stack([hue, saturation, maximum], axis=1)
+
+
+def _hsv_to_rgb(hsv: np.ndarray) -> np.ndarray:
+    hue, saturation, value = hsv.T
+    sector = np.floor(hue * 6.0)
+    fraction = hue * 6.0 - sector
+    p = value * (1.0 - saturation)
+    q = value * (1.0 - saturation * fraction)
+    t = value * (1.0 - saturation * (1.0 - fraction))
+    sector = sector.astype(int) % 6
+    choices = [
+        (value, t, p), (q, value, p), (p, value, t),
+        (p, q, value), (t, p, value), (value, p, q),
+    ]
+    conditions = [sector == number for number in range(6)]
+    return np.stack(
+        [
+            np.select(conditions, [choice[channel] for choice in choices])
+            for channel in range(3)
+        ],
+        axis=1,
+    )
+
+
+def _get(obj: Any, key: str) -> Any:
+    return obj.get(key) if isinstance(obj, dict) else getattr(obj, key)
+
+
+def _get_values(material: Any, name: str, factor: str) -> np.ndarray:
+    # Значение фактора с числом компонент по спецификации: иначе векторное
+    # вычисление над всеми материалами невозможно.
+    path, default = FACTORS[factor]
+    try:
+        values = np.asarray(_get_factor(material, path, default), dtype=np.float64)
+    except (TypeError, ValueError):
+        values = None
+    if values is None or values.shape != np.shape(default):
+        raise GLBEditorException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'Значение {factor} материала "{name}" не соответствует'
+            " спецификации GLTF",
+        )
+    return values
+
+
+def _get_factor(material: Any, path: Tuple[str, ...], default: Any) -> Any:
+    value = material
+    for key in path:
+        value = _get(value, key)
+        if value is None:
+            return default
+    return value
+
+
+def _set_factor(material: Any, path: Tuple[str, ...], value: Any) -> None:
+    *parents, key = path
+    target = material
+    for parent in parents:
+        child = _get(target, parent)
+        if child is None:
+            # В файле нет pbrMetallicRoughness - добавляем его.
+            child = {} if isinstance(target, dict) else PbrMetallicRoughness()
+            _assign(target, parent, child)
+        target = child
+    _assign(target, key, value)
+
+
+def _assign(obj: Any, key: str, value: Any) -> None:
+    if isinstance(obj, dict):
+        obj[key] = value
+    else:
+        setattr(obj, key, value)
+
+
+def _copy_material(material: Any) -> Any:
+    # Факторы заменяются новыми списками, а не изменяются на месте, поэтому
+    # достаточно копий самого материала и его pbrMetallicRoughness.
+    material = copy(material)
+    pbr = _get(material, "pbrMetallicRoughness")
+    if pbr is not None:
+        _assign(material, "pbrMetallicRoughness", copy(pbr))
+    return material
@@ -0,0 +1,365 @@
+# Кэши уровня данных. Живут в каждом процессе пула (см. core/executor),
+# ограничены суммарным размером в байтах и вытесняют давно не используемые
+# записи (LRU).
+import base64
+import copy
+import hashlib
+import mimetypes
+import os
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+from pygltflib import GLTF2
+
+from src.core import metrics
+from src.core.executor import register_stats_provider
+from src.core.settings import settings
+from src.data.glb import GLBLayout, read_glb, read_gltf
+from src.data.images import transcode
+from src.domain.entities import TextureProcessing
+
+
+class LRUCache:
+    """LRU-кэш с ограничением суммарного размера значений в байтах."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        # Значение, которое больше всего кэша, не кэшируется вовсе - иначе
+        # оно вытеснило бы все остальные записи.
+        if size > self.max_bytes:
+            return
+        self.pop(key)
+        while self._entries and self.size + size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+        self._entries[key] = (value, size)
+        self.size += size
+
+    def pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class FileDigestCache:
+    """
+    Кэш хэшей sha256 содержимого файлов. Запись действительна, пока у файла
+    не изменились размер, время модификации и inode, поэтому большой исходный
+    файл хэшируется один раз, а не при каждом запросе.
+    """
+
+    def __init__(self, max_entries: int):
+        # Ограничение - число записей: каждая запись "весит" 1.
+        self._cache = LRUCache(max_entries)
+
+    def get(self, filepath: str) -> str:
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev)
+        digest = self._cache.get(key)
+        if digest is None:
+            with open(filepath, "rb") as file:
+                digest = hashlib.file_digest(file, "sha256").hexdigest()
+            metrics.add_value("bytes_read", stat.st_size)
+            self._cache.put(key, digest, 1)
+        return digest
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+class SourceModelCache:
+    """
+    Кэш разобранных исходных файлов. Запись действительна, пока у файла
+    не изменились размер, время модификации и inode, поэтому измененный
+    на диске файл никогда не будет взят из кэша. Размер записи оценивается
+    размером JSON-чанка файла.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache = LRUCache(max_bytes)
+        # Последний закэшированный ключ каждого файла - чтобы сразу удалять
+        # из кэша устаревшие версии файла, не дожидаясь их вытеснения.
+        self._current_keys = {}
+
+    def get(self, kind: str, filepath: str, loader: Callable) -> Tuple[Any, GLBLayout]:
+        key = self._make_key(kind, filepath)
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+
+        value = loader(filepath)
+        # Если файл изменился, пока мы его читали, результат не кэшируем.
+        if self._make_key(kind, filepath) != key:
+            return value
+        stale_key = self._current_keys.get((kind, filepath))
+        if stale_key is not None and stale_key != key:
+            self._cache.pop(stale_key)
+        self._current_keys[(kind, filepath)] = key
+        self._cache.put(key, value, value[1].json_length)
+        return value
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    @staticmethod
+    def _make_key(kind: str, filepath: str) -> tuple:
+        stat = os.stat(filepath)
+        return (
+            kind, filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev
+        )
+
+
+@dataclass(eq=False)
+class TexturePayload:
+    """Содержимое файла текстуры, готовое к встраиванию в GLB-файл."""
+
+    data: bytes
+    mime_type: Optional[str]
+    digest: str
+    data_uri: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + len(self.data_uri or "")
+
+
+class TexturePayloadCache:
+    """
+    Кэш содержимого файлов текстур. Запись действительна, пока у файла
+    не изменились размер, время модификации и inode. Файлы с одинаковым
+    содержимым (по хэшу sha256) разделяют один объект TexturePayload, поэтому
+    байты и их base64-представление хранятся в памяти один раз.
+
+    Обработанные изображения (см. data/images) кэшируются в том же кэше
+    по хэшу содержимого файла и параметрам обработки: одна и та же текстура
+    с одними и теми же параметрами обрабатывается один раз.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache = LRUCache(max_bytes)
+        self._by_digest = weakref.WeakValueDictionary()
+
+    def load(
+        self, filepath: str, processing: Optional[TextureProcessing] = None
+    ) -> TexturePayload:
+        return self._load_processed(filepath, processing)[1]
+
+    def prefetch(self, filepaths: Iterable[str], read: bool = True) -> None:
+        """
+        Проверяет, что файлы текстур существуют, и читает еще не закэшированные
+        параллельно, в потоках (не более settings.textures.prefetch_threads):
+        на сетевом хранилище время чтения определяется задержками, а не
+        пропускной способностью диска. Последующие load и load_data_uri
+        берут содержимое из кэша. Файлы, которые не поместятся в кэш,
+        не читаются.
+
+        Args:
+            filepaths (Iterable[str]): пути к файлам текстур
+            read (bool, optional): False - только проверить наличие файлов
+
+        Raises:
+            FileNotFoundError: первый по порядку отсутствующий файл; остальные
+            файлы в этом случае не читаются
+        """
+        filepaths = list(dict.fromkeys(filepaths))
+        if not filepaths:
+            return
+        workers = min(settings.textures.prefetch_threads, len(filepaths))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            stats = list(executor.map(_stat_or_none, filepaths))
+            for filepath, stat in zip(filepaths, stats):
+                if stat is None:
+                    raise FileNotFoundError(filepath)
+            if not read:
+                return
+
+            pending = {}
+            for filepath, stat in zip(filepaths, stats):
+                key = (filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev)
+                if (
+                    stat.st_size <= self._cache.max_bytes
+                    and self._cache.get(key) is None
+                ):
+                    pending[key] = filepath
+            # Как и в load_many, в потоках только читаются файлы, запись
+            # в кэш - в текущем потоке.
+            results = executor.map(_read_file, pending.values())
+            for (key, filepath), data in zip(pending.items(), results):
+                metrics.add_value("bytes_read", len(data))
+                mime_type, _ = mimetypes.guess_type(filepath)
+                self._put(key, data, mime_type)
+
+    def load_many(
+        self, filepaths: Iterable[str], processing: TextureProcessing
+    ) -> None:
+        """
+        Обрабатывает еще не обработанные файлы текстур параллельно, в потоках
+        (не более settings.textures.processing_threads), и кэширует
+        результаты - последующие load и load_data_uri берут их из кэша.
+        Если кэш меньше обработанных изображений запроса, не поместившиеся
+        изображения будут обработаны повторно.
+        """
+        pending = {}
+        for filepath in filepaths:
+            _, payload = self._load(filepath)
+            key = self._make_processed_key(payload, processing)
+            if key not in pending and self._cache.get(key) is None:
+                pending[key] = payload
+        if not pending:
+            return
+
+        # Кэш не потокобезопасен, поэтому в потоках выполняется только
+        # обработка, а запись в кэш - в текущем потоке.
+        workers = min(settings.textures.processing_threads, len(pending))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            results = executor.map(
+                lambda payload: transcode(payload.data, processing),
+                pending.values(),
+            )
+            for key, (data, mime_type) in zip(pending, results):
+                self._put(key, data, mime_type)
+
+    def load_data_uri(
+        self, filepath: str, processing: Optional[TextureProcessing] = None
+    ) -> str:
+        key, payload = self._load_processed(filepath, processing)
+        if payload.data_uri is None:
+            encoded = base64.b64encode(payload.data).decode()
+            payload.data_uri = f"data:{payload.mime_type};base64,{encoded}"
+            # Размер записи вырос - пересчитываем занятый кэшем объем.
+            self._cache.put(key, payload, payload.size)
+        return payload.data_uri
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def _load(self, filepath: str) -> Tuple[tuple, TexturePayload]:
+        stat = os.stat(filepath)
+        key = (filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev)
+        payload = self._cache.get(key)
+        if payload is not None:
+            return key, payload
+
+        with open(filepath, "rb") as texture_file:
+            data = texture_file.read()
+        metrics.add_value("bytes_read", len(data))
+        mime_type, _ = mimetypes.guess_type(filepath)
+        return key, self._put(key, data, mime_type)
+
+    def _load_processed(
+        self, filepath: str, processing: Optional[TextureProcessing]
+    ) -> Tuple[tuple, TexturePayload]:
+        key, payload = self._load(filepath)
+        if processing is None:
+            return key, payload
+        processed_key = self._make_processed_key(payload, processing)
+        processed = self._cache.get(processed_key)
+        if processed is None:
+            data, mime_type = transcode(payload.data, processing)
+            processed = self._put(processed_key, data, mime_type)
+        return processed_key, processed
+
+    def _put(
+        self, key: tuple, data: bytes, mime_type: Optional[str]
+    ) -> TexturePayload:
+        digest = hashlib.sha256(data).hexdigest()
+        payload = self._by_digest.get(digest)
+        if payload is None:
+            payload = TexturePayload(data, mime_type, digest)
+            self._by_digest[digest] = payload
+        self._cache.put(key, payload, payload.size)
+        return payload
+
+    @staticmethod
+    def _make_processed_key(
+        payload: TexturePayload, processing: TextureProcessing
+    ) -> tuple:
+        return ("processed", payload.digest, astuple(processing))
+
+
+def _stat_or_none(filepath: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(filepath)
+    except FileNotFoundError:
+        return None
+
+
+def _read_file(filepath: str) -> bytes:
+    with open(filepath, "rb") as texture_file:
+        return texture_file.read()
+
+
+digest_cache = FileDigestCache(settings.cache.digest_max_entries)
+register_stats_provider("digest_cache", digest_cache.stats)
+
+source_cache = SourceModelCache(settings.cache.source_max_bytes)
+register_stats_provider("source_cache", source_cache.stats)
+
+texture_cache = TexturePayloadCache(settings.cache.texture_max_bytes)
+register_stats_provider("texture_cache", texture_cache.stats)
+
+
+def load_document(filepath: str) -> Tuple[dict, GLBLayout]:
+    """
+    JSON-документ GLB-файла (см. data/glb.read_glb) из кэша. Возвращается
+    копия документа со своим списком материалов: сами материалы общие с кэшем,
+    поэтому изменяемый материал нужно предварительно скопировать.
+    """
+    document, layout = source_cache.get("document", filepath, read_glb)
+    view = dict(document)
+    if "materials" in view:
+        view["materials"] = list(view["materials"])
+    return view, layout
+
+
+def load_gltf(filepath: str) -> Tuple[GLTF2, GLBLayout]:
+    """
+    Объект GLTF2 GLB-файла (см. data/glb.read_gltf) из кэша. Возвращается
+    копия объекта со своими списками материалов, текстур, буферов,
+    изображений и прочих объектов, которые изменяет замена текстур. Сами
+    объекты общие с кэшем: изменяемый объект нужно предварительно скопировать
+    и заменить в списке копией (см. data/references.TextureReferences,
+    data/compaction). Геометрия (accessors, meshes, nodes и т.д.) остается
+    общей с кэшем.
+    """
+    gltf, layout = source_cache.get("gltf", filepath, read_gltf)
+    view = copy.copy(gltf)
+    view.materials = list(gltf.materials)
+    view.textures = list(gltf.textures)
+    view.buffers = list(gltf.buffers)
+    view.images = list(gltf.images)
+    view.bufferViews = list(gltf.bufferViews)
+    view.samplers = list(gltf.samplers)
+    view.extensionsUsed = list(gltf.extensionsUsed)
+    view.extensionsRequired = list(gltf.extensionsRequired)
+    return view, layout
@@ -0,0 +1,378 @@
+# Сжатие GLTF-документа перед записью итогового файла.
+#
+# Замена текстур добавляет в файл новые изображения и текстуры, а прежние,
+# на которые больше никто не ссылается, остаются в файле. Без сжатия файл,
+# который правят раз за разом, только растет, а каждая следующая загрузка
+# разбирает все больше мертвых данных. Сжатие:
+# 1. объединяет изображения с одинаковым содержимым (по хэшу sha256);
+# 2. удаляет текстуры, на которые не ссылается ни один материал, затем
+#    сэмплеры и изображения, на которые не ссылается ни одна текстура, затем
+#    bufferView, на которые не ссылаются accessor, изображения и сжатые
+#    Draco примитивы;
+# 3. пересобирает BIN-чанк только из оставшихся bufferView.
+# Индексы во всех ссылках переписываются.
+#
+# Объекты документа могут быть общими с кэшем исходных файлов (см.
+# data/cache.load_gltf), поэтому объекты, в которых меняются ссылки,
+# предварительно копируются, а списки не изменяются, а заменяются новыми.
+import hashlib
+from collections import defaultdict
+from copy import copy
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pygltflib import GLTF2
+
+from src.data.glb import BinChunk
+from src.data.references import MATERIAL_TEXTURE_SLOTS
+
+# Расширения, про ссылки которых на текстуры, изображения и bufferView
+# известно, где они лежат. Расширение может сослаться на что угодно, и если
+# такая ссылка не будет переписана, файл будет испорчен, поэтому файлы
+# с прочими расширениями не сжимаются.
+SUPPORTED_EXTENSIONS = frozenset(
+    {
+        "EXT_mesh_gpu_instancing",
+        "EXT_texture_avif",
+        "EXT_texture_webp",
+        "KHR_draco_mesh_compression",
+        "KHR_lights_punctual",
+        "KHR_materials_anisotropy",
+        "KHR_materials_clearcoat",
+        "KHR_materials_dispersion",
+        "KHR_materials_emissive_strength",
+        "KHR_materials_ior",
+        "KHR_materials_iridescence",
+        "KHR_materials_pbrSpecularGlossiness",
+        "KHR_materials_sheen",
+        "KHR_materials_specular",
+        "KHR_materials_transmission",
+        "KHR_materials_unlit",
+        "KHR_materials_variants",
+        "KHR_materials_volume",
+        "KHR_mesh_quantization",
+        "KHR_texture_basisu",
+        "KHR_texture_transform",
+        "KHR_xmp_json_ld",
+        "MSFT_lod",
+        "MSFT_texture_dds",
+    }
+)
+
+# Ссылка на индекс - объект (или словарь) и имя поля с индексом.
+Reference = Tuple[Any, str]
+FindReferences = Callable[[Any], Iterator[Reference]]
+
+
+def compact(
+    gltf: GLTF2, bin_chunk: Optional[BinChunk], source_filepath: Optional[str] = None
+) -> Tuple[int, Optional[BinChunk]]:
+    """
+    Сжимает документ gltf (см. комментарий модуля).
+
+    Args:
+        gltf (GLTF2): документ, изменяется на месте
+        bin_chunk (BinChunk | None): содержимое BIN-чанка. None - содержимое
+        недоступно, тогда изображения из bufferView не сравниваются,
+        а bufferView не удаляются.
+        source_filepath (str | None): исходный файл, на диапазоны которого
+        ссылается bin_chunk
+
+    Returns:
+        Tuple[int, BinChunk | None]: сколько байт сэкономлено и новое
+        содержимое BIN-чанка.
+    """
+    if not SUPPORTED_EXTENSIONS.issuperset(gltf.extensionsUsed or ()):
+        return 0, bin_chunk
+    has_bin_chunk = bin_chunk is not None and _is_bin_chunk_only(gltf, bin_chunk)
+
+    def read_view(view_idx: int) -> Optional[bytes]:
+        if not has_bin_chunk:
+            return None
+        view = gltf.bufferViews[view_idx]
+        return bin_chunk.read(view.byteOffset or 0, view.byteLength, source_filepath)
+
+    _merge_identical_images(gltf, read_view)
+    _remove_unreferenced(gltf, "textures", {"materials": _find_material_textures})
+    _remove_unreferenced(gltf, "samplers", {"textures": _find_texture_samplers})
+    removed_images = _remove_unreferenced(
+        gltf, "images", {"textures": _find_texture_images}
+    )
+    bytes_saved = sum(len(image.uri or "") for image in removed_images)
+    if not has_bin_chunk:
+        return bytes_saved, bin_chunk
+
+    _remove_unreferenced(
+        gltf,
+        "bufferViews",
+        {
+            "accessors": _find_accessor_buffer_views,
+            "images": _find_image_buffer_views,
+            "meshes": _find_mesh_buffer_views,
+        },
+    )
+    new_chunk = _rebuild_bin_chunk(gltf, bin_chunk)
+    if new_chunk.length:
+        gltf.buffers = [copy(gltf.buffers[0])]
+        gltf.buffers[0].byteLength = new_chunk.length
+    else:
+        gltf.buffers = []
+    # Длины с выравниванием: оно все равно допишется при записи файла.
+    saved_bin_bytes = _aligned(bin_chunk.length) - _aligned(new_chunk.length)
+    return bytes_saved + saved_bin_bytes, new_chunk
+
+
+def _aligned(length: int) -> int:
+    return length + (-length % 4)
+
+
+def _is_bin_chunk_only(gltf: GLTF2, bin_chunk: BinChunk) -> bool:
+    # bufferView можно удалять и перемещать, только если все они лежат
+    # в BIN-чанке (единственном буфере без uri) и не сжаты расширениями.
+    if len(gltf.buffers) != 1 or gltf.buffers[0].uri is not None:
+        return False
+    return all(
+        view.buffer == 0
+        and not view.extensions
+        and (view.byteOffset or 0) + (view.byteLength or 0) <= bin_chunk.length
+        for view in gltf.bufferViews
+    )
+
+
+def _merge_identical_images(
+    gltf: GLTF2, read_view: Callable[[int], Optional[bytes]]
+) -> None:
+    # Хэшировать все изображения файла дорого, поэтому содержимое
+    # изображений из bufferView сравнивается, только если совпадают их длины.
+    # Изображения с uri (DataURI или путь к файлу) сравниваются по uri.
+    by_length = defaultdict(list)
+    keys: Dict[int, Any] = {}
+    for image_idx, image in enumerate(gltf.images):
+        if image.uri:
+            keys[image_idx] = ("uri", image.uri)
+        elif image.bufferView is not None:
+            by_length[gltf.bufferViews[image.bufferView].byteLength].append(image_idx)
+    for image_indices in by_length.values():
+        if len(image_indices) < 2:
+            continue
+        for image_idx in image_indices:
+            data = read_view(gltf.images[image_idx].bufferView)
+            if data is not None:
+                keys[image_idx] = ("sha256", hashlib.sha256(data).digest())
+
+    first_by_key = {}
+    mapping = {}
+    for image_idx, key in sorted(keys.items()):
+        first_idx = first_by_key.setdefault(key, image_idx)
+        if first_idx != image_idx:
+            mapping[image_idx] = first_idx
+    if mapping:
+        # Текстуры будут ссылаться на первое из одинаковых изображений,
+        # а остальные удалит _remove_unreferenced.
+        _remap(gltf, {"textures": _find_texture_images}, mapping)
+
+
+def _remove_unreferenced(
+    gltf: GLTF2, name: str, referrers: Dict[str, FindReferences]
+) -> list:
+    """
+    Удаляет из списка gltf.<name> элементы, на которые нет ссылок
+    в объектах списков referrers (имя списка -> поиск ссылок в его элементе),
+    и переписывает ссылки на оставшиеся.
+
+    Returns:
+        list: удаленные элементы.
+    """
+    items = getattr(gltf, name)
+    used = {
+        getattr(owner, key) if not isinstance(owner, dict) else owner[key]
+        for referrer, find_references in referrers.items()
+        for item in getattr(gltf, referrer)
+        for owner, key in find_references(item)
+    }
+    # Ссылки на несуществующие элементы - файл поврежден, не трогаем его.
+    if len(used) == len(items) or any(index >= len(items) for index in used):
+        return []
+
+    kept, removed, mapping = [], [], {}
+    for index, item in enumerate(items):
+        if index in used:
+            mapping[index] = len(kept)
+            kept.append(item)
+        else:
+            removed.append(item)
+    setattr(gltf, name, kept)
+    _remap(gltf, referrers, mapping)
+    return removed
+
+
+def _remap(gltf: GLTF2, referrers: Dict[str, FindReferences], mapping: dict) -> None:
+    # Индексы, которых нет в mapping, не меняются. Объект, в котором меняется
+    # хотя бы одна ссылка, заменяется копией.
+    for referrer, find_references in referrers.items():
+        items = getattr(gltf, referrer)
+        new_items = None
+        for index, item in enumerate(items):
+            if not any(
+                mapping.get(_get(owner, key), _get(owner, key)) != _get(owner, key)
+                for owner, key in find_references(item)
+            ):
+                continue
+            item = _copy_tree(item)
+            for owner, key in find_references(item):
+                _set(owner, key, mapping.get(_get(owner, key), _get(owner, key)))
+            if new_items is None:
+                new_items = list(items)
+            new_items[index] = item
+        if new_items is not None:
+            setattr(gltf, referrer, new_items)
+
+
+def _rebuild_bin_chunk(gltf: GLTF2, bin_chunk: BinChunk) -> BinChunk:
+    """
+    Собирает BIN-чанк из диапазонов, занятых bufferView. Перекрывающиеся
+    и смежные (с точностью до выравнивания) bufferView копируются одним
+    диапазоном. Смещение каждого диапазона по модулю 4 сохраняется, чтобы
+    не нарушить выравнивание данных accessor.
+    """
+    views = list(gltf.bufferViews)
+    order = sorted(range(len(views)), key=lambda idx: views[idx].byteOffset or 0)
+    new_chunk = BinChunk()
+    island_start = island_end = None
+    members: List[int] = []
+
+    def flush() -> None:
+        new_chunk.align(island_start % 4)
+        new_start = new_chunk.length
+        new_chunk.append_slice(bin_chunk, island_start, island_end - island_start)
+        for view_idx in members:
+            offset = new_start + (views[view_idx].byteOffset or 0) - island_start
+            if offset != (views[view_idx].byteOffset or 0):
+                views[view_idx] = copy(views[view_idx])
+                views[view_idx].byteOffset = offset
+
+    for view_idx in order:
+        start = views[view_idx].byteOffset or 0
+        end = start + views[view_idx].byteLength
+        if island_start is not None and start < island_end + 4:
+            island_end = max(island_end, end)
+            members.append(view_idx)
+            continue
+        if island_start is not None:
+            flush()
+        island_start, island_end, members = start, end, [view_idx]
+    if island_start is not None:
+        flush()
+
+    gltf.bufferViews = views
+    return new_chunk
+
+
+def _find_material_textures(material) -> Iterator[Reference]:
+    # Слоты материала по спецификации и поля *Texture расширений
+    # материалов (KHR_materials_*), как и в data/references.
+    for slot in MATERIAL_TEXTURE_SLOTS:
+        texture_info = material
+        for name in slot:
+            texture_info = getattr(texture_info, name, None)
+            if texture_info is None:
+                break
+        if _is_index(getattr(texture_info, "index", None)):
+            yield texture_info, "index"
+    yield from _find_extension_textures(material.extensions)
+
+
+def _find_extension_textures(value) -> Iterator[Reference]:
+    if not isinstance(value, dict):
+        return
+    for key, item in value.items():
+        if not isinstance(item, dict):
+            continue
+        if key.endswith("Texture") and _is_index(item.get("index")):
+            yield item, "index"
+        else:
+            yield from _find_extension_textures(item)
+
+
+def _find_texture_images(texture) -> Iterator[Reference]:
+    # source текстуры и альтернативные изображения ее расширений
+    # (EXT_texture_webp, KHR_texture_basisu и т.д.).
+    if _is_index(texture.source):
+        yield texture, "source"
+    for extension in (texture.extensions or {}).values():
+        if isinstance(extension, dict) and _is_index(extension.get("source")):
+            yield extension, "source"
+
+
+def _find_texture_samplers(texture) -> Iterator[Reference]:
+    if _is_index(texture.sampler):
+        yield texture, "sampler"
+
+
+def _find_accessor_buffer_views(accessor) -> Iterator[Reference]:
+    if _is_index(accessor.bufferView):
+        yield accessor, "bufferView"
+    if accessor.sparse is not None:
+        for sparse_part in (accessor.sparse.indices, accessor.sparse.values):
+            if sparse_part is not None and _is_index(sparse_part.bufferView):
+                yield sparse_part, "bufferView"
+
+
+def _find_image_buffer_views(image) -> Iterator[Reference]:
+    if _is_index(image.bufferView):
+        yield image, "bufferView"
+
+
+def _find_mesh_buffer_views(mesh) -> Iterator[Reference]:
+    for primitive in mesh.primitives:
+        draco = (primitive.extensions or {}).get("KHR_draco_mesh_compression")
+        if isinstance(draco, dict) and _is_index(draco.get("bufferView")):
+            yield draco, "bufferView"
+
+
+def _is_index(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _copy_tree(value):
+    # Копия объекта pygltflib, словаря или списка со всеми вложенными
+    # объектами. Быстрее deepcopy: скалярные значения не копируются.
+    names = _get_dataclass_field_names(type(value))
+    if names is not None:
+        value = copy(value)
+        for name in names:
+            child = getattr(value, name)
+            if not isinstance(child, _SCALARS):
+                setattr(value, name, _copy_tree(child))
+        return value
+    if isinstance(value, dict):
+        return {key: _copy_tree(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [_copy_tree(child) for child in value]
+    return value
+
+
+_SCALARS = (str, int, float, bool, type(None))
+_dataclass_field_names: Dict[type, Optional[Tuple[str, ...]]] = {}
+
+
+def _get_dataclass_field_names(cls: type) -> Optional[Tuple[str, ...]]:
+    try:
+        return _dataclass_field_names[cls]
+    except KeyError:
+        names = (
+            tuple(field.name for field in fields(cls)) if is_dataclass(cls) else None
+        )
+        _dataclass_field_names[cls] = names
+        return names
+
+
+def _get(owner, key: str):
+    return owner[key] if isinstance(owner, dict) else getattr(owner, key)
+
+
+def _set(owner, key: str, value) -> None:
+    if isinstance(owner, dict):
+        owner[key] = value
+    else:
+        setattr(owner, key, value)
@@ -0,0 +1,77 @@
+# Структурные различия объектов файла до и после правки - ответ пробного
+# запуска (dry_run): какие параметры материалов изменятся и какие текстуры
+# и изображения будут добавлены или заменены, без записи итогового файла.
+#
+# Пути к измененным значениям - JSON Pointer (RFC 6901) в JSON-документе
+# файла, например /materials/3/pbrMetallicRoughness/baseColorFactor.
+# Списки сравниваются целиком, как и в правилах слияния изменений
+# (см. GLBParamsRepository._unite_object).
+from dataclasses import is_dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pygltflib import delete_empty_keys, gltf_asdict
+
+
+def to_json(value: Any) -> Any:
+    """
+    JSON-представление объекта pygltflib в том виде, в каком он будет
+    записан в файл: без пустых значений. Словари возвращаются как есть.
+    """
+    if is_dataclass(value):
+        return delete_empty_keys(gltf_asdict(value))
+    return value
+
+
+def diff_values(old: Any, new: Any, path: str) -> Iterator[Tuple[str, Any, Any]]:
+    """
+    Различия двух JSON-значений: кортежи (путь, старое значение, новое).
+    Отсутствующее значение - None.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in {**old, **new}:
+            yield from diff_values(
+                old.get(key), new.get(key), f"{path}/{_escape(key)}"
+            )
+    elif old != new:
+        yield path, old, new
+
+
+def diff_section(
+    section: str,
+    before: Dict[int, Any],
+    count_before: int,
+    after: Sequence[Any],
+    label: Optional[str] = None,
+) -> List[dict]:
+    """
+    Различия объектов одного списка документа (materials, textures, images).
+
+    Args:
+        section (str): имя списка в JSON-документе файла
+        before (Dict[int, Any]): JSON-представления объектов до правки
+        по их индексам. Объекты, которых здесь нет, считаются неизмененными.
+        count_before (int): длина списка до правки. Объекты с большими
+        индексами добавлены правкой.
+        after (Sequence[Any]): список объектов после правки
+        label (str | None, optional): ключ, под которым в каждое различие
+        записывается имя объекта (например, "material")
+    """
+    changes = []
+    for index, obj in enumerate(after):
+        if index < count_before and index not in before:
+            continue
+        new_json = to_json(obj)
+        if index >= count_before:
+            differences = [(f"/{section}/{index}", None, new_json)]
+        else:
+            differences = diff_values(before[index], new_json, f"/{section}/{index}")
+        for path, old, new in differences:
+            change = {"path": path, "old": old, "new": new}
+            if label is not None:
+                change = {label: new_json.get("name"), **change}
+            changes.append(change)
+    return changes
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
@@ -0,0 +1,430 @@
+# Низкоуровневая работа с контейнером GLB.
+#
+# GLB-файл устроен так:
+# +--------------------------------------------+
+# | заголовок: magic "glTF", версия, длина     |  12 байт
+# +--------------------------------------------+
+# | длина чанка, тип "JSON" | JSON-документ    |  выравнивание пробелами до 4 байт
+# +--------------------------------------------+
+# | длина чанка, тип "BIN\0" | бинарные данные |  выравнивание нулями до 4 байт
+# +--------------------------------------------+
+#
+# Правка параметров материалов меняет только JSON-чанк, поэтому исходный файл
+# отображается в память, разбирается только заголовок и JSON, а BIN-чанк
+# копируется в итоговый файл средствами ядра (copy_file_range/sendfile), ни
+# разу не попадая в память процесса. Новые данные (например, изображения
+# текстур) дописываются в конец BIN-чанка.
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import (Any, BinaryIO, Callable, Iterator, List, Optional, Tuple,
+                    Union)
+
+import orjson
+from fastapi import status
+from pygltflib import GLTF2, delete_empty_keys, gltf_asdict
+
+from src.core import metrics
+from src.core.exceptions import GLBEditorException
+
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+CHUNK_TYPE_JSON = b"JSON"
+CHUNK_TYPE_BIN = b"BIN\x00"
+
+GLB_HEADER = struct.Struct("<4sII")
+CHUNK_HEADER = struct.Struct("<I4s")
+
+# Размер блока для копирования, если ядро не умеет копировать между файлами.
+_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Размер блока при отдаче GLB-файла потоком.
+_STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class GLBLayout:
+    """Расположение чанков в исходном GLB-файле (смещения - от начала файла)."""
+
+    json_offset: int
+    json_length: int
+    bin_offset: Optional[int] = None
+    bin_length: int = 0
+
+
+@dataclass
+class BinChunk:
+    """
+    Содержимое BIN-чанка итогового файла - список диапазонов исходного файла,
+    которые будут скопированы в итоговый файл без чтения в память, и новых
+    данных, которые будут дописаны после них.
+    """
+
+    segments: List[Union[Tuple[int, int], bytes]] = field(default_factory=list)
+    length: int = 0
+
+    @classmethod
+    def from_layout(cls, layout: GLBLayout) -> "BinChunk":
+        chunk = cls()
+        if layout.bin_offset is not None:
+            chunk.append_range(layout.bin_offset, layout.bin_length)
+        return chunk
+
+    def append_range(self, offset: int, length: int) -> None:
+        # Смежные диапазоны исходного файла объединяются - меньше системных
+        # вызовов при копировании.
+        if self.segments and isinstance(self.segments[-1], tuple):
+            last_offset, last_length = self.segments[-1]
+            if last_offset + last_length == offset:
+                self.segments[-1] = (last_offset, last_length + length)
+                self.length += length
+                return
+        self.segments.append((offset, length))
+        self.length += length
+
+    def append_bytes(self, data: bytes) -> int:
+        """
+        Дописывает данные в конец чанка с выравниванием по 4 байта.
+
+        Returns:
+            int: смещение данных от начала чанка - byteOffset для bufferView.
+        """
+        self.align()
+        offset = self.length
+        self.segments.append(data)
+        self.length += len(data)
+        return offset
+
+    def append_slice(self, chunk: "BinChunk", offset: int, length: int) -> None:
+        """
+        Дописывает диапазон [offset, offset + length) другого чанка без
+        выравнивания. Диапазоны исходного файла остаются диапазонами и
+        по-прежнему не читаются в память.
+        """
+        for segment in chunk._iter_slice(offset, length):
+            if isinstance(segment, tuple):
+                self.append_range(*segment)
+            else:
+                self.segments.append(segment)
+                self.length += len(segment)
+
+    def align(self, residue: int = 0) -> None:
+        """Дополняет чанк нулями до длины, равной residue по модулю 4."""
+        padding = (residue - self.length) % 4
+        if padding:
+            self.segments.append(b"\x00" * padding)
+            self.length += padding
+
+    def read(self, offset: int, length: int, source_filepath: Optional[str]) -> bytes:
+        """Читает диапазон [offset, offset + length) чанка."""
+        parts = []
+        source_fd = None
+        try:
+            for segment in self._iter_slice(offset, length):
+                if isinstance(segment, bytes):
+                    parts.append(segment)
+                    continue
+                if source_fd is None:
+                    source_fd = os.open(source_filepath, os.O_RDONLY)
+                parts.append(os.pread(source_fd, segment[1], segment[0]))
+        finally:
+            if source_fd is not None:
+                os.close(source_fd)
+        return b"".join(parts)
+
+    def _iter_slice(
+        self, offset: int, length: int
+    ) -> Iterator[Union[Tuple[int, int], bytes]]:
+        # Части сегментов, попадающие в диапазон [offset, offset + length).
+        end = offset + length
+        position = 0
+        for segment in self.segments:
+            if position >= end:
+                break
+            segment_length = (
+                segment[1] if isinstance(segment, tuple) else len(segment)
+            )
+            start = max(offset, position)
+            stop = min(end, position + segment_length)
+            if start < stop:
+                if isinstance(segment, tuple):
+                    yield segment[0] + start - position, stop - start
+                else:
+                    yield segment[start - position:stop - position]
+            position += segment_length
+
+
+def is_glb(filepath: str) -> bool:
+    return filepath.lower().endswith(".glb")
+
+
+def read_glb(filepath: str) -> Tuple[dict, GLBLayout]:
+    """
+    Читает из GLB-файла только заголовок и JSON-чанк.
+
+    Returns:
+        Tuple[dict, GLBLayout]: JSON-документ файла и расположение чанков,
+        необходимое для последующей записи через write_glb.
+    """
+    return _read_chunks(filepath, orjson.loads)
+
+
+def read_gltf(filepath: str) -> Tuple[GLTF2, GLBLayout]:
+    """
+    То же, что read_glb, но JSON-чанк разбирается в объект GLTF2. Бинарные
+    данные к объекту не привязываются (binary_blob() вернет None).
+    """
+    gltf, layout = _read_chunks(
+        filepath, lambda json_data: GLTF2.gltf_from_json(bytes(json_data))
+    )
+    gltf._path = os.path.dirname(filepath)
+    gltf._name = os.path.basename(filepath)
+    return gltf, layout
+
+
+def read_glb_file(file: BinaryIO, filename: str) -> Tuple[dict, GLBLayout]:
+    """
+    То же, что read_glb, но для открытого файла, например временного файла
+    с телом запроса. filename используется только в сообщениях об ошибках.
+    """
+    file.seek(0, os.SEEK_END)
+    file_size = file.tell()
+
+    def read_at(offset: int, size: int) -> bytes:
+        file.seek(offset)
+        return file.read(size)
+
+    layout = _locate_chunks(read_at, file_size, filename)
+    return (
+        _parse_json_chunk(
+            read_at(layout.json_offset, layout.json_length),
+            0,
+            layout.json_length,
+            orjson.loads,
+        ),
+        layout,
+    )
+
+
+def gltf_to_document(gltf: GLTF2) -> dict:
+    # Аналог GLTF2.gltf_to_json, но без сериализации в строку.
+    return delete_empty_keys(gltf_asdict(gltf))
+
+
+def write_glb(
+    result_filepath: str,
+    document: dict,
+    bin_chunk: BinChunk,
+    source_filepath: Optional[str] = None,
+) -> None:
+    """
+    Записывает GLB-файл: заголовок, JSON-чанк из document и BIN-чанк,
+    собранный из диапазонов файла source_filepath и новых данных.
+    """
+    head, length = _encode_head(document, bin_chunk)
+    bin_padding = -bin_chunk.length % 4
+    metrics.add_value("bytes_written", length)
+
+    result_fd = os.open(
+        result_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+    )
+    source_fd = None
+    try:
+        _write_all(result_fd, head)
+        if bin_chunk.length > 0:
+            for segment in bin_chunk.segments:
+                if isinstance(segment, bytes):
+                    _write_all(result_fd, segment)
+                    continue
+                if source_fd is None:
+                    source_fd = os.open(source_filepath, os.O_RDONLY)
+                offset, segment_length = segment
+                _copy_range(source_fd, result_fd, offset, segment_length)
+            _write_all(result_fd, b"\x00" * bin_padding)
+    finally:
+        if source_fd is not None:
+            os.close(source_fd)
+        os.close(result_fd)
+
+
+def iter_glb(
+    document: dict, bin_chunk: BinChunk, source_file: Optional[BinaryIO] = None
+) -> Tuple[int, Iterator[bytes]]:
+    """
+    То же, что write_glb, но GLB-файл не записывается на диск, а отдается
+    блоками - например, в тело ответа. Диапазоны BIN-чанка читаются из
+    открытого файла source_file по мере отдачи.
+
+    Returns:
+        Tuple[int, Iterator[bytes]]: длина файла и итератор его блоков.
+    """
+    head, length = _encode_head(document, bin_chunk)
+
+    def iter_blocks() -> Iterator[bytes]:
+        yield head
+        if bin_chunk.length == 0:
+            return
+        for segment in bin_chunk.segments:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+            offset, segment_length = segment
+            source_file.seek(offset)
+            while segment_length > 0:
+                data = source_file.read(min(_STREAM_CHUNK_SIZE, segment_length))
+                if not data:
+                    raise EOFError("Исходный GLB-файл изменился во время чтения")
+                segment_length -= len(data)
+                yield data
+        yield b"\x00" * (-bin_chunk.length % 4)
+
+    return length, iter_blocks()
+
+
+def _encode_head(document: dict, bin_chunk: BinChunk) -> Tuple[bytes, int]:
+    """
+    Заголовок файла, JSON-чанк и заголовок BIN-чанка - все, что предшествует
+    бинарным данным.
+
+    Returns:
+        Tuple[bytes, int]: эти данные и длина файла целиком.
+    """
+    json_data = orjson.dumps(document)
+    json_data += b" " * (-len(json_data) % 4)
+    bin_padding = -bin_chunk.length % 4
+
+    length = GLB_HEADER.size + CHUNK_HEADER.size + len(json_data)
+    if bin_chunk.length > 0:
+        length += CHUNK_HEADER.size + bin_chunk.length + bin_padding
+
+    head = [
+        GLB_HEADER.pack(GLB_MAGIC, GLB_VERSION, length),
+        CHUNK_HEADER.pack(len(json_data), CHUNK_TYPE_JSON),
+        json_data,
+    ]
+    if bin_chunk.length > 0:
+        head.append(
+            CHUNK_HEADER.pack(bin_chunk.length + bin_padding, CHUNK_TYPE_BIN)
+        )
+    return b"".join(head), length
+
+
+def _read_chunks(filepath: str, parse_json: Callable) -> Tuple[Any, GLBLayout]:
+    with open(filepath, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        if file_size < GLB_HEADER.size + CHUNK_HEADER.size:
+            _raise_invalid_glb(filepath)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            layout = _locate_chunks(
+                lambda offset, size: mapped[offset:offset + size],
+                file_size,
+                filepath,
+            )
+            document = _parse_json_chunk(
+                mapped, layout.json_offset, layout.json_length, parse_json
+            )
+    # BIN-чанк не читается: он копируется в итоговый файл средствами ядра.
+    metrics.add_value("bytes_read", layout.json_length)
+    return document, layout
+
+
+def _locate_chunks(
+    read_at: Callable[[int, int], bytes], file_size: int, filepath: str
+) -> GLBLayout:
+    # Разбираются только заголовки: read_at(offset, size) читает из файла
+    # size байт по смещению offset.
+    if file_size < GLB_HEADER.size + CHUNK_HEADER.size:
+        _raise_invalid_glb(filepath)
+    magic, _, length = GLB_HEADER.unpack(read_at(0, GLB_HEADER.size))
+    if magic != GLB_MAGIC:
+        _raise_invalid_glb(filepath)
+    length = min(length, file_size)
+
+    layout = None
+    bin_offset, bin_length = None, 0
+    offset = GLB_HEADER.size
+    while offset + CHUNK_HEADER.size <= length:
+        chunk_length, chunk_type = CHUNK_HEADER.unpack(
+            read_at(offset, CHUNK_HEADER.size)
+        )
+        offset += CHUNK_HEADER.size
+        if offset + chunk_length > length:
+            _raise_invalid_glb(filepath)
+        if chunk_type == CHUNK_TYPE_JSON and layout is None:
+            layout = GLBLayout(offset, chunk_length)
+        elif chunk_type == CHUNK_TYPE_BIN and bin_offset is None:
+            bin_offset, bin_length = offset, chunk_length
+        # Прочие чанки (расширения) не поддерживаются и отбрасываются,
+        # так же, как это делает pygltflib.
+        offset += chunk_length
+
+    if layout is None:
+        _raise_invalid_glb(filepath)
+    layout.bin_offset, layout.bin_length = bin_offset, bin_length
+    return layout
+
+
+def _parse_json_chunk(
+    buffer: Union[mmap.mmap, bytes], offset: int, length: int, parse_json: Callable
+):
+    # JSON-чанк дополняется пробелами, а некоторые экспортеры ошибочно
+    # дополняют его нулевыми байтами - их orjson не пропустит.
+    end = offset + length
+    while end > offset and buffer[end - 1] in (0x00, 0x20):
+        end -= 1
+    with memoryview(buffer) as view, view[offset:end] as json_view:
+        return parse_json(json_view)
+
+
+def _raise_invalid_glb(filepath: str):
+    raise GLBEditorException(
+        detail='Файл "%s" не является корректным GLB-файлом' % filepath,
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    with memoryview(data) as view:
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+
+def _copy_range(source_fd: int, result_fd: int, offset: int, length: int) -> None:
+    """
+    Дописывает в result_fd диапазон [offset, offset + length) файла source_fd.
+    Сначала пробуем copy_file_range (копирование внутри ядра, а на CoW-системах
+    вроде btrfs/xfs - вовсе без копирования блоков), затем sendfile, и только
+    если ядро не умеет ни того, ни другого, копируем блоками через память.
+    """
+    copied = 0
+    for kernel_copy in (_copy_file_range, _sendfile):
+        try:
+            while copied < length:
+                count = kernel_copy(
+                    source_fd, result_fd, offset + copied, length - copied
+                )
+                if count == 0:
+                    break
+                copied += count
+        except (AttributeError, OSError):
+            continue
+        if copied == length:
+            return
+
+    while copied < length:
+        data = os.pread(
+            source_fd, min(_COPY_CHUNK_SIZE, length - copied), offset + copied
+        )
+        if not data:
+            raise EOFError("Исходный GLB-файл изменился во время копирования")
+        _write_all(result_fd, data)
+        copied += len(data)
+
+
+def _copy_file_range(source_fd: int, result_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(source_fd, result_fd, count, offset)
+
+
+def _sendfile(source_fd: int, result_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(result_fd, source_fd, offset, count)
@@ -1,5 +1,6 @@
-from datetime import datetime
-from typing import List
+import glob
+import os
+from typing import List, Tuple
 
 
 def split_filename(filename: str) -> List[str]:
@@ -22,7 +23,46 @@ def split_filename_from_path(path_to_file: str) -> List[str]:
         return split_filename(path_to_file[last_slash_idx + 1:])
 
 
-def get_filename_from_timestamp(path_to_file: str) -> str:
+def get_filename_from_digest(path_to_file: str, digest: str) -> str:
     filename, extension = split_filename_from_path(path_to_file)
-    timestamp = datetime.now().time().strftime("%H%M%S")
-    return f"{filename}_{timestamp}{extension}"
+    return f"{filename}_{digest}{extension}"
+
+
+def is_source_pattern(source_path: str) -> bool:
+    # Существующий файл - не шаблон, даже если в его имени есть символы
+    # шаблона (например, "model[1].glb").
+    if os.path.isfile(source_path):
+        return False
+    return os.path.isdir(source_path) or glob.has_magic(source_path)
+
+
+def find_source_files(source_pattern: str) -> List[Tuple[str, str]]:
+    """
+    Находит GLB/GLTF-файлы в директории (без вложенных) или по glob-шаблону
+    (** - с вложенными директориями).
+
+    Returns:
+        List[Tuple[str, str]]: пути к найденным файлам и их директории
+        относительно неизменяемой части шаблона - чтобы разложить результаты
+        по той же структуре директорий.
+    """
+    if os.path.isdir(source_pattern):
+        base_dir = source_pattern
+        source_pattern = os.path.join(source_pattern, "*")
+    else:
+        base_parts = []
+        for part in source_pattern.split("/"):
+            if glob.has_magic(part):
+                break
+            base_parts.append(part)
+        base_dir = "/".join(base_parts) or "."
+
+    found = []
+    for filepath in sorted(glob.glob(source_pattern, recursive=True)):
+        if not filepath.lower().endswith((".glb", ".gltf")):
+            continue
+        if not os.path.isfile(filepath):
+            continue
+        relative_dir = os.path.relpath(os.path.dirname(filepath), base_dir)
+        found.append((filepath, "" if relative_dir == "." else relative_dir))
+    return found
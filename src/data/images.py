@@ -0,0 +1,96 @@
+# Обработка изображений текстур перед встраиванием в GLB-файл: уменьшение
+# до наибольшей стороны, перекодирование в PNG, JPEG или WebP, удаление
+# метаданных (EXIF, ICC-профиль, текстовые чанки PNG).
+#
+# Функции модуля не обращаются к кэшам и метрикам, поэтому их можно вызывать
+# из нескольких потоков: Pillow отпускает GIL на время масштабирования
+# и кодирования (см. data/cache.TexturePayloadCache.load_many).
+import mimetypes
+from io import BytesIO
+from typing import Optional, Tuple
+
+from fastapi import status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.core.exceptions import GLBEditorException
+from src.domain.entities import TextureProcessing
+
+# Форматы, которые можно встроить в GLB-файл: PNG и JPEG - по спецификации
+# glTF, WebP - с расширением EXT_texture_webp.
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+_PIL_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+_FORMATS_BY_PIL = {value: key for key, value in _PIL_FORMATS.items()}
+
+
+def get_mime_type(
+    filepath: str, processing: Optional[TextureProcessing]
+) -> Optional[str]:
+    """
+    MIME-тип изображения, которое будет встроено вместо файла текстуры:
+    без обработки - по расширению файла (как в кэше текстур), с обработкой -
+    формат из processing или, как в transcode, формат самого файла.
+    Читается только заголовок изображения.
+    """
+    if processing is None:
+        return mimetypes.guess_type(filepath)[0]
+    if processing.format is not None:
+        return MIME_TYPES[processing.format]
+    try:
+        with Image.open(filepath) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        # Такой файл не обработает и transcode - ошибку вернет он.
+        return None
+    return MIME_TYPES[_FORMATS_BY_PIL.get(image_format, "png")]
+
+
+def transcode(data: bytes, processing: TextureProcessing) -> Tuple[bytes, str]:
+    """
+    Обрабатывает содержимое файла текстуры по параметрам processing.
+
+    Returns:
+        Tuple[bytes, str]: содержимое обработанного изображения и его MIME-тип.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        # Формат по умолчанию - формат исходного файла, если его можно
+        # встроить в GLB-файл, иначе PNG.
+        image_format = processing.format or _FORMATS_BY_PIL.get(image.format, "png")
+        if processing.max_size and image.format == "JPEG":
+            # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8),
+            # не меньшем требуемого, - это намного быстрее полного декодирования.
+            image.draft(image.mode, (processing.max_size, processing.max_size))
+
+        save_options = {}
+        if not processing.strip_metadata:
+            for key in ("exif", "icc_profile"):
+                if image.info.get(key):
+                    save_options[key] = image.info[key]
+        else:
+            # Без метаданных теряется и ориентация из EXIF - применяем ее
+            # к самому изображению.
+            image = ImageOps.exif_transpose(image)
+
+        if processing.max_size and max(image.size) > processing.max_size:
+            image.thumbnail(
+                (processing.max_size, processing.max_size), Image.Resampling.LANCZOS
+            )
+
+        if image_format == "jpeg":
+            # JPEG не поддерживает прозрачность и палитру.
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            save_options.update(quality=processing.quality, optimize=True)
+        elif image_format == "webp":
+            save_options.update(quality=processing.quality, method=4)
+        else:
+            save_options.update(optimize=True)
+
+        output = BytesIO()
+        image.save(output, format=_PIL_FORMATS[image_format], **save_options)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        raise GLBEditorException(
+            detail=f"Не удалось обработать изображение текстуры: {e}",
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return output.getvalue(), MIME_TYPES[image_format]
@@ -0,0 +1,225 @@
+# Сводка о содержимом GLB/GLTF-файла для клиентов, которым нужно знать имена
+# материалов и слоты текстур до правки (см. /inspect).
+#
+# Сводка строится по JSON-документу файла: из GLB-файла читаются только
+# заголовок и JSON-чанк (data/glb.read_glb), BIN-чанк не читается. Поэтому
+# размеры изображений - размеры в байтах, а не в пикселях: для пикселей
+# пришлось бы читать сами изображения.
+import os
+from typing import Iterator, Optional, Tuple
+from urllib.parse import unquote
+
+import orjson
+from fastapi import status
+
+from src.core.exceptions import GLBEditorException
+from src.data.references import MATERIAL_TEXTURE_SLOTS
+
+# Режимы отрисовки примитивов (mode) по спецификации GLTF.
+_TRIANGLES = 4
+_TRIANGLE_STRIP = 5
+_TRIANGLE_FAN = 6
+
+
+def make_etag(filepath: str) -> str:
+    """
+    ETag файла по его размеру, времени модификации и inode - тем же
+    признакам, по которым кэш исходных файлов (data/cache) определяет,
+    что файл изменился. Файл при этом не читается.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        raise GLBEditorException(
+            detail='Файл "%s" отсутствует на сервере' % filepath,
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return 'W/"%x-%x-%x"' % (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def read_gltf_document(filepath: str) -> dict:
+    """JSON-документ GLTF-файла (не GLB). Внешние буферы не читаются."""
+    try:
+        with open(filepath, "rb") as gltf_file:
+            return orjson.loads(gltf_file.read())
+    except orjson.JSONDecodeError:
+        raise GLBEditorException(
+            detail='Файл "%s" не является корректным GLTF-файлом' % filepath,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+
+def summarize(document: dict, filepath: str, bin_length: int = 0) -> dict:
+    """
+    Сводка о файле: материалы (факторы PBR и слоты текстур), текстуры,
+    изображения (способ хранения и размер в байтах) и статистика геометрии.
+
+    Args:
+        document (dict): JSON-документ файла
+        filepath (str): путь к файлу - относительно него ищутся внешние
+        изображения
+        bin_length (int, optional): длина BIN-чанка GLB-файла
+    """
+    try:
+        return _summarize(document, filepath, bin_length)
+    except (IndexError, KeyError, TypeError, AttributeError):
+        # Индекс несуществующего объекта (accessor, bufferView) или объект
+        # не того типа.
+        raise GLBEditorException(
+            detail='Файл "%s" не является корректным GLTF-файлом' % filepath,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+
+def _summarize(document: dict, filepath: str, bin_length: int) -> dict:
+    accessors = document.get("accessors", [])
+    buffer_views = document.get("bufferViews", [])
+    base_dir = os.path.dirname(filepath)
+    asset = document.get("asset", {})
+    return {
+        "path": filepath,
+        "asset": {key: asset.get(key) for key in ("version", "generator")},
+        "extensionsUsed": document.get("extensionsUsed", []),
+        "extensionsRequired": document.get("extensionsRequired", []),
+        "materials": [
+            _summarize_material(index, material)
+            for index, material in enumerate(document.get("materials", []))
+        ],
+        "textures": [
+            _summarize_texture(index, texture)
+            for index, texture in enumerate(document.get("textures", []))
+        ],
+        "images": [
+            _summarize_image(index, image, buffer_views, base_dir)
+            for index, image in enumerate(document.get("images", []))
+        ],
+        "geometry": _summarize_geometry(document, accessors, bin_length),
+    }
+
+
+def _summarize_material(index: int, material: dict) -> dict:
+    pbr = material.get("pbrMetallicRoughness", {})
+    return {
+        "index": index,
+        "name": material.get("name"),
+        "alphaMode": material.get("alphaMode", "OPAQUE"),
+        "doubleSided": material.get("doubleSided", False),
+        "emissiveFactor": material.get("emissiveFactor", [0.0, 0.0, 0.0]),
+        "pbrMetallicRoughness": {
+            "baseColorFactor": pbr.get("baseColorFactor", [1.0, 1.0, 1.0, 1.0]),
+            "metallicFactor": pbr.get("metallicFactor", 1.0),
+            "roughnessFactor": pbr.get("roughnessFactor", 1.0),
+        },
+        "textures": [
+            {"slot": ".".join(slot), **texture_info}
+            for slot, texture_info in _iter_texture_slots(material)
+        ],
+    }
+
+
+def _iter_texture_slots(material: dict) -> Iterator[Tuple[Tuple[str, ...], dict]]:
+    # Слоты по спецификации и поля *Texture расширений материалов
+    # (KHR_materials_*), как и при сжатии файла (data/compaction).
+    for slot in MATERIAL_TEXTURE_SLOTS:
+        texture_info = material
+        for key in slot:
+            texture_info = texture_info.get(key)
+            if not isinstance(texture_info, dict):
+                break
+        else:
+            if "index" in texture_info:
+                yield slot, _texture_info(texture_info)
+    for name, extension in (material.get("extensions") or {}).items():
+        if not isinstance(extension, dict):
+            continue
+        for key, texture_info in extension.items():
+            if (
+                key.endswith("Texture")
+                and isinstance(texture_info, dict)
+                and "index" in texture_info
+            ):
+                yield ("extensions", name, key), _texture_info(texture_info)
+
+
+def _texture_info(texture_info: dict) -> dict:
+    return {
+        "texture": texture_info["index"],
+        "texCoord": texture_info.get("texCoord", 0),
+    }
+
+
+def _summarize_texture(index: int, texture: dict) -> dict:
+    # Изображение текстуры может быть задано в расширении (EXT_texture_webp,
+    # KHR_texture_basisu и т.д.) вместо source.
+    source = texture.get("source")
+    for extension in (texture.get("extensions") or {}).values():
+        if source is None and isinstance(extension, dict):
+            source = extension.get("source")
+    return {
+        "index": index,
+        "name": texture.get("name"),
+        "sampler": texture.get("sampler"),
+        "source": source,
+    }
+
+
+def _summarize_image(
+    index: int, image: dict, buffer_views: list, base_dir: str
+) -> dict:
+    summary = {
+        "index": index,
+        "name": image.get("name"),
+        "mimeType": image.get("mimeType"),
+    }
+    uri = image.get("uri")
+    if image.get("bufferView") is not None:
+        summary["storage"] = "bufferView"
+        summary["bytes"] = buffer_views[image["bufferView"]].get("byteLength")
+    elif uri is not None and uri.startswith("data:"):
+        summary["storage"] = "dataURI"
+        summary["bytes"] = _get_data_uri_length(uri)
+    elif uri is not None:
+        summary["storage"] = "uri"
+        summary["uri"] = uri
+        summary["bytes"] = _get_file_length(os.path.join(base_dir, unquote(uri)))
+    return summary
+
+
+def _get_data_uri_length(uri: str) -> int:
+    # Длина декодированных данных base64 - без декодирования.
+    data = uri[uri.find(",") + 1:]
+    return len(data) * 3 // 4 - data[-2:].count("=")
+
+
+def _get_file_length(filepath: str) -> Optional[int]:
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return None
+
+
+def _summarize_geometry(document: dict, accessors: list, bin_length: int) -> dict:
+    primitives_count = vertices_count = triangles_count = 0
+    for mesh in document.get("meshes", []):
+        for primitive in mesh.get("primitives", []):
+            primitives_count += 1
+            position = primitive.get("attributes", {}).get("POSITION")
+            vertices = accessors[position]["count"] if position is not None else 0
+            vertices_count += vertices
+            indices = primitive.get("indices")
+            count = accessors[indices]["count"] if indices is not None else vertices
+            mode = primitive.get("mode", _TRIANGLES)
+            if mode == _TRIANGLES:
+                triangles_count += count // 3
+            elif mode in (_TRIANGLE_STRIP, _TRIANGLE_FAN):
+                triangles_count += max(count - 2, 0)
+    return {
+        "meshes": len(document.get("meshes", [])),
+        "primitives": primitives_count,
+        "vertices": vertices_count,
+        "triangles": triangles_count,
+        "nodes": len(document.get("nodes", [])),
+        "accessors": len(accessors),
+        "bufferViews": len(document.get("bufferViews", [])),
+        "binBytes": bin_length,
+    }
@@ -0,0 +1,138 @@
+# Оценка пиковой памяти задач пула (см. core/admission) по размерам исходного
+# файла и файлов текстур и по способу правки. Оценка вычисляется в воркере
+# uvicorn до отправки задачи в пул (в потоке, не в цикле событий), поэтому
+# данные файлов не читаются - только их размеры, заголовок GLB-файла,
+# JSON-документ GLTF-файла и заголовки изображений текстур.
+#
+# Коэффициенты подобраны по приросту памяти процесса пула на моделях
+# из benchmarks/generate. Гистограмма glbeditor_memory_estimate_ratio
+# (/glbeditor/metrics) показывает отношение фактической памяти к оценке:
+# если оно стабильно далеко от 1, коэффициенты стоит подстроить.
+import os
+import struct
+from typing import List, Optional, Tuple
+from urllib.parse import unquote
+
+import orjson
+from PIL import Image, UnidentifiedImageError
+
+from src.core.settings import settings
+from src.data.glb import CHUNK_HEADER, GLB_HEADER, is_glb
+from src.data.resources import is_external
+from src.domain.entities import (PropertiesData, TextureProcessing,
+                                 _SingleTextureChange)
+
+# Память задачи помимо данных файла: промежуточные объекты, буферы записи.
+BASE_BYTES = 8 * 1024 * 1024
+# Разобранный JSON-документ (словари или объекты pygltflib) на байт JSON-чанка.
+JSON_FACTOR = 12
+# Загрузка файла средствами pygltflib и запись: BIN-чанк в памяти и его копии
+# при сборке итогового файла, на байт BIN-чанка.
+FULL_LOAD_FACTOR = 4
+# Кодирование изображений в DataURI: BIN-чанк, base64-строки изображений
+# и их копии при записи JSON, на байт BIN-чанка и файлов текстур.
+DATA_URI_FACTOR = 5
+# Файл текстуры в кэше текстур и в записываемом файле, на байт файла.
+TEXTURE_FACTOR = 2
+# Обработка изображения (см. data/images): декодированное изображение
+# и его уменьшенная или преобразованная копия, на байт пикселей RGBA.
+DECODED_TEXTURE_FACTOR = 2
+
+
+def estimate_parameters(request_data_object: PropertiesData) -> int:
+    source_filepath = request_data_object.source_filepath
+    json_bytes, bin_bytes = _get_chunk_sizes(source_filepath)
+    estimate = BASE_BYTES + JSON_FACTOR * json_bytes
+    if not (
+        request_data_object.dry_run
+        or (settings.glb.zero_copy and is_glb(source_filepath))
+    ):
+        estimate += FULL_LOAD_FACTOR * bin_bytes
+    return estimate
+
+
+def estimate_textures(
+    source_filepath: str,
+    files: List[_SingleTextureChange],
+    processing: Optional[TextureProcessing],
+    dry_run: bool = False,
+) -> int:
+    """Оценка замены текстур (TexturesData) и совместной правки (EditData)."""
+    json_bytes, bin_bytes = _get_chunk_sizes(source_filepath)
+    estimate = BASE_BYTES + JSON_FACTOR * json_bytes
+    if dry_run:
+        return estimate
+    if is_glb(source_filepath):
+        data_uri = settings.glb.textures_embedding != "bufferview"
+    else:
+        # Внешние ресурсы GLTF-файла в итоговый файл не встраиваются, если
+        # это не требуется настройкой (см. data/resources).
+        data_uri = settings.glb.gltf_resources == "embed"
+    if data_uri:
+        estimate += DATA_URI_FACTOR * bin_bytes
+    # Одна и та же текстура в запросе загружается один раз.
+    for filepath in {change.texturefilepath for change in files}:
+        estimate += (DATA_URI_FACTOR if data_uri else TEXTURE_FACTOR) * _get_size(
+            filepath
+        )
+        if processing is not None:
+            estimate += DECODED_TEXTURE_FACTOR * _get_pixels_size(filepath)
+    return estimate
+
+
+def _get_chunk_sizes(filepath: str) -> Tuple[int, int]:
+    """
+    Размеры JSON- и BIN-чанков GLB-файла по его заголовку. Для GLTF-файла
+    весь файл считается JSON-документом, а BIN-чанком - его внешние буферы
+    и изображения. Для файла, заголовок которого не удалось прочитать, весь
+    файл считается JSON-документом.
+    """
+    file_size = _get_size(filepath)
+    if not is_glb(filepath):
+        return file_size, _get_external_size(filepath)
+    header_size = GLB_HEADER.size + CHUNK_HEADER.size
+    try:
+        with open(filepath, "rb") as glb_file:
+            header = glb_file.read(header_size)
+        json_length, _ = CHUNK_HEADER.unpack_from(header, GLB_HEADER.size)
+    except (OSError, struct.error):
+        return file_size, 0
+    json_length = min(json_length, file_size)
+    return json_length, max(file_size - header_size - json_length, 0)
+
+
+def _get_external_size(filepath: str) -> int:
+    # Суммарный размер файлов, на которые ссылаются буферы и изображения
+    # GLTF-файла. Ошибки разбора сообщит сама правка.
+    try:
+        with open(filepath, "rb") as gltf_file:
+            document = orjson.loads(gltf_file.read())
+    except (OSError, orjson.JSONDecodeError):
+        return 0
+    if not isinstance(document, dict):
+        return 0
+    directory = os.path.dirname(os.path.abspath(filepath))
+    size = 0
+    for key in ("buffers", "images"):
+        for obj in document.get(key) or []:
+            uri = obj.get("uri") if isinstance(obj, dict) else None
+            if isinstance(uri, str) and is_external(uri):
+                size += _get_size(os.path.join(directory, unquote(uri)))
+    return size
+
+
+def _get_pixels_size(filepath: str) -> int:
+    # Pillow читает только заголовок изображения, пиксели не декодируются.
+    try:
+        with Image.open(filepath) as image:
+            width, height = image.size
+    except (OSError, UnidentifiedImageError):
+        return 0
+    return width * height * 4
+
+
+def _get_size(filepath: str) -> int:
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return 0
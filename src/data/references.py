@@ -0,0 +1,167 @@
+# Индекс ссылок между материалами, текстурами и изображениями GLTF-документа.
+#
+# Замена текстуры должна знать, кто еще ссылается на ту же текстуру и на то же
+# изображение. Перебирать для этого все материалы и текстуры при каждом
+# изменении - квадратичная сложность на моделях с тысячами материалов, поэтому
+# ссылки собираются один раз на документ и поддерживаются в актуальном
+# состоянии по мере добавления текстур и изображений.
+from collections import defaultdict
+from copy import deepcopy
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from pygltflib import GLTF2, Material, Texture
+from pygltflib.utils import Image
+
+# Слот материала - путь от материала до объекта со ссылкой на текстуру,
+# например ("pbrMetallicRoughness", "baseColorTexture") или ("normalTexture",).
+Slot = Tuple[str, ...]
+
+MATERIAL_TEXTURE_SLOTS: Tuple[Slot, ...] = (
+    ("pbrMetallicRoughness", "baseColorTexture"),
+    ("pbrMetallicRoughness", "metallicRoughnessTexture"),
+    ("normalTexture",),
+    ("occlusionTexture",),
+    ("emissiveTexture",),
+)
+
+
+class TextureReferences:
+    """
+    Индекс ссылок документа: имя материала -> индекс материала,
+    текстура -> слоты материалов, которые на нее ссылаются,
+    изображение -> текстуры, которые на него ссылаются.
+
+    Изменять ссылки в документе после построения индекса нужно через его
+    методы (add_image, add_texture, set_texture_source, set_slot_texture),
+    иначе индекс перестанет соответствовать документу.
+
+    Материалы и текстуры документа могут быть общими с кэшем исходных файлов
+    (см. data/cache.load_gltf), поэтому изменять их можно только через
+    own_material и own_texture: при первом изменении объект заменяется
+    в документе копией.
+    """
+
+    def __init__(self, gltf: GLTF2):
+        self._gltf = gltf
+        self._materials_by_name: Dict[str, int] = {}
+        self._texture_slots: Dict[int, Set[Tuple[int, Slot]]] = defaultdict(set)
+        self._image_textures: Dict[int, Set[int]] = defaultdict(set)
+        # Изображения, добавленные через индекс, - по пути к файлу, чтобы
+        # одно и то же новое изображение не добавлялось в файл дважды.
+        self._added_images: Dict[str, int] = {}
+        # Материалы и текстуры, уже замененные копиями или добавленные.
+        self._owned_materials: Set[int] = set()
+        self._owned_textures: Set[int] = set()
+
+        for material_idx, material in enumerate(gltf.materials):
+            # Как и раньше, из материалов с одинаковыми именами
+            # используется первый.
+            self._materials_by_name.setdefault(material.name, material_idx)
+            for slot, texture_idx in _iter_material_textures(material):
+                self._texture_slots[texture_idx].add((material_idx, slot))
+        for texture_idx, texture in enumerate(gltf.textures):
+            for image_idx in _iter_texture_images(texture):
+                self._image_textures[image_idx].add(texture_idx)
+
+    def find_material(self, name: str) -> Optional[int]:
+        return self._materials_by_name.get(name)
+
+    def is_texture_shared(self, texture_idx: int) -> bool:
+        """
+        Ссылается ли на текстуру еще какой-либо слот материала (в том числе
+        другой слот того же материала), или на ее изображение - еще какая-либо
+        текстура.
+        """
+        if len(self._texture_slots.get(texture_idx, ())) > 1:
+            return True
+        return any(
+            len(self._image_textures.get(image_idx, ())) > 1
+            for image_idx in _iter_texture_images(self._gltf.textures[texture_idx])
+        )
+
+    def own_material(self, material_idx: int) -> Material:
+        if material_idx not in self._owned_materials:
+            materials = self._gltf.materials
+            materials[material_idx] = deepcopy(materials[material_idx])
+            self._owned_materials.add(material_idx)
+        return self._gltf.materials[material_idx]
+
+    def own_texture(self, texture_idx: int) -> Texture:
+        if texture_idx not in self._owned_textures:
+            textures = self._gltf.textures
+            textures[texture_idx] = deepcopy(textures[texture_idx])
+            self._owned_textures.add(texture_idx)
+        return self._gltf.textures[texture_idx]
+
+    def add_image(self, image: Image) -> int:
+        image_idx = self._added_images.get(image.uri)
+        if image_idx is None:
+            self._gltf.images.append(image)
+            image_idx = len(self._gltf.images) - 1
+            self._added_images[image.uri] = image_idx
+        return image_idx
+
+    def add_texture(self, texture: Texture) -> int:
+        self._gltf.textures.append(texture)
+        texture_idx = len(self._gltf.textures) - 1
+        self._owned_textures.add(texture_idx)
+        for image_idx in _iter_texture_images(texture):
+            self._image_textures[image_idx].add(texture_idx)
+        return texture_idx
+
+    def set_texture_source(self, texture_idx: int, image_idx: int) -> None:
+        texture = self.own_texture(texture_idx)
+        if texture.source is not None:
+            self._image_textures[texture.source].discard(texture_idx)
+        texture.source = image_idx
+        self._image_textures[image_idx].add(texture_idx)
+
+    def set_slot_texture(
+        self, material_idx: int, slot: Slot, texture_idx: int,
+        previous_texture_idx: Optional[int] = None,
+    ) -> None:
+        """
+        Учитывает в индексе, что слот материала теперь ссылается на другую
+        текстуру. Сама ссылка в материале изменяется вызывающим кодом.
+        """
+        if previous_texture_idx is not None:
+            self._texture_slots[previous_texture_idx].discard((material_idx, slot))
+        self._texture_slots[texture_idx].add((material_idx, slot))
+
+
+def _iter_material_textures(material: Material) -> Iterator[Tuple[Slot, int]]:
+    for slot in MATERIAL_TEXTURE_SLOTS:
+        texture_info = material
+        for name in slot:
+            texture_info = getattr(texture_info, name, None)
+            if texture_info is None:
+                break
+        index = getattr(texture_info, "index", None)
+        if isinstance(index, int):
+            yield slot, index
+    # Расширения материалов (KHR_materials_*) тоже ссылаются на текстуры,
+    # и замена общего изображения изменила бы и их.
+    if material.extensions:
+        yield from _iter_extension_textures(material.extensions, ("extensions",))
+
+
+def _iter_extension_textures(value, path: Slot) -> Iterator[Tuple[Slot, int]]:
+    if not isinstance(value, dict):
+        return
+    for key, item in value.items():
+        if not isinstance(item, dict):
+            continue
+        if key.endswith("Texture") and isinstance(item.get("index"), int):
+            yield path + (key,), item["index"]
+        else:
+            yield from _iter_extension_textures(item, path + (key,))
+
+
+def _iter_texture_images(texture: Texture) -> Iterator[int]:
+    if texture.source is not None:
+        yield texture.source
+    # Расширения текстур (EXT_texture_webp, KHR_texture_basisu и т.д.)
+    # задают альтернативные изображения.
+    for extension in (texture.extensions or {}).values():
+        if isinstance(extension, dict) and isinstance(extension.get("source"), int):
+            yield extension["source"]
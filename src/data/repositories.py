@@ -1,81 +1,263 @@
 # Здесь находится уровень непосредственной работы с данными
-import json
+import mimetypes
 import os
-from copy import deepcopy
-from typing import Optional
+from copy import copy, deepcopy
+from dataclasses import asdict, is_dataclass
+from typing import (BinaryIO, Iterator, List, Optional, Tuple, get_args,
+                    get_type_hints)
+from urllib.parse import quote
 
 from fastapi import status
-from pygltflib import (GLTF2, Material, NormalMaterialTexture,
-                       PbrMetallicRoughness, TextureInfo)
+from fastapi.concurrency import run_in_threadpool
+from pygltflib import (GLTF2, Buffer, BufferView, Material,
+                       NormalMaterialTexture, PbrMetallicRoughness,
+                       TextureInfo)
 from pygltflib.utils import Image, ImageFormat, Texture
 
+from src.core import metrics
 from src.core.exceptions import GLBEditorException
+from src.core.executor import run_in_pool
 from src.core.settings import settings
-from src.data.helpers import get_filename_from_timestamp
-from src.domain.entities import PropertiesData, TexturesData
-from src.domain.repositories import (IGLBParamsRepository,
+from src.core.singleflight import single_flight
+from src.data.bulk import apply_operations, select
+from src.data.cache import load_document, load_gltf, texture_cache
+from src.data.compaction import compact
+from src.data.diff import diff_section, diff_values, to_json
+from src.data.glb import (BinChunk, GLBLayout, gltf_to_document, is_glb,
+                          iter_glb, read_glb, read_glb_file, write_glb)
+from src.data.helpers import get_filename_from_digest
+from src.data.images import get_mime_type
+from src.data.inspection import read_gltf_document, summarize
+from src.data.memory import estimate_parameters, estimate_textures
+from src.data.references import Slot, TextureReferences
+from src.data.resources import ResultResources, get_resources_directory
+from src.data.results import (atomic_output, get_result_filepath, load_replay,
+                              make_edit_digest, result_lock, save_replay)
+from src.domain.entities import (EditData, MaterialOperation, PropertiesData,
+                                 TextureProcessing, TexturesData)
+from src.domain.repositories import (IGLBEditRepository, IGLBInspectRepository,
+                                     IGLBParamsRepository,
                                      IGLBTexturesRepository)
 
 
 class GLBParamsRepository(IGLBParamsRepository):
 
+    @staticmethod
+    def _is_same_type(current_value, new_value) -> bool:
+        # Вложенные объекты pygltflib (PbrMetallicRoughness, TextureInfo и т.д.)
+        # в запросе приходят словарями.
+        if is_dataclass(current_value):
+            return isinstance(new_value, dict)
+        return type(new_value) == type(current_value) or (
+            type(new_value) in (int, float)
+            and type(current_value) in (int, float)
+        )
+
     @classmethod
-    def _unite_dict(cls, dic1: dict, dic2: dict) -> dict:
-        temp = deepcopy(dic1)
-        for key in dic2:
-            try:
-                assert type(dic2[key]) == type(temp[key]) or (
-                    type(dic2[key]) in (int, float)
-                    and type(temp[key]) in (int, float)
+    def _unite_object(cls, target, changes: dict, schema: type = None) -> None:
+        """
+        Вносит изменения из словаря changes прямо в загруженный объект файла.
+        Объект не копируется и не пересобирается, поэтому время слияния
+        зависит от объема изменений, а не от размера файла.
+
+        Правила слияния:
+        1) вложенные объекты и словари сливаются рекурсивно;
+        2) в списках заменяются первые len(новый список) элементов, остальные
+        сохраняются;
+        3) прочие значения заменяются целиком;
+        4) параметр, отсутствующий в исходном файле, добавляется.
+
+        Args:
+            target: датакласс pygltflib (Material, PbrMetallicRoughness и т.д.)
+            или словарь - json-представление такого объекта, либо
+            произвольный словарь (extensions, extras)
+            changes (dict): изменения в json-представлении
+            schema (type | None, optional): датакласс pygltflib, по полям
+            которого проверяются изменения словаря target. Для датаклассов
+            определяется автоматически.
+        """
+        is_dict = isinstance(target, dict)
+        if not is_dict:
+            schema = type(target)
+        type_hints = get_type_hints(schema) if schema else None
+        for key, new_value in changes.items():
+            if type_hints is not None and key not in type_hints:
+                raise GLBEditorException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Параметр {key} не предусмотрен спецификацией GLTF"
+                    f" для объекта {schema.__name__}",
                 )
-            except AssertionError:
+            field_schema = (
+                cls._get_field_schema(type_hints[key]) if type_hints else None
+            )
+            current_value = target.get(key) if is_dict else getattr(target, key)
+
+            if current_value is None:
+                # Параметра в исходном файле нет - добавляем его. Если это
+                # вложенный объект датакласса, собираем соответствующий
+                # датакласс.
+                if is_dict:
+                    target[key] = new_value
+                else:
+                    if field_schema and isinstance(new_value, dict):
+                        new_value = field_schema.from_dict(new_value)
+                    setattr(target, key, new_value)
+                continue
+
+            if not cls._is_same_type(current_value, new_value):
                 raise GLBEditorException(
                     status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                     detail="Заменяющие параметры GLB-файла должны быть одного типа данных",
                 )
-            if isinstance(temp[key], dict):
-                temp[key] = cls._unite_dict(temp[key], dic2[key])
-            elif isinstance(temp[key], list):
-                temp[key] = [*dic2[key], *temp[key][len(dic2[key]):]]
+            if is_dataclass(current_value) or isinstance(current_value, dict):
+                cls._unite_object(current_value, new_value, field_schema)
+            elif isinstance(current_value, list):
+                current_value[:len(new_value)] = new_value
+            elif is_dict:
+                target[key] = new_value
             else:
-                temp[key] = dic2[key]
-        return temp
+                setattr(target, key, new_value)
+
+    @staticmethod
+    def _get_field_schema(type_hint) -> Optional[type]:
+        # Аннотации полей pygltflib имеют вид Optional[PbrMetallicRoughness].
+        for field_type in (type_hint, *get_args(type_hint)):
+            if is_dataclass(field_type):
+                return field_type
+        return None
+
+    @classmethod
+    def _apply_material_changes(
+        cls,
+        materials: list,
+        changes_list: list,
+        operations: Optional[List[MaterialOperation]] = None,
+    ) -> int:
+        """
+        Применяет изменения к материалам файла, отбирая их по имени, а затем
+        массовые операции (см. data/bulk), отбирая материалы по шаблону имени.
+        Материалы - объекты Material или их json-представление.
+
+        Returns:
+            int: число измененных материалов файла.
+        """
+        # Если в запросе несколько изменений одного материала, применяется
+        # первое из них.
+        changes_by_name = {}
+        for changes in changes_list:
+            changes_by_name.setdefault(changes["name"], changes)
+        changed_indices = set()
+        for index, material in enumerate(materials):
+            is_dict = isinstance(material, dict)
+            material_name = material.get("name") if is_dict else material.name
+            current_changes = changes_by_name.get(material_name)
+            if current_changes is not None:
+                # Материал может принадлежать закэшированному исходному файлу,
+                # поэтому изменения вносятся в его копию.
+                materials[index] = material = deepcopy(material)
+                cls._unite_object(material, current_changes, Material)
+                changed_indices.add(index)
+        if operations:
+            apply_operations(materials, operations, changed_indices)
+        return len(changed_indices)
 
     async def change_parameters(self, request_data_object: PropertiesData):
+        # Загрузка, редактирование и сохранение файла выполняются в пуле
+        # процессов, чтобы не блокировать цикл событий. Одновременные
+        # одинаковые запросы получают результат одной правки.
+        async def run():
+            # Оценка читает заголовки файлов, поэтому тоже не выполняется
+            # в цикле событий.
+            memory_bytes = await run_in_threadpool(
+                estimate_parameters, request_data_object
+            )
+            return await run_in_pool(
+                self._change_parameters,
+                request_data_object,
+                memory_bytes=memory_bytes,
+            )
+
+        return await single_flight.run(("parameters", request_data_object), run)
+
+    def _change_parameters(self, request_data_object: PropertiesData) -> dict:
         source_filepath = request_data_object.source_filepath
         if not os.path.exists(source_filepath):
             raise GLBEditorException(
                 detail='Файл "%s" отсутствует на сервере' % source_filepath,
                 status_code=status.HTTP_400_BAD_REQUEST
             )
-        gltf = GLTF2().load(source_filepath)
-        gltf_dict = json.loads(gltf.gltf_to_json())
-        materials = gltf_dict["materials"]
-        changing_params_names = [
-            material["name"] for material in request_data_object.materials
-        ]
-        for i in range(len(materials)):
-            if materials[i]["name"] in changing_params_names:
-                current_changes = next(
-                    filter(
-                        lambda changing_elem: materials[i]["name"]
-                        == changing_elem["name"],
-                        request_data_object.materials,
-                    )
-                )
-                materials[i] = self._unite_dict(materials[i], current_changes)
-        gltf_dict["materials"] = materials
-        try:
-            back_convert = gltf.gltf_from_json(json.dumps(gltf_dict))
-            back_convert.set_binary_blob(gltf.binary_blob())
-            new_filename = get_filename_from_timestamp(
-                request_data_object.source_filepath.split("/").pop()
+        if request_data_object.dry_run:
+            return self._plan_parameters(request_data_object)
+        with metrics.stage("digest"):
+            result_filepath = get_result_filepath(
+                request_data_object.result_filepath,
+                source_filepath,
+                make_edit_digest(
+                    "parameters",
+                    source_filepath,
+                    _get_parameters_changes(request_data_object),
+                ),
             )
-            if not os.path.exists(request_data_object.result_filepath):
-                os.mkdir(request_data_object.result_filepath)
+        # Такая же правка такого же файла уже выполнялась - возвращаем
+        # готовый итоговый файл, не загружая модель.
+        response = load_replay(result_filepath)
+        if response is not None:
+            return response
+        # Такая же правка может выполняться прямо сейчас - дожидаемся ее
+        # и проверяем еще раз.
+        with result_lock(result_filepath):
+            response = load_replay(result_filepath, required=False)
+            if response is None:
+                response = self._write_parameters(request_data_object, result_filepath)
+                if response["result"] is not None:
+                    save_replay(result_filepath, response)
+            return response
 
-            result_filepath = os.path.join(request_data_object.result_filepath, new_filename)
-            back_convert.save(result_filepath)
+    def _write_parameters(
+        self, request_data_object: PropertiesData, result_filepath: str
+    ) -> dict:
+        source_filepath = request_data_object.source_filepath
+        with metrics.stage("load"):
+            if settings.glb.zero_copy and is_glb(source_filepath):
+                # Изменяется только JSON-чанк: читаем его, не загружая BIN-чанк,
+                # и правим материалы прямо в json-представлении.
+                gltf = None
+                document, layout = load_document(source_filepath)
+                materials = document.get("materials", [])
+            else:
+                gltf = _load_gltf_fully(source_filepath)
+                materials = gltf.materials
+        with metrics.stage("edit"):
+            changed_count = self._apply_material_changes(
+                materials,
+                request_data_object.materials,
+                request_data_object.operations,
+            )
+        metrics.add_value("materials_changed", changed_count)
+        if changed_count == 0 and request_data_object.skip_missing_materials:
+            return {"status": "Пропущен", "result": None}
+        try:
+            if gltf is None:
+                with metrics.stage("save"), atomic_output(
+                    result_filepath
+                ) as temp_filepath:
+                    write_glb(
+                        temp_filepath,
+                        document,
+                        BinChunk.from_layout(layout),
+                        source_filepath,
+                    )
+            else:
+                resources = ResultResources(source_filepath, result_filepath)
+                if not is_glb(source_filepath):
+                    with metrics.stage("encode"):
+                        resources.prepare([*gltf.buffers, *gltf.images])
+                with metrics.stage("save"), resources.output(
+                    [*gltf.buffers, *gltf.images]
+                ) as temp_filepath:
+                    _save_gltf(gltf, temp_filepath)
+        except GLBEditorException as e:
+            raise e
         except Exception as e:
             raise GLBEditorException(
                 detail=f"Exception occurred: {e}",
@@ -83,6 +265,66 @@ class GLBParamsRepository(IGLBParamsRepository):
             )
         return {"status": "Готово", "result": result_filepath}
 
+    def _plan_parameters(self, request_data_object: PropertiesData) -> dict:
+        # Пробный запуск: изменения вносятся в загруженные материалы так же,
+        # как при правке, но вместо записи итогового файла возвращаются
+        # различия. BIN-чанк GLB-файла не читается.
+        source_filepath = request_data_object.source_filepath
+        with metrics.stage("load"):
+            if is_glb(source_filepath):
+                materials = load_document(source_filepath)[0].get("materials", [])
+            else:
+                materials = _load_gltf_fully(source_filepath).materials
+        original_materials = list(materials)
+        with metrics.stage("edit"):
+            changed_count = self._apply_material_changes(
+                materials,
+                request_data_object.materials,
+                request_data_object.operations,
+            )
+        metrics.add_value("materials_changed", changed_count)
+        if changed_count == 0 and request_data_object.skip_missing_materials:
+            return {"status": "Пропущен", "result": None}
+        with metrics.stage("diff"):
+            # Измененные материалы заменены в списке копиями, поэтому
+            # исходные объекты остались нетронутыми.
+            changes = diff_section(
+                "materials",
+                {
+                    index: to_json(material)
+                    for index, material in enumerate(original_materials)
+                    if materials[index] is not material
+                },
+                len(materials),
+                materials,
+                label="material",
+            )
+        return _make_dry_run_response(
+            changes, materials, request_data_object.materials
+        )
+
+    async def change_parameters_stream(
+        self, source_file: BinaryIO, filename: str, materials: List[dict]
+    ) -> Tuple[int, Iterator[bytes]]:
+        # Исходный файл - временный файл с телом запроса, он не может быть
+        # передан в пул процессов. Разбор JSON-чанка выполняется в потоке,
+        # а BIN-чанк читается из временного файла уже при отдаче ответа.
+        return await run_in_threadpool(
+            self._change_parameters_stream, source_file, filename, materials
+        )
+
+    def _change_parameters_stream(
+        self, source_file: BinaryIO, filename: str, materials: List[dict]
+    ) -> Tuple[int, Iterator[bytes]]:
+        with metrics.stage("load"):
+            document, layout = read_glb_file(source_file, filename)
+        with metrics.stage("edit"):
+            changed_count = self._apply_material_changes(
+                document.get("materials", []), materials
+            )
+        metrics.add_value("materials_changed", changed_count)
+        return iter_glb(document, BinChunk.from_layout(layout), source_file)
+
 
 class GLBTexturesRepository(IGLBTexturesRepository):
     """
@@ -112,13 +354,106 @@ class GLBTexturesRepository(IGLBTexturesRepository):
     """
 
     async def change_textures(self, request_data_object: TexturesData):
+        async def run():
+            memory_bytes = await run_in_threadpool(
+                estimate_textures,
+                request_data_object.source_glbfilepath,
+                request_data_object.files,
+                request_data_object.processing,
+                request_data_object.dry_run,
+            )
+            return await run_in_pool(
+                self._change_textures, request_data_object, memory_bytes=memory_bytes
+            )
+
+        return await single_flight.run(("textures", request_data_object), run)
+
+    def _change_textures(
+        self,
+        request_data_object: TexturesData,
+        materials_changes: Optional[list] = None,
+        material_operations: Optional[List[MaterialOperation]] = None,
+    ) -> dict:
+        """
+        Args:
+            request_data_object (TexturesData): изменяемые текстуры
+            materials_changes (list | None, optional): изменения параметров
+            материалов (как в PropertiesData.materials), которые вносятся
+            в тот же загруженный файл до замены текстур - чтобы не читать
+            и не записывать файл дважды.
+            material_operations (List[MaterialOperation] | None, optional):
+            массовые операции над материалами (как в PropertiesData.operations)
+        """
         source_glbfilepath = request_data_object.source_glbfilepath
         if not os.path.exists(source_glbfilepath):
             raise GLBEditorException(
                 detail='Файл "%s" отсутствует на сервере' % source_glbfilepath,
                 status_code=status.HTTP_400_BAD_REQUEST
             )
-        gltf = GLTF2().load(source_glbfilepath)
+        # Файлы текстур проверяются и читаются (параллельно) до разбора
+        # исходного файла: отсутствующий файл текстуры - ошибка сразу.
+        with metrics.stage("prefetch"):
+            self._prefetch_texture_files(request_data_object)
+        if request_data_object.dry_run:
+            return self._plan_textures(
+                request_data_object, materials_changes, material_operations
+            )
+        with metrics.stage("digest"):
+            result_filepath = self._get_result_filepath(
+                request_data_object, materials_changes, material_operations
+            )
+        # Такая же правка такого же файла уже выполнялась - возвращаем
+        # готовый итоговый файл, не загружая модель.
+        response = load_replay(result_filepath)
+        if response is not None:
+            return response
+        # Такая же правка может выполняться прямо сейчас - дожидаемся ее
+        # и проверяем еще раз.
+        with result_lock(result_filepath):
+            response = load_replay(result_filepath, required=False)
+            if response is None:
+                response = self._write_textures(
+                    request_data_object,
+                    materials_changes,
+                    material_operations,
+                    result_filepath,
+                )
+                save_replay(result_filepath, response)
+            return response
+
+    def _write_textures(
+        self,
+        request_data_object: TexturesData,
+        materials_changes: Optional[list],
+        material_operations: Optional[List[MaterialOperation]],
+        result_filepath: str,
+    ) -> dict:
+        source_glbfilepath = request_data_object.source_glbfilepath
+        # Изображения текстур обрабатываются до загрузки модели и все сразу,
+        # параллельно; при записи файла они берутся из кэша текстур.
+        processing = request_data_object.processing
+        if processing is not None:
+            with metrics.stage("transcode"):
+                texture_cache.load_many(
+                    [change.texturefilepath for change in request_data_object.files],
+                    processing,
+                )
+
+        # Новые изображения дописываются в BIN-чанк GLB-файла в виде
+        # bufferView. Для этого достаточно прочитать только JSON-чанк: BIN-чанк
+        # будет скопирован в итоговый файл целиком, без загрузки в память.
+        # Это возможно, только если BIN-чанк принадлежит первому буферу файла.
+        layout = None
+        with metrics.stage("load"):
+            if settings.glb.textures_embedding == "bufferview" and is_glb(
+                source_glbfilepath
+            ):
+                gltf, layout = load_gltf(source_glbfilepath)
+                if gltf.buffers and gltf.buffers[0].uri is not None:
+                    layout = None
+            if layout is None:
+                gltf = _load_gltf_fully(source_glbfilepath)
+        images_count = len(gltf.images)
 
         # Работа по замене текстуры складывается из двух этапов:
         # 1. Декларировать, какие изображения текстур изменяются (работа с JSON
@@ -126,15 +461,45 @@ class GLBTexturesRepository(IGLBTexturesRepository):
         # 2. Закрепить изменения, сконвертировав изображение.
 
         try:
-            # Первый этап - вносим изменения в структуру. Экономим память,
-            # не создавая в ней новый объект (сборщик мусора сотрет старый).
-            gltf = self._process_gltf(gltf, request_data_object)
+            with metrics.stage("edit"):
+                if materials_changes or material_operations:
+                    metrics.add_value(
+                        "materials_changed",
+                        GLBParamsRepository._apply_material_changes(
+                            gltf.materials,
+                            materials_changes or [],
+                            material_operations,
+                        ),
+                    )
+
+                # Первый этап - вносим изменения в структуру. Экономим память,
+                # не создавая в ней новый объект (сборщик мусора сотрет старый).
+                gltf = self._process_gltf(gltf, request_data_object)
+                self._declare_webp_textures(gltf, images_count, processing)
+            metrics.add_value("textures_added", len(gltf.images) - images_count)
 
             # Второй этап - конвертация изображения в необходимый формат,
             # который сможет храниться внутри единого GLB-файла.
-            # К сожалению, библиотека pygltflib не поддерживает формат Bufferview.
-            # Остается только кодирование в DataURI.
-            result_filepath = self._process_glb(gltf, request_data_object)
+            # Библиотека pygltflib не умеет записывать изображения в bufferView,
+            # поэтому это делается средствами модуля data/glb. Если это
+            # невозможно, остается только кодирование в DataURI.
+            with metrics.stage("save"):
+                if layout is None:
+                    bytes_saved = self._process_glb(
+                        gltf,
+                        images_count,
+                        processing,
+                        source_glbfilepath,
+                        result_filepath,
+                    )
+                else:
+                    bytes_saved = self._process_glb_with_buffer_views(
+                        gltf,
+                        layout,
+                        images_count,
+                        request_data_object,
+                        result_filepath,
+                    )
 
         except GLBEditorException as e:
             raise e
@@ -143,16 +508,148 @@ class GLBTexturesRepository(IGLBTexturesRepository):
                 detail=f"Exception occured: {e}",
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-        return {"status": "Готово", "result": result_filepath}
+        response = {"status": "Готово", "result": result_filepath}
+        if bytes_saved is not None:
+            response["bytes_saved"] = bytes_saved
+        return response
+
+    def _plan_textures(
+        self,
+        request_data_object: TexturesData,
+        materials_changes: Optional[list] = None,
+        material_operations: Optional[List[MaterialOperation]] = None,
+    ) -> dict:
+        # Пробный запуск: структура файла изменяется так же, как при правке
+        # (см. _change_textures), но изображения не обрабатываются
+        # и не встраиваются, а вместо записи итогового файла возвращаются
+        # различия. BIN-чанк GLB-файла не читается.
+        source_glbfilepath = request_data_object.source_glbfilepath
+        processing = request_data_object.processing
+        with metrics.stage("load"):
+            if is_glb(source_glbfilepath):
+                gltf, _ = load_gltf(source_glbfilepath)
+            else:
+                gltf = _load_gltf_fully(source_glbfilepath)
+        sections = ("materials", "textures", "images")
+        counts = {section: len(getattr(gltf, section)) for section in sections}
+        # Изменяются только материалы из запроса и текстуры (ссылки
+        # на изображения); изображения только добавляются.
+        names = {changes["name"] for changes in materials_changes or []}
+        for single_change in request_data_object.files:
+            names.update(material["name"] for material in single_change.materials)
+        selected = set()
+        for operation in material_operations or []:
+            selected.update(
+                select([material.name for material in gltf.materials], operation)
+            )
+        originals = {
+            "materials": {
+                index: to_json(material)
+                for index, material in enumerate(gltf.materials)
+                if material.name in names or index in selected
+            },
+            "textures": {
+                index: to_json(texture) for index, texture in enumerate(gltf.textures)
+            },
+            "images": {},
+        }
+        extensions = {
+            key: list(getattr(gltf, key))
+            for key in ("extensionsUsed", "extensionsRequired")
+        }
+
+        with metrics.stage("edit"):
+            if materials_changes or material_operations:
+                metrics.add_value(
+                    "materials_changed",
+                    GLBParamsRepository._apply_material_changes(
+                        gltf.materials,
+                        materials_changes or [],
+                        material_operations,
+                    ),
+                )
+            gltf = self._process_gltf(gltf, request_data_object)
+            self._declare_webp_textures(gltf, counts["images"], processing)
+        metrics.add_value("textures_added", len(gltf.images) - counts["images"])
+
+        with metrics.stage("diff"):
+            self._describe_new_images(
+                gltf, counts["images"], processing, source_glbfilepath
+            )
+            changes = []
+            for section in sections:
+                changes.extend(
+                    diff_section(
+                        section,
+                        originals[section],
+                        counts[section],
+                        getattr(gltf, section),
+                        label="material" if section == "materials" else None,
+                    )
+                )
+            for key, original in extensions.items():
+                changes.extend(
+                    {"path": path, "old": old, "new": new}
+                    for path, old, new in diff_values(
+                        original or None, getattr(gltf, key) or None, f"/{key}"
+                    )
+                )
+        return _make_dry_run_response(changes, gltf.materials, materials_changes)
+
+    @staticmethod
+    def _describe_new_images(
+        gltf: GLTF2,
+        images_count: int,
+        processing: Optional[TextureProcessing],
+        source_filepath: str,
+    ) -> None:
+        """
+        Пробный запуск не встраивает изображения, и uri новых изображений -
+        пути к файлам текстур на сервере. Для различий новые изображения
+        приводятся к тому виду, который будет в итоговом файле (см.
+        _write_textures); значения, известные только при записи файла,
+        заменяются заполнителями в угловых скобках.
+        """
+        if settings.glb.textures_embedding == "bufferview" and is_glb(
+            source_filepath
+        ):
+            embedding = "bufferview"
+            if gltf.buffers and gltf.buffers[0].uri is not None:
+                embedding = "datauri"
+        elif not is_glb(source_filepath) and settings.glb.gltf_resources != "embed":
+            embedding = "file"
+        else:
+            embedding = "datauri"
+
+        buffer_view_idx = len(gltf.bufferViews)
+        for image in gltf.images[images_count:]:
+            mime_type = (
+                get_mime_type(image.uri, processing) or "application/octet-stream"
+            )
+            if embedding == "bufferview":
+                image.uri = None
+                image.bufferView = buffer_view_idx
+                image.mimeType = mime_type
+                buffer_view_idx += 1
+            elif embedding == "file":
+                # См. data/resources.ResultResources.add_texture.
+                directory = os.path.basename(
+                    get_resources_directory(
+                        get_filename_from_digest(source_filepath, "<digest>")
+                    )
+                )
+                extension = mimetypes.guess_extension(mime_type) or ""
+                image.uri = quote(f"{directory}/<sha256>{extension}", safe="/<>")
+                image.mimeType = mime_type
+            else:
+                image.uri = f"data:{mime_type};base64,<data>"
 
     def _process_gltf(self, gltf: GLTF2, request_DTO: TexturesData) -> GLTF2:
+        # Ссылки между материалами, текстурами и изображениями собираются
+        # один раз на весь запрос (см. data/references).
+        references = TextureReferences(gltf)
         for single_change in request_DTO.files:
             texture_filepath = single_change.texturefilepath
-            if not os.path.exists(texture_filepath):
-                raise GLBEditorException(
-                    detail='Файл текстуры "%s" отсутствует на сервере' % texture_filepath,
-                    status_code=status.HTTP_400_BAD_REQUEST
-                )
 
             # В любом случае мы привносим в файл новое изображение, поэтому
             # целесообразно всегда создавать новый объект изображения, который
@@ -236,6 +733,7 @@ class GLBTexturesRepository(IGLBTexturesRepository):
                     for metallic_texture in metallic_textures:
                         gltf = self._replace_image_in_texture(
                             gltf,
+                            references,
                             material_name,
                             metallic_texture,
                             new_image,
@@ -243,24 +741,219 @@ class GLBTexturesRepository(IGLBTexturesRepository):
                         )
                 if normal_texture:
                     gltf = self._replace_image_in_texture(
-                        gltf, material_name, "normalTexture", new_image
+                        gltf, references, material_name, "normalTexture",
+                        new_image,
                     )
         return gltf
 
     @staticmethod
-    def _process_glb(gltf: GLTF2, request_DTO: TexturesData) -> str:
-        gltf.convert_images(image_format=ImageFormat.DATAURI, override=True)
-        new_filename = get_filename_from_timestamp(request_DTO.source_glbfilepath.split("/").pop())
-        if not os.path.exists(request_DTO.result_filepath):
-            os.mkdir(request_DTO.result_filepath)
+    def _declare_webp_textures(
+        gltf: GLTF2, images_count: int, processing: Optional[TextureProcessing]
+    ) -> None:
+        # Изображение WebP задается не в source текстуры, а в расширении
+        # EXT_texture_webp. Запасного изображения PNG/JPEG нет, поэтому
+        # расширение объявляется обязательным. WebP может получиться и без
+        # format="webp": обработка сохраняет формат файла текстуры, а без
+        # обработки файл встраивается как есть. Поэтому формат определяется
+        # для каждого нового изображения (uri - путь к файлу текстуры).
+        webp_images = {
+            index
+            for index in range(images_count, len(gltf.images))
+            if get_mime_type(gltf.images[index].uri, processing) == "image/webp"
+        }
+        if not webp_images:
+            return
+        for texture in gltf.textures:
+            if texture.source not in webp_images:
+                continue
+            texture.extensions = {
+                **(texture.extensions or {}),
+                "EXT_texture_webp": {"source": texture.source},
+            }
+            texture.source = None
+        for extensions in (gltf.extensionsUsed, gltf.extensionsRequired):
+            if "EXT_texture_webp" not in extensions:
+                extensions.append("EXT_texture_webp")
+
+    @classmethod
+    def _process_glb(
+        cls,
+        gltf: GLTF2,
+        images_count: int,
+        processing: Optional[TextureProcessing],
+        source_filepath: str,
+        result_filepath: str,
+    ) -> Optional[int]:
+        """
+        Returns:
+            int | None: сколько байт сэкономило сжатие (см. data/compaction),
+            None - сжатие отключено.
+        """
+        resources = ResultResources(source_filepath, result_filepath)
+        with metrics.stage("encode"):
+            # Внешние буферы и изображения GLTF-файла (см. data/resources).
+            # Новые изображения к ним не относятся: их uri - пути к файлам
+            # текстур из запроса.
+            if not is_glb(source_filepath):
+                resources.prepare([*gltf.buffers, *gltf.images[:images_count]])
+            if not is_glb(source_filepath) and settings.glb.gltf_resources != "embed":
+                # Изображения будут записаны файлами рядом с итоговым файлом,
+                # JSON-документ только ссылается на них.
+                for image in gltf.images[images_count:]:
+                    payload = texture_cache.load(image.uri, processing)
+                    image.uri = resources.add_texture(payload)
+                    image.mimeType = payload.mime_type
+            else:
+                # Новые изображения кодируем через кэш текстур: часто
+                # используемые файлы не читаются с диска и не кодируются
+                # в base64 повторно. convert_images пропускает изображения,
+                # уже имеющие вид DataURI.
+                for image in gltf.images[images_count:]:
+                    image.uri = texture_cache.load_data_uri(image.uri, processing)
+                gltf.convert_images(image_format=ImageFormat.DATAURI, override=True)
+
+        bytes_saved = None
+        if settings.glb.compaction:
+            # Все изображения теперь в DataURI, а их данные удалены из буфера,
+            # поэтому одинаковые изображения сравниваются по uri.
+            with metrics.stage("compact"):
+                blob = gltf.binary_blob()
+                bin_chunk = None
+                if blob is not None:
+                    bin_chunk = BinChunk()
+                    bin_chunk.append_bytes(bytes(blob))
+                bytes_saved, bin_chunk = compact(gltf, bin_chunk)
+                if bin_chunk is not None:
+                    gltf.set_binary_blob(bin_chunk.read(0, bin_chunk.length, None))
+            metrics.add_value("bytes_saved", bytes_saved)
+
+        # Файлы ресурсов создаются только для оставшихся после сжатия
+        # буферов и изображений.
+        with resources.output([*gltf.buffers, *gltf.images]) as temp_filepath:
+            _save_gltf(gltf, temp_filepath)
+        return bytes_saved
+
+    @classmethod
+    def _process_glb_with_buffer_views(
+        cls,
+        gltf: GLTF2,
+        layout: GLBLayout,
+        images_count: int,
+        request_DTO: TexturesData,
+        result_filepath: str,
+    ) -> Optional[int]:
+        """
+        Дописывает новые изображения (добавленные в файл после images_count)
+        в конец BIN-чанка исходного файла и записывает итоговый файл.
+        Изображения, уже хранящиеся в файле, не перекодируются.
+
+        Returns:
+            int | None: сколько байт сэкономило сжатие (см. data/compaction),
+            None - сжатие отключено.
+        """
+        bin_chunk = BinChunk.from_layout(layout)
+        for image in gltf.images[images_count:]:
+            cls._embed_image(gltf, image, bin_chunk, request_DTO.processing)
+        if bin_chunk.length:
+            # Буфер может быть общим с кэшем исходных файлов.
+            gltf.buffers[0:1] = [copy(gltf.buffers[0]) if gltf.buffers else Buffer()]
+            gltf.buffers[0].byteLength = bin_chunk.length
+
+        # Сжатие только меняет список диапазонов BIN-чанка: оставшиеся
+        # данные по-прежнему копируются из исходного файла средствами ядра.
+        bytes_saved = None
+        if settings.glb.compaction:
+            with metrics.stage("compact"):
+                bytes_saved, bin_chunk = compact(
+                    gltf, bin_chunk, request_DTO.source_glbfilepath
+                )
+            metrics.add_value("bytes_saved", bytes_saved)
+
+        with atomic_output(result_filepath) as temp_filepath:
+            write_glb(
+                temp_filepath,
+                gltf_to_document(gltf),
+                bin_chunk,
+                request_DTO.source_glbfilepath,
+            )
+        return bytes_saved
+
+    @staticmethod
+    def _embed_image(
+        gltf: GLTF2,
+        image: Image,
+        bin_chunk: BinChunk,
+        processing: Optional[TextureProcessing] = None,
+    ) -> None:
+        # Новое изображение ссылается на файл текстуры на сервере. Переносим
+        # его содержимое (из кэша текстур) в BIN-чанк и ссылаемся на него
+        # через bufferView.
+        payload = texture_cache.load(image.uri, processing)
+        if payload.mime_type is None:
+            raise GLBEditorException(
+                detail='Не удалось определить формат изображения "%s"' % image.uri,
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        gltf.bufferViews.append(
+            BufferView(
+                buffer=0,
+                byteOffset=bin_chunk.append_bytes(payload.data),
+                byteLength=len(payload.data),
+            )
+        )
+        image.bufferView = len(gltf.bufferViews) - 1
+        image.mimeType = payload.mime_type
+        image.uri = None
 
-        result_filepath = os.path.join(request_DTO.result_filepath, new_filename)
-        gltf.save(result_filepath)
-        return result_filepath
+    @staticmethod
+    def _prefetch_texture_files(request_DTO: TexturesData) -> None:
+        # При пробном запуске содержимое файлов текстур не нужно.
+        try:
+            texture_cache.prefetch(
+                [single_change.texturefilepath for single_change in request_DTO.files],
+                read=not request_DTO.dry_run,
+            )
+        except FileNotFoundError as error:
+            raise GLBEditorException(
+                detail='Файл текстуры "%s" отсутствует на сервере' % error.args[0],
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+    @staticmethod
+    def _get_result_filepath(
+        request_DTO: TexturesData,
+        materials_changes: Optional[list] = None,
+        material_operations: Optional[List[MaterialOperation]] = None,
+    ) -> str:
+        # Итоговый файл зависит и от содержимого файлов текстур, поэтому
+        # в хэш правки входят их хэши (содержимое попадает в кэш текстур
+        # и при записи файла повторно не читается).
+        texture_digests = [
+            texture_cache.load(single_change.texturefilepath).digest
+            for single_change in request_DTO.files
+        ]
+        changes = {
+            "materials": materials_changes or [],
+            "files": [asdict(single_change) for single_change in request_DTO.files],
+        }
+        if material_operations:
+            changes["operations"] = [
+                asdict(operation) for operation in material_operations
+            ]
+        if request_DTO.processing is not None:
+            changes["processing"] = asdict(request_DTO.processing)
+        return get_result_filepath(
+            request_DTO.result_filepath,
+            request_DTO.source_glbfilepath,
+            make_edit_digest(
+                "textures", request_DTO.source_glbfilepath, changes, texture_digests
+            ),
+        )
 
     def _replace_image_in_texture(
         self,
         gltf: GLTF2,
+        references: TextureReferences,
         material_name: str,
         texture_info: str,
         image: Image,
@@ -292,6 +985,8 @@ class GLBTexturesRepository(IGLBTexturesRepository):
 
         Args:
             gltf (GLTF2): объект редактуируемого 3Д-файла
+            references (TextureReferences): индекс ссылок документа gltf,
+            все изменения ссылок вносятся через него
             material_name (str): название материала, в котором изменяется
             текстура, для его поиска в структуре файла
             texture_info (str): тип карты текстуры: normalTexture,
@@ -311,25 +1006,17 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             изображений и записи в новый файл.
         """
 
-        # Отыскиваем необходимый материал по его имени
-        target_materials = tuple(
-            material for material in gltf.materials
-            if material.name == material_name
-        )
-        try:
-            # Если в файле нет таких материалов, возникнет ошибка.
-            assert len(target_materials) != 0
-        except AssertionError:
+        # Отыскиваем необходимый материал по его имени. Теоретически не должно
+        # быть двух материалов с одинаковыми именами, если это не так, то имеет
+        # место коллизия, и используется первый из них.
+        material_idx = references.find_material(material_name)
+        if material_idx is None:
             raise GLBEditorException(
                 detail="В редактируемом файле отсутствет материал с именем "
                 f"{material_name}, указанным в поступившем запросе",
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             )
-            # TODO: Реализовать подобный функционал вместо ошибки.
-        # Теоретически не должно быть двух материалов с одинаковыми именами,
-        # если это не так, то имеет место коллизия, которую нужно рассмотреть
-        # отдельно.
-        target_material = target_materials[0]
+        target_material = gltf.materials[material_idx]
 
         # Здесь мы отбираем у полученного материала соответствующий объект
         # карты текстуры, чтобы понять, на какую текстуру она ссылается.
@@ -357,7 +1044,8 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             # отсутствует, мы просто создаем все с нуля - карту, текстуру, объект
             # изображения и интегрируем их в файл.
             return self._add_texture_map_to_material(
-                gltf, target_material, texture_info, image, submaterial
+                gltf, references, material_idx, texture_info, image,
+                submaterial,
             )
         else:
             # Если карта соответствующая карта текстур в файле есть, нам нужно
@@ -370,25 +1058,12 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             # тип карты текстур, создаем новую текстуру, связанную с новым
             # изображением, а затем подменяем в данном материале индекс
             # текстуры на индекс новой текстуры.
-            image_index = gltf.textures[source_texture_map.index].source
-            textures_with_repeated_image_indexes = tuple(
-                texture
-                for texture in gltf.textures
-                if texture.source == image_index
-            )
-            materials_with_repeated_texture_indexes = tuple(
-                material
-                for material in gltf.materials
-                if self._is_texture_used_by_someone_else(
-                    material, source_texture_map.index
-                )
-            )
-            if (
-                len(textures_with_repeated_image_indexes) > 1
-                or len(materials_with_repeated_texture_indexes) > 1
-            ):
+            # Индекс ссылок отвечает на оба вопроса без перебора материалов
+            # и текстур файла.
+            if references.is_texture_shared(source_texture_map.index):
                 return self._change_texture_in_material(
-                    gltf, target_material, texture_info, image, submaterial
+                    gltf, references, material_idx, texture_info, image,
+                    submaterial,
                 )
             else:
                 # Если ответ "Нет", то мы можем безболезненно, не создавая
@@ -401,40 +1076,32 @@ class GLBTexturesRepository(IGLBTexturesRepository):
                 # и замена текстуры одного материала повлияет сразу на несколько
                 # элементов модели, но тут уж ничего, наверное, не поделать.
                 return self._add_image_to_texture(
-                    gltf, textures_with_repeated_image_indexes[0], image
+                    gltf, references, source_texture_map.index, image
                 )
 
     @staticmethod
     def _add_image_to_texture(
-        gltf: GLTF2, texture_to_change: Texture, image: Image
+        gltf: GLTF2, references: TextureReferences, texture_idx: int,
+        image: Image,
     ) -> GLTF2:
         """
         Метод, который подменяет ссылку на изображение сразу в текстуре.
         Материалы, карты текстур - все это остается неизменным.
         """
-        # Получим индекс текстуры, которую нам нужно изменить.
         # Заодно изменим имя текстуры на необходимое.
-        texture_idx = gltf.textures.index(texture_to_change)
         image_name_extension = image.name.rfind(".")
-        gltf.textures[texture_idx].name = image.name[:image_name_extension]
-        try:
-            # Попробуем понять, работали ли мы на предыдущей итерации с данным
-            # изображением. Если работали, просто найдем его индекс и заменим
-            # ссылку в текстуре
-            image_index = gltf.images.index(image)
-            gltf.textures[texture_idx].source = image_index
-        except ValueError:
-            # Если не работали, добавим изображение в список изображений
-            # и укажем в текстуре ссылку на новое изображение - последнее
-            # в общем списке.
-            gltf.images.append(image)
-            gltf.textures[texture_idx].source = len(gltf.images) - 1
+        references.own_texture(texture_idx).name = image.name[:image_name_extension]
+        # Если на предыдущей итерации мы уже работали с данным изображением,
+        # индекс вернет его номер, если нет - добавит изображение в список
+        # изображений файла. Текстура начинает ссылаться на это изображение.
+        references.set_texture_source(texture_idx, references.add_image(image))
         return gltf
 
     @staticmethod
     def _add_texture_map_to_material(
         gltf: GLTF2,
-        material: Material,
+        references: TextureReferences,
+        material_idx: int,
         texture_name: str,
         image: Image,
         submaterial: str = None,
@@ -452,24 +1119,13 @@ class GLBTexturesRepository(IGLBTexturesRepository):
         image_name_extension = image.name.rfind(".")
         texture.name = image.name[:image_name_extension]
 
-        try:
-            # Попробуем найти, вдруг на предыдущей итерации новое изображение
-            # уже было добавлено в файл.
-            image_index = gltf.images.index(image)
-            # Если находим, используем для текстуры его индекс
-            texture.source = image_index
-        except ValueError:
-            # Если же нет, добавляем изображение в список изображений файла,
-            # индекс изображения стандартный - длина списка изображений минус
-            # один
-            gltf.images.append(image)
-            texture.source = len(gltf.images) - 1
+        # Если на предыдущей итерации новое изображение уже было добавлено
+        # в файл, используем для текстуры его индекс, если нет - индекс
+        # добавит изображение в список изображений файла.
+        texture.source = references.add_image(image)
 
         # Добавляем текстуру со ссылкой на изображение в общий список текстур
-        gltf.textures.append(texture)
-
-        # Определяем порядковый индекс материала в списке материалов файла
-        material_idx = gltf.materials.index(material)
+        texture_idx = references.add_texture(texture)
         # Если карта текстур pbrMetallicRoughness, нужно соблюсти вложенность
         # структуры
         if submaterial:
@@ -478,7 +1134,7 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             new_texture_info = TextureInfo()
             # Определим, что ссылается этот объект в качестве текстуры
             # на последнюю добавленную текстуру
-            new_texture_info.index = len(gltf.textures) - 1
+            new_texture_info.index = texture_idx
             # Создадим объект pbrMetallicRoughness, родительский для объектов
             # baseColorTexture и metallicRoughnessTexture, воспользовавшись
             # подготовленным словарем
@@ -491,22 +1147,26 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             setattr(new_texture, texture_name, new_texture_info)
             # А затем уже привяжем карту текстур - объект pbrMetallicRoughness
             # к необходимому материалу из списка материалов в файле.
-            setattr(gltf.materials[material_idx], submaterial, new_texture)
+            setattr(references.own_material(material_idx), submaterial, new_texture)
         else:
             # Если нужно создать карту текстур типа normalTexture, все гораздо
             # проще.
             # Создаем пустую карту текстур
             new_texture = textures_map[texture_name]()
             # Привязываем к ней последнюю добавленную текстуру
-            new_texture.index = len(gltf.textures) - 1
+            new_texture.index = texture_idx
             # Связываем карту текстур с необходимым материалом.
-            setattr(gltf.materials[material_idx], texture_name, new_texture)
+            setattr(references.own_material(material_idx), texture_name, new_texture)
+        references.set_slot_texture(
+            material_idx, _get_slot(texture_name, submaterial), texture_idx
+        )
         return gltf
 
     @staticmethod
     def _change_texture_in_material(
         gltf: GLTF2,
-        material: Material,
+        references: TextureReferences,
+        material_idx: int,
         texture_name: str,
         image: Image,
         submaterial: str = None,
@@ -519,30 +1179,19 @@ class GLBTexturesRepository(IGLBTexturesRepository):
         texture = Texture()
         image_name_extension = image.name.rfind(".")
         texture.name = image.name[:image_name_extension]
-        try:
-            # Попробуем найти, вдруг на предыдущей итерации новое изображение
-            # уже было добавлено в файл.
-            image_index = gltf.images.index(image)
-            # Если находим, используем для текстуры его индекс
-            texture.source = image_index
-        except ValueError:
-            # Если же нет, добавляем изображение в список изображений файла,
-            # индекс изображения стандартный - длина списка изображений минус
-            # один
-            gltf.images.append(image)
-            texture.source = len(gltf.images) - 1
+        # Если на предыдущей итерации новое изображение уже было добавлено
+        # в файл, используем для текстуры его индекс, если нет - индекс
+        # добавит изображение в список изображений файла.
+        texture.source = references.add_image(image)
 
         # Добавляем текстуру со ссылкой на изображение в общий список текстур
-        gltf.textures.append(texture)
-
-        # Определяем порядковый индекс материала в списке материалов файла
-        material_idx = gltf.materials.index(material)
+        texture_idx = references.add_texture(texture)
         # Если карта текстур pbrMetallicRoughness, нужно соблюсти вложенность
         # структуры
         if submaterial:
             # Сначала мы получаем доступ к карте текстур pbrMetallicRoughness
             submaterial_obj = getattr(
-                gltf.materials[material_idx], submaterial
+                references.own_material(material_idx), submaterial
             )
             # Получаем из нее объект класса TextureInfo - это либо
             # baseColorTexture, либо metallicRoughnessTexture, в любом случае
@@ -550,7 +1199,8 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             texture_info_obj = getattr(submaterial_obj, texture_name)
             # Подменяем в данном объекте текстуру - теперь он ссылается
             # на последнюю добавленную текстуру в файле.
-            texture_info_obj.index = len(gltf.textures) - 1
+            previous_texture_idx = texture_info_obj.index
+            texture_info_obj.index = texture_idx
 
             # # Произведем сборку в обратном порядке - определим, что объект
             # # TextureInfo связан с картой текстур pbrMetallicRoughness
@@ -571,49 +1221,138 @@ class GLBTexturesRepository(IGLBTexturesRepository):
             # В случае с картой текстур типа normalTexture все проще и в целом
             # процесс аналогичен и понятен.
             normal_texture_obj = getattr(
-                gltf.materials[material_idx], texture_name
+                references.own_material(material_idx), texture_name
             )
-            normal_texture_obj.index = len(gltf.textures) - 1
+            previous_texture_idx = normal_texture_obj.index
+            normal_texture_obj.index = texture_idx
             # setattr(
             #     gltf.materials[material_idx], texture_name, normal_texture_obj
             # )
 
+        references.set_slot_texture(
+            material_idx, _get_slot(texture_name, submaterial), texture_idx,
+            previous_texture_idx,
+        )
         return gltf
 
-    @staticmethod
-    def _is_texture_used_by_someone_else(material, compared_index):
-        pbr_metallic_roughness = getattr(material, "pbrMetallicRoughness")
-        pbr_metallic_roughness_exists = isinstance(
-            pbr_metallic_roughness, PbrMetallicRoughness
-        )
 
-        normal_texture = getattr(material, "normalTexture")
-        normal_texture_exists = isinstance(
-            normal_texture, NormalMaterialTexture
-        )
+class GLBEditRepository(GLBTexturesRepository, IGLBEditRepository):
+    """
+    Совместное изменение параметров материалов и текстур за один проход:
+    файл загружается один раз, сначала в нем изменяются параметры материалов
+    (по правилам GLBParamsRepository), затем текстуры (по правилам
+    GLBTexturesRepository), и записывается один итоговый файл.
+    """
 
-        if pbr_metallic_roughness_exists:
-            base_color_texture = getattr(
-                pbr_metallic_roughness, "baseColorTexture"
+    async def edit(self, request_data_object: EditData):
+        async def run():
+            memory_bytes = await run_in_threadpool(
+                estimate_textures,
+                request_data_object.source_filepath,
+                request_data_object.files,
+                request_data_object.processing,
+                request_data_object.dry_run,
             )
-            base_color_texture_exists = isinstance(
-                base_color_texture, TextureInfo
+            return await run_in_pool(
+                self._edit, request_data_object, memory_bytes=memory_bytes
             )
 
-            metallic_roughness_texture = getattr(
-                pbr_metallic_roughness, "metallicRoughnessTexture"
+        return await single_flight.run(("edit", request_data_object), run)
+
+    def _edit(self, request_data_object: EditData) -> dict:
+        textures_data = TexturesData(
+            source_glbfilepath=request_data_object.source_filepath,
+            result_filepath=request_data_object.result_filepath,
+            files=request_data_object.files,
+            processing=request_data_object.processing,
+            dry_run=request_data_object.dry_run,
+        )
+        return self._change_textures(
+            textures_data,
+            request_data_object.materials,
+            request_data_object.operations,
+        )
+
+
+class GLBInspectRepository(IGLBInspectRepository):
+    """
+    Сводка о файле (см. data/inspection). Из GLB-файла читается только
+    JSON-чанк, поэтому сводка строится в потоке воркера uvicorn, а не в пуле
+    процессов: короткие запросы сводки не ждут в очереди за долгими правками
+    и не занимают бюджет памяти пула.
+    """
+
+    async def inspect(self, filepath: str) -> dict:
+        return await run_in_threadpool(self._inspect, filepath)
+
+    def _inspect(self, filepath: str) -> dict:
+        if not os.path.exists(filepath):
+            raise GLBEditorException(
+                detail='Файл "%s" отсутствует на сервере' % filepath,
+                status_code=status.HTTP_404_NOT_FOUND,
             )
-            metallic_roughness_texture_exists = isinstance(
-                metallic_roughness_texture, TextureInfo
+        if not filepath.lower().endswith((".glb", ".gltf")):
+            raise GLBEditorException(
+                detail='Файл "%s" не является GLB/GLTF-файлом' % filepath,
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             )
-        else:
-            base_color_texture_exists = None
-            metallic_roughness_texture_exists = None
-
-        if normal_texture_exists:
-            return compared_index == normal_texture.index
-        if base_color_texture_exists:
-            return compared_index == base_color_texture.index
-        if metallic_roughness_texture_exists:
-            return compared_index == metallic_roughness_texture.index
-        return False
+        with metrics.stage("load"):
+            if is_glb(filepath):
+                # Кэш исходных файлов рассчитан на процессы пула и не
+                # используется из нескольких потоков.
+                document, layout = read_glb(filepath)
+                bin_length = layout.bin_length
+            else:
+                document, bin_length = read_gltf_document(filepath), 0
+        return summarize(document, filepath, bin_length)
+
+
+def _load_gltf_fully(filepath: str) -> GLTF2:
+    # Полная загрузка файла средствами pygltflib, вместе с бинарными данными.
+    gltf = GLTF2().load(filepath)
+    metrics.add_value("bytes_read", os.path.getsize(filepath))
+    return gltf
+
+
+def _get_parameters_changes(request_DTO: PropertiesData):
+    # Без массовых операций изменения в хэше правки - только список
+    # materials, как и до их появления: готовые итоговые файлы остаются
+    # действительными.
+    if not request_DTO.operations:
+        return request_DTO.materials
+    return {
+        "materials": request_DTO.materials,
+        "operations": [asdict(operation) for operation in request_DTO.operations],
+    }
+
+
+def _make_dry_run_response(
+    changes: List[dict], materials: list, materials_changes: Optional[list]
+) -> dict:
+    # Материалы из изменений параметров, которых нет в файле, при правке
+    # пропускаются молча, поэтому в пробном запуске они перечисляются явно.
+    names = {
+        material.get("name") if isinstance(material, dict) else material.name
+        for material in materials
+    }
+    missing_materials = []
+    for material_changes in materials_changes or []:
+        name = material_changes["name"]
+        if name not in names and name not in missing_materials:
+            missing_materials.append(name)
+    return {
+        "status": "Проверено",
+        "result": None,
+        "changes": changes,
+        "missing_materials": missing_materials,
+    }
+
+
+def _save_gltf(gltf: GLTF2, filepath: str) -> None:
+    gltf.save(filepath)
+    metrics.add_value("bytes_written", os.path.getsize(filepath))
+
+
+def _get_slot(texture_name: str, submaterial: Optional[str] = None) -> Slot:
+    # Слот материала в терминах индекса ссылок (см. data/references).
+    return (submaterial, texture_name) if submaterial else (texture_name,)
@@ -0,0 +1,199 @@
+# Внешние ресурсы GLTF-файла (не GLB): буферы и изображения в отдельных
+# файлах, на которые JSON-документ ссылается по относительному URI. Итоговый
+# файл записывается в другую директорию, поэтому такие ссылки нужно либо
+# заменить содержимым, либо переписать (settings.glb.gltf_resources):
+#
+# "embed" - ресурсы встраиваются в итоговый файл в виде DataURI: файл
+# самодостаточен, но правка читает и кодирует все буферы и изображения;
+# "reference" - итоговый файл ссылается на ресурсы исходного файла
+# по относительному пути, они не читаются и не копируются;
+# "link" - ресурсы появляются в директории ресурсов итогового файла как
+# жесткие ссылки (или reflink, или, если ни то ни другое невозможно, копии).
+#
+# В режимах reference и link правка записывает только JSON-документ, а новые
+# изображения текстур - отдельными файлами в директорию ресурсов. Файлы
+# в директории ресурсов создаются вместе с итоговым файлом (см.
+# ResultResources.output) и только для ресурсов, оставшихся в документе
+# после сжатия (см. data/compaction).
+import base64
+import fcntl
+import mimetypes
+import os
+import shutil
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from fastapi import status
+
+from src.core import metrics
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+from src.data.cache import TexturePayload, digest_cache
+from src.data.results import atomic_output
+
+# ioctl FICLONE (Linux): файл-копия разделяет блоки с исходным файлом
+# (btrfs, XFS), пока один из них не изменится.
+_FICLONE = 0x40049409
+
+
+def is_external(uri: Optional[str]) -> bool:
+    """URI ссылается на файл рядом с GLTF-файлом (не DataURI и не URL)."""
+    return bool(uri) and not uri.startswith("data:") and "://" not in uri
+
+
+def get_resources_directory(result_filepath: str) -> str:
+    # Своя директория у каждого итогового файла: ресурсы разных правок
+    # с одинаковыми именами файлов не перезаписывают друг друга.
+    return os.path.splitext(result_filepath)[0] + "_files"
+
+
+class ResultResources:
+    """
+    Внешние ресурсы итогового GLTF-файла. URI в документе переписываются
+    сразу (prepare, add_texture), а файлы в директории ресурсов создаются
+    только при записи итогового файла (output) - для ресурсов, на которые
+    документ к этому моменту еще ссылается.
+    """
+
+    def __init__(self, source_filepath: str, result_filepath: str):
+        self._source_directory = os.path.dirname(os.path.abspath(source_filepath))
+        self._result_filepath = result_filepath
+        self._directory = get_resources_directory(result_filepath)
+        # URI в итоговом файле -> путь файла ресурса и функция, создающая его.
+        self._pending: Dict[str, Tuple[str, Callable[[str], None]]] = {}
+
+    def prepare(self, objects: Iterable) -> None:
+        """
+        Заменяет URI внешних ресурсов (объектов Buffer и Image исходного файла)
+        в соответствии с settings.glb.gltf_resources.
+        """
+        for obj in objects:
+            if not is_external(obj.uri):
+                continue
+            relative_path = unquote(obj.uri)
+            filepath = os.path.normpath(
+                os.path.join(self._source_directory, relative_path)
+            )
+            if settings.glb.gltf_resources == "reference":
+                obj.uri = _make_uri(filepath, self._result_filepath)
+                continue
+            if not os.path.isfile(filepath):
+                raise GLBEditorException(
+                    detail='Файл "%s" отсутствует на сервере' % filepath,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+            if settings.glb.gltf_resources == "embed":
+                obj.uri = _make_data_uri(filepath)
+            else:
+                target_filepath = os.path.join(
+                    self._directory, _get_target_path(relative_path, filepath)
+                )
+                obj.uri = self._add(target_filepath, partial(_link_file, filepath))
+
+    def add_texture(self, payload: TexturePayload) -> str:
+        """
+        Новое изображение текстуры - файл в директории ресурсов. Имя файла -
+        по хэшу содержимого: одинаковые изображения записываются один раз.
+
+        Returns:
+            str: URI изображения в итоговом файле.
+        """
+        extension = mimetypes.guess_extension(payload.mime_type or "") or ""
+        target_filepath = os.path.join(
+            self._directory, payload.digest[:16] + extension
+        )
+        return self._add(target_filepath, partial(_write_texture, payload))
+
+    @contextmanager
+    def output(self, objects: Iterable) -> Iterator[str]:
+        """
+        То же, что atomic_output для итогового файла, но перед этим создает
+        файлы ресурсов, на которые ссылаются objects (объекты Buffer и Image
+        итогового документа). Если итоговый файл записать не удалось,
+        созданные файлы удаляются.
+        """
+        created: List[str] = []
+        try:
+            for uri in dict.fromkeys(obj.uri for obj in objects):
+                if uri not in self._pending:
+                    continue
+                target_filepath, create = self._pending[uri]
+                create(target_filepath)
+                created.append(target_filepath)
+            with atomic_output(self._result_filepath) as temp_filepath:
+                yield temp_filepath
+        except BaseException:
+            for target_filepath in created:
+                self._remove(target_filepath)
+            raise
+
+    def _add(self, target_filepath: str, create: Callable[[str], None]) -> str:
+        uri = _make_uri(target_filepath, self._result_filepath)
+        self._pending[uri] = (target_filepath, create)
+        return uri
+
+    def _remove(self, target_filepath: str) -> None:
+        try:
+            os.remove(target_filepath)
+        except FileNotFoundError:
+            pass
+        # Опустевшие поддиректории вплоть до самой директории ресурсов.
+        directory = os.path.dirname(target_filepath)
+        while os.path.commonpath([directory, self._directory]) == self._directory:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+def _get_target_path(relative_path: str, filepath: str) -> str:
+    # Структура поддиректорий ресурсов сохраняется, если они лежат внутри
+    # директории исходного файла. Ресурсы вне ее называются по хэшу
+    # содержимого: у файлов из разных директорий могут совпадать имена.
+    relative_path = os.path.normpath(relative_path)
+    if os.path.isabs(relative_path) or relative_path.startswith(os.pardir):
+        extension = os.path.splitext(relative_path)[1]
+        return digest_cache.get(filepath)[:16] + extension
+    return relative_path
+
+
+def _link_file(filepath: str, target_filepath: str) -> None:
+    with atomic_output(target_filepath) as temp_filepath:
+        try:
+            os.link(filepath, temp_filepath)
+            return
+        except OSError:
+            # Другая файловая система или жесткие ссылки не поддерживаются.
+            pass
+        try:
+            with open(filepath, "rb") as source, open(temp_filepath, "wb") as target:
+                fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            shutil.copyfile(filepath, temp_filepath)
+            metrics.add_value("bytes_written", os.path.getsize(filepath))
+
+
+def _write_texture(payload: TexturePayload, target_filepath: str) -> None:
+    with atomic_output(target_filepath) as temp_filepath:
+        with open(temp_filepath, "wb") as texture_file:
+            texture_file.write(payload.data)
+    metrics.add_value("bytes_written", len(payload.data))
+
+
+def _make_data_uri(filepath: str) -> str:
+    with open(filepath, "rb") as resource_file:
+        data = resource_file.read()
+    metrics.add_value("bytes_read", len(data))
+    mime_type, _ = mimetypes.guess_type(filepath)
+    encoded = base64.b64encode(data).decode()
+    return f"data:{mime_type or 'application/octet-stream'};base64,{encoded}"
+
+
+def _make_uri(filepath: str, result_filepath: str) -> str:
+    relative_path = os.path.relpath(
+        filepath, os.path.dirname(os.path.abspath(result_filepath))
+    )
+    return quote(relative_path.replace(os.sep, "/"))
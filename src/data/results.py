@@ -0,0 +1,175 @@
+# Хранилище итоговых файлов, адресуемых содержимым. Имя итогового файла
+# строится из хэша всего, что определяет его содержимое: содержимого исходного
+# файла, изменений из запроса, содержимого файлов текстур и настроек записи.
+# Поэтому одинаковые запросы дают одно и то же имя - повторный запрос сразу
+# возвращает уже записанный файл, не загружая модель, - а разные запросы
+# никогда не перезаписывают результаты друг друга.
+#
+# Одинаковые правки, выполняющиеся одновременно (в том числе в разных
+# процессах пула и воркерах uvicorn), записывают один и тот же итоговый файл.
+# Блокировка итогового файла (result_lock) выполняет их по очереди: каждая
+# следующая застает файл уже записанным и возвращает его.
+#
+# Рядом с итоговым файлом хранится запись повтора: ответ правки (например,
+# bytes_saved) и длительности ее этапов. Повтор правки возвращает тот же ответ,
+# что и исходная правка.
+import fcntl
+import hashlib
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional
+
+import orjson
+
+from src.core import metrics
+from src.core.settings import settings
+from src.data.cache import digest_cache
+from src.data.glb import is_glb
+from src.data.helpers import get_filename_from_digest, split_filename_from_path
+
+# Увеличивается при изменении способа записи итоговых файлов, чтобы
+# результаты прежней версии не выдавались за результаты новой.
+RESULT_FORMAT_VERSION = 2
+
+# Число символов хэша в имени итогового файла (64 бита).
+_DIGEST_LENGTH = 16
+
+# Файлы блокировок итоговых файлов. Итоговый файл блокируется через один
+# из _LOCK_STRIPES файлов (по хэшу пути), поэтому их число не растет
+# с числом итоговых файлов. Правки разных файлов, попавших на один файл
+# блокировки, изредка ждут друг друга - это дешевле, чем удалять файлы
+# блокировок без гонок.
+_LOCKS_DIRECTORY = os.path.join(tempfile.gettempdir(), "glbeditor-locks")
+_LOCK_STRIPES = 256
+
+
+def make_edit_digest(
+    kind: str,
+    source_filepath: str,
+    changes: Any,
+    texture_digests: Iterable[str] = (),
+) -> str:
+    """
+    Хэш правки: вид правки, содержимое исходного файла, изменения из запроса
+    (ключи словарей упорядочиваются), хэши содержимого файлов текстур
+    и настройки, от которых зависит итоговый файл.
+    """
+    edit = {
+        "version": RESULT_FORMAT_VERSION,
+        "kind": kind,
+        "source": digest_cache.get(source_filepath),
+        "changes": changes,
+        "textures": list(texture_digests),
+        "zero_copy": settings.glb.zero_copy,
+        "textures_embedding": settings.glb.textures_embedding,
+        "compaction": settings.glb.compaction,
+    }
+    if not is_glb(source_filepath):
+        edit["gltf_resources"] = settings.glb.gltf_resources
+    return hashlib.sha256(
+        orjson.dumps(edit, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()[:_DIGEST_LENGTH]
+
+
+def get_result_filepath(result_dir: str, source_filepath: str, digest: str) -> str:
+    return os.path.join(result_dir, get_filename_from_digest(source_filepath, digest))
+
+
+def save_replay(result_filepath: str, response: dict) -> None:
+    """
+    Записывает запись повтора уже записанного итогового файла: ответ правки
+    и длительности этапов из текущей записи метрик.
+    """
+    record = metrics.get_record()
+    replay = {
+        "response": response,
+        "stages": dict(record.stages) if record is not None else {},
+    }
+    with atomic_output(_get_replay_filepath(result_filepath)) as temp_filepath:
+        with open(temp_filepath, "wb") as replay_file:
+            replay_file.write(orjson.dumps(replay))
+
+
+def load_replay(result_filepath: str, required: bool = True) -> Optional[dict]:
+    """
+    Ответ правки, итоговый файл которой уже записан; этапы исходной правки
+    добавляются к текущей записи метрик (см. core/metrics.replay_stages).
+
+    Args:
+        result_filepath (str): итоговый файл
+        required (bool, optional): без записи повтора файл еще не считается
+        записанным: ее записывают после итогового файла под блокировкой
+        result_lock. False - вызывающий код держит блокировку, и итоговый
+        файл без записи повтора (например, записанный прежней версией)
+        возвращается с ответом без дополнительных полей.
+
+    Returns:
+        dict | None: ответ правки; None - итоговый файл не записан.
+    """
+    if not os.path.exists(result_filepath):
+        return None
+    try:
+        with open(_get_replay_filepath(result_filepath), "rb") as replay_file:
+            replay = orjson.loads(replay_file.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        if required:
+            return None
+        return {"status": "Готово", "result": result_filepath}
+    metrics.replay_stages(replay["stages"])
+    return replay["response"]
+
+
+def _get_replay_filepath(result_filepath: str) -> str:
+    directory, filename = os.path.split(result_filepath)
+    return os.path.join(directory, f".{filename}.replay.json")
+
+
+@contextmanager
+def result_lock(result_filepath: str) -> Iterator[None]:
+    """
+    Монопольная блокировка итогового файла на время его записи - между
+    процессами, через flock.
+    """
+    path_digest = hashlib.sha256(
+        os.path.abspath(result_filepath).encode()
+    ).digest()
+    stripe = int.from_bytes(path_digest[:4], "little") % _LOCK_STRIPES
+    os.makedirs(_LOCKS_DIRECTORY, exist_ok=True)
+    lock_fd = os.open(
+        os.path.join(_LOCKS_DIRECTORY, f"{stripe}.lock"), os.O_RDWR | os.O_CREAT
+    )
+    try:
+        with metrics.stage("lock"):
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Закрытие дескриптора снимает блокировку.
+        os.close(lock_fd)
+
+
+@contextmanager
+def atomic_output(result_filepath: str) -> Iterator[str]:
+    """
+    Возвращает путь временного файла в той же директории, а после успешной
+    записи атомарно переименовывает его в result_filepath. Читатель никогда
+    не увидит наполовину записанный итоговый файл, а при ошибке временный
+    файл удаляется.
+    """
+    directory = os.path.dirname(result_filepath)
+    os.makedirs(directory, exist_ok=True)
+    filename, extension = split_filename_from_path(result_filepath)
+    # Расширение сохраняется: по нему pygltflib выбирает формат записи.
+    temp_filepath = os.path.join(
+        directory, f".{filename}.{uuid.uuid4().hex}.tmp{extension}"
+    )
+    try:
+        yield temp_filepath
+        os.replace(temp_filepath, result_filepath)
+    except BaseException:
+        try:
+            os.remove(temp_filepath)
+        except FileNotFoundError:
+            pass
+        raise
@@ -1,10 +1,19 @@
 # Здесь находится класс для создания зависимости, пробрасываемой в обработчик
 # запросов (Dependency Injection)
 
-from src.data.repositories import GLBParamsRepository, GLBTexturesRepository
-from src.domain.usecases import ChangeParamsUseCase, ChangeTexturesUseCase
+from src.data.repositories import (GLBEditRepository, GLBInspectRepository,
+                                   GLBParamsRepository, GLBTexturesRepository)
+from src.domain.usecases import (BatchUseCase, ChangeParamsUseCase,
+                                 ChangeTexturesUseCase, EditUseCase,
+                                 FanOutParamsUseCase, InspectUseCase,
+                                 StreamParamsUseCase)
 
 
 class Container:
     params_editor_usecase = ChangeParamsUseCase(GLBParamsRepository)
+    params_fan_out_usecase = FanOutParamsUseCase(GLBParamsRepository)
+    params_stream_usecase = StreamParamsUseCase(GLBParamsRepository)
     textures_editor_usecase = ChangeTexturesUseCase(GLBTexturesRepository)
+    editor_usecase = EditUseCase(GLBEditRepository)
+    batch_usecase = BatchUseCase(GLBParamsRepository, GLBTexturesRepository)
+    inspect_usecase = InspectUseCase(GLBInspectRepository)
@@ -1,5 +1,21 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+
+@dataclass
+class MaterialOperation:
+    # Шаблон имени материала: glob ("Fabric_*") или регулярное выражение.
+    pattern: str
+    # "baseColorFactor", "metallicFactor", "roughnessFactor" или
+    # "emissiveFactor".
+    factor: str
+    # "set", "multiply", "add", "clamp" или "hsv_shift".
+    op: str
+    # Число или по числу компонент фактора; для clamp - [min, max], для
+    # hsv_shift - [сдвиг тона в градусах, насыщенности, яркости].
+    value: Union[float, List[float]]
+    # "glob" или "regex".
+    match: str = "glob"
 
 
 @dataclass
@@ -7,6 +23,14 @@ class PropertiesData:
     source_filepath: str
     result_filepath: str
     materials: List[Dict[str, Any]]
+    # Массовые операции над факторами материалов, отобранных по шаблону
+    # имени (см. data/bulk). Применяются после изменений materials.
+    operations: List[MaterialOperation] = field(default_factory=list)
+    # Не создавать итоговый файл, если в исходном нет ни одного материала
+    # из запроса.
+    skip_missing_materials: bool = False
+    # Пробный запуск: вернуть различия, не записывая итоговый файл.
+    dry_run: bool = False
 
 
 @dataclass
@@ -15,8 +39,43 @@ class _SingleTextureChange:
     materials: List[Dict[str, Any]]
 
 
+@dataclass
+class TextureProcessing:
+    # Наибольшая сторона изображения, пикселей. None - размер не меняется.
+    max_size: Optional[int] = None
+    # "png", "jpeg" или "webp". None - формат файла текстуры.
+    format: Optional[str] = None
+    # Качество сжатия JPEG и WebP, от 1 до 100.
+    quality: int = 85
+    # Удалять EXIF, ICC-профиль и прочие метаданные изображения.
+    strip_metadata: bool = True
+
+
 @dataclass
 class TexturesData:
     source_glbfilepath: str
     result_filepath: str
     files: List[_SingleTextureChange]
+    # Обработка изображений текстур перед встраиванием. None - файлы
+    # текстур встраиваются как есть.
+    processing: Optional[TextureProcessing] = None
+    dry_run: bool = False
+
+
+@dataclass
+class EditData:
+    source_filepath: str
+    result_filepath: str
+    materials: List[Dict[str, Any]] = field(default_factory=list)
+    operations: List[MaterialOperation] = field(default_factory=list)
+    files: List[_SingleTextureChange] = field(default_factory=list)
+    processing: Optional[TextureProcessing] = None
+    dry_run: bool = False
+
+
+@dataclass
+class BatchJob:
+    id: str
+    # "parameters" или "textures"
+    kind: str
+    data: Union[PropertiesData, TexturesData]
@@ -1,12 +1,25 @@
 import abc
+from typing import BinaryIO, Iterator, List, Tuple
 
-from src.domain.entities import PropertiesData, TexturesData
+from src.domain.entities import EditData, PropertiesData, TexturesData
 
 
 # Модуль абстрактных классов, переопределенных в data/repositories
 class IGLBParamsRepository(abc.ABC):
     async def change_parameters(self, data: PropertiesData): ...
 
+    async def change_parameters_stream(
+        self, source_file: BinaryIO, filename: str, materials: List[dict]
+    ) -> Tuple[int, Iterator[bytes]]: ...
+
 
 class IGLBTexturesRepository(abc.ABC):
     async def change_textures(self, data: TexturesData): ...
+
+
+class IGLBEditRepository(abc.ABC):
+    async def edit(self, data: EditData): ...
+
+
+class IGLBInspectRepository(abc.ABC):
+    async def inspect(self, filepath: str) -> dict: ...
@@ -1,7 +1,19 @@
 # Модуль с описанием класса, который импортирует repositories и используется
 # в качестве внедряемой зависимости.
-from src.data.repositories import GLBParamsRepository, GLBTexturesRepository
-from src.domain.entities import PropertiesData, TexturesData
+import asyncio
+import os
+from dataclasses import replace
+from typing import AsyncIterator, BinaryIO, Iterator, List, Tuple
+
+from fastapi import status
+
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+from src.data.helpers import find_source_files, is_source_pattern
+from src.data.repositories import (GLBEditRepository, GLBInspectRepository,
+                                   GLBParamsRepository, GLBTexturesRepository)
+from src.domain.entities import (BatchJob, EditData, PropertiesData,
+                                 TexturesData)
 
 
 class ChangeParamsUseCase:
@@ -12,9 +24,181 @@ class ChangeParamsUseCase:
         return await self._file_repo.change_parameters(request_data_object)
 
 
+class StreamParamsUseCase:
+    """
+    Изменение параметров GLB-файла, переданного в теле запроса. Итоговый
+    файл не записывается на диск, а отдается в ответе блоками.
+    """
+
+    def __init__(self, file_repo: GLBParamsRepository):
+        self._file_repo = file_repo()
+
+    async def invoke(
+        self, source_file: BinaryIO, filename: str, materials: List[dict]
+    ) -> Tuple[int, Iterator[bytes]]:
+        return await self._file_repo.change_parameters_stream(
+            source_file, filename, materials
+        )
+
+
+class FanOutParamsUseCase:
+    """
+    Применяет один набор изменений материалов ко всем файлам в директории
+    или по glob-шаблону из source_filepath. Результаты раскладываются
+    в result_filepath с сохранением структуры вложенных директорий.
+    """
+
+    def __init__(self, file_repo: GLBParamsRepository):
+        self._file_repo = file_repo()
+
+    async def invoke(self, request_data_object: PropertiesData) -> dict:
+        sources = find_source_files(request_data_object.source_filepath)
+        if not sources:
+            raise GLBEditorException(
+                detail='По пути "%s" не найдено ни одного GLB/GLTF-файла'
+                % request_data_object.source_filepath,
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        semaphore = asyncio.Semaphore(settings.batch.concurrency)
+
+        async def run(source_filepath: str, relative_dir: str) -> dict:
+            # Набор изменений уже провалидирован и общий для всех файлов.
+            data_object = replace(
+                request_data_object,
+                source_filepath=source_filepath,
+                result_filepath=os.path.join(
+                    request_data_object.result_filepath, relative_dir
+                ),
+                skip_missing_materials=True,
+            )
+            async with semaphore:
+                try:
+                    result = await self._file_repo.change_parameters(data_object)
+                except GLBEditorException as e:
+                    return {
+                        "source": source_filepath,
+                        "status_code": e.status_code,
+                        "error": e.detail,
+                    }
+                except Exception as e:
+                    return {
+                        "source": source_filepath,
+                        "status_code": 500,
+                        "error": f"Exception occurred: {e}",
+                    }
+            if "changes" in result:
+                # Пробный запуск: различия по каждому файлу.
+                return {"source": source_filepath, "changes": result["changes"]}
+            return {"source": source_filepath, "result": result["result"]}
+
+        results = await asyncio.gather(
+            *(run(source, relative_dir) for source, relative_dir in sources)
+        )
+        summary = {"succeeded": [], "skipped": [], "failed": []}
+        for result in results:
+            if "error" in result:
+                summary["failed"].append(result)
+            elif "changes" not in result and result["result"] is None:
+                summary["skipped"].append(result["source"])
+            else:
+                summary["succeeded"].append(result)
+        return {
+            "status": "Проверено" if request_data_object.dry_run else "Готово",
+            "total": len(results),
+            **summary,
+        }
+
+
 class ChangeTexturesUseCase:
     def __init__(self, file_repo: GLBTexturesRepository):
         self._file_repo = file_repo()
 
     async def invoke(self, request_data_object: TexturesData) -> bool:
         return await self._file_repo.change_textures(request_data_object)
+
+
+class EditUseCase:
+    def __init__(self, file_repo: GLBEditRepository):
+        self._file_repo = file_repo()
+
+    async def invoke(self, request_data_object: EditData) -> dict:
+        return await self._file_repo.edit(request_data_object)
+
+
+class InspectUseCase:
+    def __init__(self, file_repo: GLBInspectRepository):
+        self._file_repo = file_repo()
+
+    async def invoke(self, filepath: str) -> dict:
+        return await self._file_repo.inspect(filepath)
+
+
+class BatchUseCase:
+    def __init__(
+        self,
+        params_repo: GLBParamsRepository,
+        textures_repo: GLBTexturesRepository,
+    ):
+        self._params_repo = params_repo()
+        self._textures_repo = textures_repo()
+
+    async def invoke(self, jobs: List[BatchJob]) -> AsyncIterator[dict]:
+        """
+        Выполняет задания параллельно - не более settings.batch.concurrency
+        одновременно - и отдает результат каждого по мере готовности.
+        Ошибка одного задания не прерывает выполнение остальных.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(jobs)
+
+        async def work() -> None:
+            # Исполнитель берет следующее задание, только завершив
+            # предыдущее: задачи создаются по мере выполнения, а не все сразу.
+            for job in pending:
+                await results.put(await self._run(job))
+
+        workers = [
+            asyncio.create_task(work())
+            for _ in range(min(settings.batch.concurrency, len(jobs)))
+        ]
+        try:
+            for _ in jobs:
+                yield await results.get()
+        finally:
+            # Если клиент разорвал соединение, незапущенные задания отменяются.
+            for worker in workers:
+                worker.cancel()
+
+    async def _run(self, job: BatchJob) -> dict:
+        try:
+            if job.kind == "parameters":
+                # Изменение файлов директории или glob-шаблона - отдельный
+                # запрос к /parameters со своим итоговым отчетом.
+                if is_source_pattern(job.data.source_filepath):
+                    raise GLBEditorException(
+                        detail="Задание пакета изменяет один файл: директории"
+                        " и glob-шаблоны в source_filepath поддерживает"
+                        " только /parameters",
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                result = await self._params_repo.change_parameters(job.data)
+            else:
+                result = await self._textures_repo.change_textures(job.data)
+        except GLBEditorException as e:
+            return {
+                "id": job.id,
+                "status": "failed",
+                "status_code": e.status_code,
+                "error": e.detail,
+            }
+        except Exception as e:
+            return {
+                "id": job.id,
+                "status": "failed",
+                "status_code": 500,
+                "error": f"Exception occurred: {e}",
+            }
+        if "changes" in result:
+            # Пробный запуск: различия вместо итогового файла.
+            return {"id": job.id, "status": "done", "changes": result["changes"]}
+        return {"id": job.id, "status": "done", "result": result["result"]}
@@ -1,9 +1,22 @@
+from contextlib import asynccontextmanager
+
 from fastapi import APIRouter, FastAPI
 
+from src.core.executor import shutdown_executor
+from src.core.jobs import job_manager
 from src.core.settings import settings
+from src.presentation.middleware import MetricsMiddleware
 from src.presentation.routers import router
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    job_manager.recover()
+    yield
+    await job_manager.shutdown()
+    shutdown_executor()
+
+
 def _create_app(router: APIRouter):
     app = FastAPI(
         title="GLB-file editor API",
@@ -17,9 +30,11 @@ def _create_app(router: APIRouter):
             if settings.app.mount_swagger or settings.app.mount_redoc
             else None
         ),
+        lifespan=_lifespan,
     )
 
     app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
     return app
 
 
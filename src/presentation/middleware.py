@@ -0,0 +1,50 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core import metrics
+from src.core.settings import settings
+
+
+class MetricsMiddleware:
+    """
+    Начинает запись метрик каждого HTTP-запроса, добавляет к ответу заголовок
+    Server-Timing с длительностями этапов и передает запись в гистограммы
+    /glbeditor/metrics. Написан как чистое ASGI-приложение, без
+    BaseHTTPMiddleware, чтобы не добавлять к запросу лишних задач и копий тела.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        record = metrics.start_record()
+        started_at = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Для потоковых ответов заголовок отражает этапы, завершенные
+                # до начала отдачи тела.
+                server_timing = metrics.format_server_timing(
+                    record, time.perf_counter() - started_at
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", server_timing.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # После маршрутизации в scope есть маршрут - по его шаблону,
+            # а не по фактическому пути, чтобы не плодить метки (jobs/{job_id}).
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            metrics.observe_request(
+                endpoint, record, time.perf_counter() - started_at
+            )
@@ -1,44 +1,207 @@
-from typing import List, Optional, Union
+import re
+from typing import Annotated, List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from src.domain import entities
+
+# Модели материалов описывают только те поля, которые нужно проверить.
+# Прочие поля материала (emissiveFactor, occlusionTexture и т.д.) пропускаются
+# как есть, их проверяет уже репозиторий по схеме pygltflib.
+_PASS_THROUGH = ConfigDict(extra="allow")
+
+
+# Число компонент факторов материала, изменяемых массовыми операциями.
+_FACTOR_SIZES = {
+    "baseColorFactor": 4,
+    "metallicFactor": 1,
+    "roughnessFactor": 1,
+    "emissiveFactor": 3,
+}
+
+
+def _dump_materials(materials: List["MaterialModel"]) -> List[dict]:
+    # В изменения попадают только поля, пришедшие в запросе: значения
+    # по умолчанию из моделей не должны затирать значения из файла.
+    return [material.model_dump(exclude_unset=True) for material in materials]
 
 
 class NormalMaterialTextureModel(BaseModel):
+    model_config = _PASS_THROUGH
+
     index: Optional[int] = None
     texCoord: Optional[int] = None
     scale: Optional[float] = 1.0
 
 
 class TextureInfoModel(BaseModel):
+    model_config = _PASS_THROUGH
+
     index: int = None
     texCoord: Optional[int] = 0
 
 
 class PbrMetallicRoughnessModel(BaseModel):
+    model_config = _PASS_THROUGH
+
     baseColorFactor: Optional[List[Union[int, float]]] = None
     metallicFactor: Optional[Union[int, float]] = None
     roughnessFactor: Optional[Union[int, float]] = None
     baseColorTexture: Optional[TextureInfoModel] = None
+    metallicRoughnessTexture: Optional[TextureInfoModel] = None
 
 
 class MaterialModel(BaseModel):
+    model_config = _PASS_THROUGH
+
     name: str
     pbrMetallicRoughness: Optional[PbrMetallicRoughnessModel] = None
+    normalTexture: Optional[NormalMaterialTextureModel] = None
     normalMaterialTexture: Optional[NormalMaterialTextureModel] = None
 
 
+class MaterialOperationModel(BaseModel):
+    pattern: str
+    match: Literal["glob", "regex"] = "glob"
+    factor: Literal[
+        "baseColorFactor", "metallicFactor", "roughnessFactor", "emissiveFactor"
+    ]
+    op: Literal["set", "multiply", "add", "clamp", "hsv_shift"]
+    value: Union[float, List[float]]
+
+    @model_validator(mode="after")
+    def check_value(self) -> "MaterialOperationModel":
+        if self.match == "regex":
+            try:
+                re.compile(self.pattern)
+            except re.error as e:
+                raise ValueError(f"Некорректное регулярное выражение: {e}")
+        value = self.value if isinstance(self.value, list) else [self.value]
+        factor_size = _FACTOR_SIZES[self.factor]
+        if self.op == "clamp":
+            if len(value) != 2 or value[0] > value[1]:
+                raise ValueError("Для clamp value - [min, max]")
+        elif self.op == "hsv_shift":
+            if factor_size == 1:
+                raise ValueError(f"hsv_shift неприменим к {self.factor}")
+            if len(value) != 3:
+                raise ValueError(
+                    "Для hsv_shift value - [тон в градусах, насыщенность, яркость]"
+                )
+        elif len(value) not in (1, factor_size):
+            raise ValueError(
+                f"Для {self.factor} value - число или список из {factor_size} чисел"
+            )
+        return self
+
+    def to_entity(self) -> entities.MaterialOperation:
+        return entities.MaterialOperation(**self.model_dump())
+
+
 class MaterialsRequestModel(BaseModel):
     source_filepath: str
     result_filepath: str
+    materials: List[MaterialModel] = []
+    operations: List[MaterialOperationModel] = []
+    dry_run: bool = False
+
+    def to_entity(self) -> entities.PropertiesData:
+        return entities.PropertiesData(
+            source_filepath=self.source_filepath,
+            result_filepath=self.result_filepath,
+            materials=_dump_materials(self.materials),
+            operations=[operation.to_entity() for operation in self.operations],
+            dry_run=self.dry_run,
+        )
+
+
+class StreamMaterialsRequestModel(BaseModel):
+    # Изменения для файла, переданного в теле запроса (см. /stream/parameters).
     materials: List[MaterialModel]
 
+    def materials_changes(self) -> List[dict]:
+        return _dump_materials(self.materials)
+
 
 class _SingleTextureChange(BaseModel):
     texturefilepath: str
     materials: List[MaterialModel]
 
+    def to_entity(self) -> entities._SingleTextureChange:
+        return entities._SingleTextureChange(
+            texturefilepath=self.texturefilepath,
+            materials=_dump_materials(self.materials),
+        )
+
+
+class TextureProcessingModel(BaseModel):
+    max_size: Optional[int] = Field(default=None, ge=1)
+    format: Optional[Literal["png", "jpeg", "webp"]] = None
+    quality: int = Field(default=85, ge=1, le=100)
+    strip_metadata: bool = True
+
+    def to_entity(self) -> entities.TextureProcessing:
+        return entities.TextureProcessing(**self.model_dump())
+
+
+def _processing_entity(
+    processing: Optional[TextureProcessingModel],
+) -> Optional[entities.TextureProcessing]:
+    return processing.to_entity() if processing is not None else None
+
 
 class TexturesRequestModel(BaseModel):
     source_glbfilepath: str
     result_filepath: str
     files: List[_SingleTextureChange]
+    processing: Optional[TextureProcessingModel] = None
+    dry_run: bool = False
+
+    def to_entity(self) -> entities.TexturesData:
+        return entities.TexturesData(
+            source_glbfilepath=self.source_glbfilepath,
+            result_filepath=self.result_filepath,
+            files=[change.to_entity() for change in self.files],
+            processing=_processing_entity(self.processing),
+            dry_run=self.dry_run,
+        )
+
+
+class EditRequestModel(BaseModel):
+    source_filepath: str
+    result_filepath: str
+    materials: List[MaterialModel] = []
+    operations: List[MaterialOperationModel] = []
+    files: List[_SingleTextureChange] = []
+    processing: Optional[TextureProcessingModel] = None
+    dry_run: bool = False
+
+    def to_entity(self) -> entities.EditData:
+        return entities.EditData(
+            source_filepath=self.source_filepath,
+            result_filepath=self.result_filepath,
+            materials=_dump_materials(self.materials),
+            operations=[operation.to_entity() for operation in self.operations],
+            files=[change.to_entity() for change in self.files],
+            processing=_processing_entity(self.processing),
+            dry_run=self.dry_run,
+        )
+
+
+class ParametersJobModel(MaterialsRequestModel):
+    type: Literal["parameters"]
+    id: Optional[str] = None
+
+
+class TexturesJobModel(TexturesRequestModel):
+    type: Literal["textures"]
+    id: Optional[str] = None
+
+
+class BatchRequestModel(BaseModel):
+    jobs: List[
+        Annotated[
+            Union[ParametersJobModel, TexturesJobModel],
+            Field(discriminator="type"),
+        ]
+    ]
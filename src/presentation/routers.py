@@ -1,18 +1,70 @@
-import json
+from typing import Any, Awaitable, Callable, Optional, Type, TypeVar
+from urllib.parse import quote
 
+import orjson
 from fastapi import APIRouter, Depends, Request, status
-from fastapi.responses import JSONResponse
-from pydantic import ValidationError
-from dacite import from_dict
+from fastapi.responses import (ORJSONResponse, PlainTextResponse, Response,
+                               StreamingResponse)
+from pydantic import BaseModel, ValidationError
+from python_multipart.multipart import parse_options_header
+from starlette.background import BackgroundTask
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 
+from src.core import metrics
+from src.core.exceptions import GLBEditorException
+from src.core.executor import get_workers_stats
+from src.core.jobs import job_manager
+from src.core.settings import settings
+from src.data.helpers import is_source_pattern
+from src.data.inspection import make_etag
 from src.dependencies.dependencies import Container
-from src.domain.entities import PropertiesData, TexturesData
-from src.domain.usecases import ChangeParamsUseCase, ChangeTexturesUseCase
-from src.presentation.requests import (MaterialsRequestModel,
+from src.domain.entities import BatchJob
+from src.domain.usecases import (BatchUseCase, ChangeParamsUseCase,
+                                 ChangeTexturesUseCase, EditUseCase,
+                                 InspectUseCase, StreamParamsUseCase)
+from src.presentation.requests import (BatchRequestModel, EditRequestModel,
+                                       MaterialsRequestModel,
+                                       StreamMaterialsRequestModel,
                                        TexturesRequestModel)
 
 router = APIRouter(prefix="/glbeditor", tags=["Changing GLB-file parameters"])
 
+RequestModel = TypeVar("RequestModel", bound=BaseModel)
+
+
+async def _validate_body(request: Request, model: Type[RequestModel]) -> RequestModel:
+    # Тело запроса разбирается и валидируется за один проход парсером
+    # pydantic, без промежуточного словаря. Некорректный JSON - такая же
+    # ошибка валидации, как и несоответствие модели.
+    return model.model_validate_json(await request.body())
+
+
+def _validation_error_response(e: ValidationError) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"description": f"Ошибка валидации тела запроса: {e}"},
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+async def _run_or_enqueue(
+    kind: str, run: Callable[[], Awaitable[Any]], dry_run: bool = False
+) -> ORJSONResponse:
+    # Пробный запуск ничего не записывает, поэтому выполняется сразу,
+    # без очереди заданий, и ответ - различия, а не созданный файл.
+    if dry_run:
+        return ORJSONResponse(await run(), status.HTTP_200_OK)
+    # В асинхронном режиме задание ставится в очередь, а клиент получает
+    # адрес, по которому можно узнать его состояние и результат.
+    if settings.jobs.enabled:
+        job = job_manager.submit(kind, run)
+        return ORJSONResponse(
+            {"id": job.id, "status": job.status},
+            status.HTTP_202_ACCEPTED,
+            headers={"Location": f"{router.prefix}/jobs/{job.id}"},
+        )
+    return ORJSONResponse(await run(), status.HTTP_201_CREATED)
+
 
 @router.post("/parameters")
 async def change_file_params(
@@ -117,46 +169,235 @@ async def change_file_params(
     # на спецификации GLTF, а значит гарантируется полное соответствие стандарту
     # и работоспособность со всеми программными продуктами, которые тоже его
     # используют.
-
-    request_binary_data = await request.body()
-    request_data = json.loads(request_binary_data.decode())
+    # Сейчас эти ступени сводятся к тому, что модель запроса сохраняет только
+    # поля, пришедшие в запросе (model_dump(exclude_unset=True)), а слияние
+    # с параметрами файла выполняет репозиторий.
 
     try:
-        _ = MaterialsRequestModel.model_validate(request_data)
+        request_model = await _validate_body(request, MaterialsRequestModel)
     except ValidationError as e:
-        return JSONResponse(
-            {"description": f"Ошибка валидации тела запроса: {e}"},
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        )
+        return _validation_error_response(e)
     else:
-        _ = None
-        data_object = PropertiesData(
-            source_filepath=request_data["source_filepath"],
-            result_filepath=request_data["result_filepath"],
-            materials=request_data["materials"],
-        )
-        result = await usecase.params_editor_usecase.invoke(data_object)
+        data_object = request_model.to_entity()
+        # Если источник - директория или glob-шаблон, изменения применяются
+        # ко всем найденным в нем файлам.
+        if is_source_pattern(data_object.source_filepath):
+            params_usecase = usecase.params_fan_out_usecase
+        else:
+            params_usecase = usecase.params_editor_usecase
 
-        return JSONResponse(result, status.HTTP_201_CREATED)
+        return await _run_or_enqueue(
+            "parameters",
+            lambda: params_usecase.invoke(data_object),
+            data_object.dry_run,
+        )
 
 
 @router.post("/textures")
 async def change_file_textures(
     request: Request, usecase: ChangeTexturesUseCase = Depends(Container)
 ):
-    request_binary_data = await request.body()
-    request_data = json.loads(request_binary_data.decode())
-
     try:
-        _ = TexturesRequestModel.model_validate(request_data)
+        request_model = await _validate_body(request, TexturesRequestModel)
     except ValidationError as e:
-        return JSONResponse(
-            {"description": f"Ошибка валидации тела запроса: {e}"},
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        return _validation_error_response(e)
+    else:
+        data_object = request_model.to_entity()
+
+        return await _run_or_enqueue(
+            "textures",
+            lambda: usecase.textures_editor_usecase.invoke(data_object),
+            data_object.dry_run,
         )
+
+
+@router.post("/edit")
+async def edit_file(request: Request, usecase: EditUseCase = Depends(Container)):
+    # Изменение параметров материалов и текстур одним запросом: файл
+    # загружается и записывается один раз.
+    try:
+        request_model = await _validate_body(request, EditRequestModel)
+    except ValidationError as e:
+        return _validation_error_response(e)
     else:
-        _ = None
-        data_object = from_dict(TexturesData, request_data)
-        result = await usecase.textures_editor_usecase.invoke(data_object)
+        data_object = request_model.to_entity()
+
+        return await _run_or_enqueue(
+            "edit",
+            lambda: usecase.editor_usecase.invoke(data_object),
+            data_object.dry_run,
+        )
+
+
+@router.post("/stream/parameters")
+async def stream_file_params(
+    request: Request, usecase: StreamParamsUseCase = Depends(Container)
+):
+    # Исходный файл приходит в теле запроса (multipart/form-data: часть
+    # "model" - GLB-файл, часть "changes" - изменения материалов), итоговый
+    # отдается в теле ответа. Файловая система сервера не используется, кроме
+    # временного файла, в который starlette сбрасывает большое тело запроса.
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        if not content_length.isdigit():
+            raise GLBEditorException(
+                detail="Некорректный заголовок Content-Length",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        if int(content_length) > settings.stream.max_bytes:
+            _raise_too_large()
+
+    form = await _read_form(request)
+    try:
+        model = form.get("model")
+        if not isinstance(model, UploadFile):
+            raise GLBEditorException(
+                detail='Часть запроса "model" с GLB-файлом отсутствует',
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if model.size is not None and model.size > settings.stream.max_bytes:
+            _raise_too_large()
+        try:
+            request_model = StreamMaterialsRequestModel.model_validate_json(
+                form.get("changes") or ""
+            )
+        except ValidationError as e:
+            await form.close()
+            return _validation_error_response(e)
+
+        filename = model.filename or "model.glb"
+        length, blocks = await usecase.params_stream_usecase.invoke(
+            model.file, filename, request_model.materials_changes()
+        )
+    except BaseException:
+        await form.close()
+        raise
+
+    return StreamingResponse(
+        blocks,
+        media_type="model/gltf-binary",
+        headers={
+            "Content-Length": str(length),
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        },
+        # Временный файл с телом запроса нужен, пока ответ не отдан целиком.
+        background=BackgroundTask(form.close),
+    )
+
+
+async def _read_form(request: Request) -> FormData:
+    # То же, что request.form(max_files=1, max_fields=1), но размер тела
+    # проверяется по мере чтения: запрос без Content-Length (chunked)
+    # прерывается, как только превысит settings.stream.max_bytes, а не после
+    # того, как будет целиком записан во временный файл.
+    content_type, _ = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data":
+        return FormData()
+
+    too_large = False
+
+    async def read_limited():
+        nonlocal too_large
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > settings.stream.max_bytes:
+                too_large = True
+                # Исключение парсера: он сам закроет уже созданные временные
+                # файлы.
+                raise MultiPartException("Request body is too large")
+            yield chunk
+
+    parser = MultiPartParser(
+        request.headers, read_limited(), max_files=1, max_fields=1
+    )
+    try:
+        return await parser.parse()
+    except MultiPartException as e:
+        if too_large:
+            _raise_too_large()
+        raise GLBEditorException(
+            detail=e.message, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+
+def _raise_too_large():
+    raise GLBEditorException(
+        detail="Размер файла превышает %d байт" % settings.stream.max_bytes,
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    )
+
+
+@router.post("/batch")
+async def run_batch(
+    request: Request, usecase: BatchUseCase = Depends(Container)
+):
+    # Пакет заданий на изменение параметров и текстур, в том числе разных
+    # файлов. Задания выполняются параллельно, результат каждого отдается
+    # отдельной строкой NDJSON сразу по готовности.
+    try:
+        request_model = await _validate_body(request, BatchRequestModel)
+    except ValidationError as e:
+        return _validation_error_response(e)
+
+    jobs = [
+        BatchJob(job.id or str(job_number), job.type, job.to_entity())
+        for job_number, job in enumerate(request_model.jobs)
+    ]
+
+    async def stream_results():
+        async for job_result in usecase.batch_usecase.invoke(jobs):
+            yield orjson.dumps(job_result) + b"\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@router.get("/inspect")
+async def inspect_file(
+    request: Request, path: str, usecase: InspectUseCase = Depends(Container)
+):
+    # Сводка о файле: материалы, текстуры, изображения и статистика
+    # геометрии. ETag вычисляется по метаданным файла, поэтому повторный
+    # запрос неизмененного файла получает 304, не читая файл.
+    etag = make_etag(path)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return ORJSONResponse(
+        await usecase.inspect_usecase.invoke(path), headers=headers
+    )
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match сравнивается без учета признака слабого ETag (W/).
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag.removeprefix("W/")
+        for candidate in if_none_match.split(",")
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    # Состояние асинхронного задания: queued, running, done или failed,
+    # длительности ожидания и выполнения и результат.
+    return ORJSONResponse(job_manager.get(job_id))
+
+
+@router.get("/metrics")
+async def get_metrics():
+    # Гистограммы длительностей этапов, прочитанных и записанных байт и т.д.
+    # в текстовом формате Prometheus.
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
 
-        return JSONResponse(result, status.HTTP_201_CREATED)
+@router.get("/cache")
+async def get_cache_stats():
+    # Счетчики кэшей, просуммированные по процессам пула, - для подбора
+    # их размеров.
+    return ORJSONResponse(get_workers_stats())
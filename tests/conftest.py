@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Настройки приложения читаются при импорте src, а эти переменные обязательны.
+os.environ.setdefault("UVICORN_PORT", "9596")
+os.environ.setdefault("UVICORN_WORKERS", "1")
+
+from benchmarks.generate import ModelSpec, generate  # noqa: E402
+
+SMALL_MODEL = ModelSpec(
+    materials=8, textures=6, images=4, meshes=4, bin_bytes=4096, image_size=8
+)
+
+
+@pytest.fixture
+def model_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "model.glb")
+    generate(filepath, SMALL_MODEL)
+    return filepath
+
+
+@pytest.fixture
+def result_dir(tmp_path) -> str:
+    return str(tmp_path / "results")
@@ -0,0 +1,80 @@
+import asyncio
+
+from src.core.admission import MemoryAdmission
+
+
+async def _task(admission, name, estimated_bytes, events, release):
+    async with admission.admit(estimated_bytes):
+        events.append(name)
+        await release.wait()
+
+
+def test_tasks_are_admitted_in_arrival_order():
+    async def scenario():
+        admission = MemoryAdmission(100)
+        events = []
+        releases = {name: asyncio.Event() for name in ("a", "big", "small")}
+        tasks = {}
+        for name, estimated_bytes in (("a", 60), ("big", 80), ("small", 10)):
+            tasks[name] = asyncio.ensure_future(
+                _task(admission, name, estimated_bytes, events, releases[name])
+            )
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # Маленькая задача поместилась бы в бюджет, но не обгоняет большую.
+        assert events == ["a"]
+        assert admission.stats()["waiting"] == 2
+
+        releases["a"].set()
+        await asyncio.sleep(0.01)
+        assert events == ["a", "big", "small"]
+        assert admission.stats()["admitted_bytes"] == 90
+
+        releases["big"].set()
+        releases["small"].set()
+        await asyncio.gather(*tasks.values())
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["admitted_bytes"] == stats["running"] == stats["waiting"] == 0
+
+
+def test_task_over_budget_runs_alone():
+    async def scenario():
+        admission = MemoryAdmission(100)
+        events = []
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_task(admission, "a", 10, events, release))
+        await asyncio.sleep(0)
+        huge = asyncio.ensure_future(_task(admission, "huge", 1000, events, release))
+        await asyncio.sleep(0)
+        assert events == ["a"]
+        release.set()
+        await asyncio.gather(first, huge)
+        return events
+
+    assert asyncio.run(scenario()) == ["a", "huge"]
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def scenario():
+        admission = MemoryAdmission(100)
+        events = []
+        release = asyncio.Event()
+        first = asyncio.ensure_future(_task(admission, "a", 60, events, release))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(_task(admission, "b", 80, events, release))
+        last = asyncio.ensure_future(_task(admission, "c", 30, events, release))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        # Отмененная задача больше не задерживает следующую.
+        assert events == ["a", "c"]
+        release.set()
+        await asyncio.gather(first, last)
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["admitted_bytes"] == stats["waiting"] == 0
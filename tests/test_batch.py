@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app
+from src.core.settings import settings
+from src.domain.entities import BatchJob, PropertiesData
+from src.domain.usecases import BatchUseCase
+
+CHANGES = [{"name": "Material_00000", "doubleSided": True}]
+
+
+def _post_batch(jobs: list) -> dict:
+    with TestClient(app) as client:
+        response = client.post("/glbeditor/batch", json={"jobs": jobs})
+    assert response.status_code == 200
+    results = [orjson.loads(line) for line in response.content.splitlines()]
+    return {result["id"]: result for result in results}
+
+
+def _parameters_job(job_id: str, source_filepath: str, result_dir: str, **extra):
+    return {
+        "type": "parameters",
+        "id": job_id,
+        "source_filepath": source_filepath,
+        "result_filepath": result_dir,
+        "materials": CHANGES,
+        **extra,
+    }
+
+
+def test_batch_results(model_filepath, result_dir, tmp_path):
+    results = _post_batch(
+        [
+            _parameters_job("write", model_filepath, result_dir),
+            _parameters_job("dry-run", model_filepath, result_dir, dry_run=True),
+            _parameters_job("directory", str(tmp_path), result_dir),
+            _parameters_job("missing", str(tmp_path / "missing.glb"), result_dir),
+        ]
+    )
+
+    assert results["write"]["status"] == "done"
+    assert os.path.isfile(results["write"]["result"])
+    assert results["dry-run"] == {
+        "id": "dry-run",
+        "status": "done",
+        "changes": [
+            {
+                "material": "Material_00000",
+                "path": "/materials/0/doubleSided",
+                "old": None,
+                "new": True,
+            }
+        ],
+    }
+    assert results["directory"]["status"] == "failed"
+    assert results["directory"]["status_code"] == 422
+    assert results["missing"]["status_code"] == 400
+    # Пробный запуск ничего не записал (скрытые файлы - служебные файлы
+    # записанного итогового файла).
+    assert [name for name in os.listdir(result_dir) if not name.startswith(".")] == [
+        os.path.basename(results["write"]["result"])
+    ]
+
+
+class _SlowParamsRepository:
+    active = 0
+    max_active = 0
+    max_tasks = 0
+
+    async def change_parameters(self, data: PropertiesData) -> dict:
+        cls = type(self)
+        cls.active += 1
+        cls.max_active = max(cls.max_active, cls.active)
+        cls.max_tasks = max(cls.max_tasks, len(asyncio.all_tasks()))
+        await asyncio.sleep(0.01)
+        cls.active -= 1
+        return {"result": data.result_filepath}
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_batch_runs_bounded_number_of_tasks(
+    model_filepath, monkeypatch, concurrency
+):
+    monkeypatch.setattr(settings.batch, "concurrency", concurrency)
+    repository = type("Repository", (_SlowParamsRepository,), {})
+    jobs = [
+        BatchJob(str(number), "parameters", PropertiesData(model_filepath, "", []))
+        for number in range(10)
+    ]
+
+    async def run() -> list:
+        usecase = BatchUseCase(repository, repository)
+        return [result["id"] async for result in usecase.invoke(jobs)]
+
+    results = asyncio.run(run())
+
+    assert sorted(results, key=int) == [str(number) for number in range(10)]
+    assert repository.max_active == concurrency
+    # Задачи исполнителей и основная задача - не по задаче на задание.
+    assert repository.max_tasks == concurrency + 1
@@ -0,0 +1,93 @@
+import io
+import json
+import sys
+
+import pytest
+from PIL import Image
+from pygltflib import GLTF2
+
+from benchmarks import run
+from benchmarks.generate import (ModelSpec, generate, has_texture, make_png,
+                                 material_name)
+
+TINY_MODEL = ModelSpec(
+    materials=10, textures=4, images=3, meshes=5, bin_bytes=2048, image_size=4
+)
+
+
+def test_generated_model(tmp_path):
+    filepath = str(tmp_path / "model.glb")
+
+    generate(filepath, TINY_MODEL)
+
+    gltf = GLTF2().load(filepath)
+    assert len(gltf.materials) == TINY_MODEL.materials
+    assert len(gltf.meshes) == len(gltf.nodes) == TINY_MODEL.meshes
+    assert len(gltf.binary_blob()) >= TINY_MODEL.bin_bytes
+    assert [material.name for material in gltf.materials[:2]] == [
+        material_name(0), material_name(1),
+    ]
+    # Текстуры от images и выше ссылаются на уже занятые изображения,
+    # материалы от textures и выше - на уже занятые текстуры.
+    assert [texture.source for texture in gltf.textures] == [0, 1, 2, 0]
+    textures = [
+        material.pbrMetallicRoughness.baseColorTexture
+        for material in gltf.materials
+    ]
+    assert [texture.index if texture else None for texture in textures] == [
+        0, 1, 2, 3, 0, 1, None, 3, 0, 1,
+    ]
+    assert [has_texture(index) for index in range(8)] == [True] * 6 + [False, True]
+
+
+def test_make_png():
+    with Image.open(io.BytesIO(make_png(5, 1))) as image:
+        assert image.size == (5, 5)
+        assert image.getpixel((4, 4)) == (67, 131, 197)
+
+
+@pytest.mark.parametrize("operation", run.OPERATIONS)
+def test_run_case(operation):
+    case = run.run_case(operation, TINY_MODEL, iterations=3, changed=4, cold=False)
+
+    assert case["iterations"] == 3
+    latency = case["latency_ms"]
+    assert latency["min"] <= latency["p50"] <= latency["p99"] <= latency["max"]
+    assert {"load", "save"} <= set(case["stages_ms"])
+    assert case["throughput_per_second"] > 0
+    assert case["peak_rss_bytes"] > 0
+
+
+def test_summarize_percentiles():
+    latencies = [number / 1000 for number in range(100, 0, -1)]
+
+    assert run._summarize(latencies) == {
+        "min": 1.0, "mean": 50.5, "p50": 50.0, "p90": 90.0, "p99": 99.0, "max": 100.0,
+    }
+
+
+def test_report_is_saved_and_compared(tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(run.PRESETS, "small", TINY_MODEL)
+    output_filepath = str(tmp_path / "report.json")
+
+    def main(*arguments):
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "run", "--presets", "small", "--operations", "parameters",
+                "--iterations", "2", *arguments,
+            ],
+        )
+        run.main()
+
+    main("--output", output_filepath)
+    main("--output", str(tmp_path / "second.json"), "--compare", output_filepath)
+
+    with open(output_filepath, encoding="utf-8") as report_file:
+        report = json.load(report_file)
+    assert report["presets"]["small"]["materials"] == TINY_MODEL.materials
+    assert [(case["preset"], case["operation"]) for case in report["results"]] == [
+        ("small", "parameters")
+    ]
+    assert "Сравнение с" in capsys.readouterr().out
@@ -0,0 +1,138 @@
+import pytest
+from pygltflib import Material
+
+from src.core.exceptions import GLBEditorException
+from src.data.bulk import apply_operations, select
+from src.domain.entities import MaterialOperation
+
+
+def _material(name: str, base_color=None, **fields) -> dict:
+    material = {"name": name, **fields}
+    if base_color is not None:
+        material["pbrMetallicRoughness"] = {"baseColorFactor": base_color}
+    return material
+
+
+def _base_colors(materials: list) -> list:
+    return [
+        value
+        for material in materials
+        for value in material["pbrMetallicRoughness"]["baseColorFactor"]
+    ]
+
+
+def _apply(materials: list, *operations: MaterialOperation) -> set:
+    copied = set()
+    apply_operations(materials, operations, copied)
+    return copied
+
+
+def test_select_glob_and_regex():
+    names = ["Fabric_1", "Fabric_2", "Metal", None]
+
+    glob = MaterialOperation("Fabric_*", "metallicFactor", "set", 0)
+    assert select(names, glob) == [0, 1]
+    assert select(
+        names,
+        MaterialOperation("Fabric_[2-9]|Metal", "metallicFactor", "set", 0, "regex"),
+    ) == [1, 2]
+    # Шаблон должен подходить под имя целиком.
+    assert select(names, MaterialOperation("Fabric", "metallicFactor", "set", 0)) == []
+
+
+def test_set_uses_specification_default_and_copies_materials():
+    source = _material("Fabric_1")
+    materials = [source, _material("Metal")]
+
+    copied = _apply(
+        materials,
+        MaterialOperation("Fabric_*", "roughnessFactor", "multiply", 0.5),
+        MaterialOperation("Fabric_*", "emissiveFactor", "set", 0.25),
+    )
+
+    assert copied == {0}
+    assert materials[0]["pbrMetallicRoughness"] == {"roughnessFactor": 0.5}
+    assert materials[0]["emissiveFactor"] == [0.25, 0.25, 0.25]
+    # Материал исходного (закэшированного) файла не изменяется.
+    assert source == _material("Fabric_1")
+    assert materials[1] == _material("Metal")
+
+
+def test_multiply_add_and_clamp_stay_in_range():
+    materials = [
+        _material("A", [0.5, 0.2, 0.8, 1.0]),
+        _material("B", [1.0, 1.0, 0.0, 0.5]),
+    ]
+
+    _apply(
+        materials,
+        MaterialOperation("*", "baseColorFactor", "multiply", [2.0, 1.0, 1.0, 1.0]),
+        MaterialOperation("*", "baseColorFactor", "add", -0.1),
+    )
+
+    assert _base_colors(materials) == pytest.approx(
+        [0.9, 0.1, 0.7, 0.9, 0.9, 0.9, 0.0, 0.4]
+    )
+
+    _apply(materials, MaterialOperation("*", "baseColorFactor", "clamp", [0.2, 0.8]))
+
+    assert _base_colors(materials) == pytest.approx(
+        [0.8, 0.2, 0.7, 0.8, 0.8, 0.8, 0.2, 0.4]
+    )
+
+
+def test_hsv_shift_keeps_alpha():
+    materials = [
+        _material("Red", [1.0, 0.0, 0.0, 0.5]),
+        _material("Gray", [0.5, 0.5, 0.5, 1.0]),
+    ]
+
+    _apply(
+        materials,
+        MaterialOperation("*", "baseColorFactor", "hsv_shift", [120.0, 0.0, 0.0]),
+    )
+
+    assert materials[0]["pbrMetallicRoughness"]["baseColorFactor"] == pytest.approx(
+        [0.0, 1.0, 0.0, 0.5]
+    )
+    # У серого нет тона - сдвиг тона его не меняет.
+    assert materials[1]["pbrMetallicRoughness"]["baseColorFactor"] == pytest.approx(
+        [0.5, 0.5, 0.5, 1.0]
+    )
+
+    _apply(
+        materials,
+        MaterialOperation("Red", "baseColorFactor", "hsv_shift", [0.0, -1.0, -0.5]),
+    )
+
+    assert materials[0]["pbrMetallicRoughness"]["baseColorFactor"] == pytest.approx(
+        [0.5, 0.5, 0.5, 0.5]
+    )
+
+
+def test_material_objects_get_pbr_metallic_roughness():
+    materials = [Material(name="Fabric", pbrMetallicRoughness=None)]
+
+    _apply(materials, MaterialOperation("*", "metallicFactor", "set", 0.3))
+
+    assert materials[0].pbrMetallicRoughness.metallicFactor == 0.3
+
+
+@pytest.mark.parametrize(
+    "material",
+    [
+        _material("Broken", [1.0, 1.0, 1.0]),
+        _material("Broken", ["red", 1.0, 1.0, 1.0]),
+        _material("Broken", emissiveFactor=[[0.0, 0.0, 0.0]]),
+    ],
+)
+def test_invalid_factor_in_file_is_unprocessable(material):
+    materials = [_material("Fine", [1.0, 1.0, 1.0, 1.0]), material]
+    factor = "emissiveFactor" if "emissiveFactor" in material else "baseColorFactor"
+
+    with pytest.raises(GLBEditorException) as error:
+        _apply(materials, MaterialOperation("*", factor, "multiply", 0.5))
+
+    assert error.value.status_code == 422
+    assert '"Broken"' in error.value.detail
+    assert materials[0] == _material("Fine", [1.0, 1.0, 1.0, 1.0])
@@ -0,0 +1,166 @@
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+from src.data import cache
+from src.data.cache import TexturePayloadCache, load_gltf, source_cache
+from src.data.glb import read_glb, read_gltf
+from src.data.repositories import GLBTexturesRepository
+from src.domain.entities import TexturesData, _SingleTextureChange
+
+
+@pytest.fixture
+def texture_filepaths(tmp_path) -> list:
+    filepaths = []
+    for number, color in enumerate([(200, 30, 30), (30, 30, 200)]):
+        filepath = str(tmp_path / f"texture_{number}.png")
+        Image.new("RGB", (16, 16), color).save(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def _change_textures(model_filepath, result_dir, texture_filepath):
+    request = TexturesData(
+        source_glbfilepath=model_filepath,
+        result_filepath=result_dir,
+        files=[
+            _SingleTextureChange(
+                texturefilepath=texture_filepath,
+                materials=[
+                    # Текстура без других ссылок, общая текстура и материал
+                    # без карты текстур.
+                    {"name": "Material_00000", "pbrMetallicRoughness": {
+                        "baseColorTexture": {}}},
+                    {"name": "Material_00001", "normalTexture": {}},
+                    {"name": "Material_00006", "normalTexture": {}},
+                ],
+            )
+        ],
+    )
+    return GLBTexturesRepository()._change_textures(request)
+
+
+def test_texture_edit_does_not_change_cached_source(
+    model_filepath, result_dir, texture_filepaths
+):
+    cached, _ = source_cache.get("gltf", model_filepath, read_gltf)
+    expected = read_gltf(model_filepath)[0].to_json()
+    assert load_gltf(model_filepath)[0] is not cached
+
+    results = [
+        _change_textures(model_filepath, result_dir, filepath)["result"]
+        for filepath in texture_filepaths
+    ]
+
+    assert source_cache.get("gltf", model_filepath, read_gltf)[0] is cached
+    assert cached.to_json() == expected
+    # Вторая правка того же файла начинается с исходного документа,
+    # а не с результата первой.
+    first, _ = read_glb(results[0])
+    second, _ = read_glb(results[1])
+    assert len(first["images"]) == len(second["images"])
+    assert len(first["textures"]) == len(second["textures"])
+
+
+def test_texture_payload_cache_hit_and_miss(texture_filepaths):
+    cache = TexturePayloadCache(1024 * 1024)
+    filepath = texture_filepaths[0]
+
+    payload = cache.load(filepath)
+    data_uri = cache.load_data_uri(filepath)
+
+    assert cache.load(filepath) is payload
+    assert cache.load_data_uri(filepath) is data_uri
+    assert payload.mime_type == "image/png"
+    with open(filepath, "rb") as texture_file:
+        assert payload.data == texture_file.read()
+    assert data_uri.startswith("data:image/png;base64,")
+    assert cache.stats()["misses"] == 1
+
+    # Измененный файл читается заново.
+    Image.new("RGB", (8, 8), (0, 200, 0)).save(filepath)
+    os.utime(filepath, ns=(1, 1))
+
+    assert cache.load(filepath).data != payload.data
+    assert cache.stats()["misses"] == 2
+
+
+def test_texture_payloads_with_same_content_are_shared(tmp_path, texture_filepaths):
+    copy_filepath = str(tmp_path / "copy.png")
+    with open(texture_filepaths[0], "rb") as texture_file:
+        data = texture_file.read()
+    with open(copy_filepath, "wb") as copy_file:
+        copy_file.write(data)
+    cache = TexturePayloadCache(1024 * 1024)
+
+    payload = cache.load(texture_filepaths[0])
+
+    assert cache.load(copy_filepath) is payload
+    assert cache.load(texture_filepaths[1]).digest != payload.digest
+
+
+def test_texture_payload_cache_evicts_least_recently_used(texture_filepaths):
+    sizes = [os.path.getsize(filepath) for filepath in texture_filepaths]
+    cache = TexturePayloadCache(max(sizes) + 1)
+
+    for filepath in texture_filepaths:
+        cache.load(filepath)
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size_bytes"] <= stats["max_bytes"]
+    # Последний файл остался в кэше.
+    cache.load(texture_filepaths[-1])
+    assert cache.stats()["hits"] == 1
+
+
+def test_prefetch_reads_textures_concurrently(texture_filepaths, monkeypatch):
+    monkeypatch.setattr(settings.textures, "prefetch_threads", 2)
+    # Чтение завершается, только когда оба файла читаются одновременно.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def read_file(filepath, read_file=cache._read_file):
+        barrier.wait()
+        return read_file(filepath)
+
+    monkeypatch.setattr(cache, "_read_file", read_file)
+    texture_cache = TexturePayloadCache(1024 * 1024)
+
+    texture_cache.prefetch(texture_filepaths * 2)
+    misses = texture_cache.stats()["misses"]
+    for filepath in texture_filepaths:
+        texture_cache.load(filepath)
+
+    assert texture_cache.stats()["misses"] == misses
+
+
+def test_prefetch_fails_before_reading(tmp_path, texture_filepaths, monkeypatch):
+    def read_file(filepath):
+        raise AssertionError("Файлы не должны читаться")
+
+    monkeypatch.setattr(cache, "_read_file", read_file)
+    missing = [str(tmp_path / "missing_0.png"), str(tmp_path / "missing_1.png")]
+
+    with pytest.raises(FileNotFoundError) as error:
+        TexturePayloadCache(1024 * 1024).prefetch([texture_filepaths[0], *missing])
+
+    assert error.value.args[0] == missing[0]
+
+
+def test_missing_texture_fails_before_parsing_model(tmp_path, result_dir):
+    # Исходный файл - не GLB: если бы он разбирался первым, ошибка была бы
+    # другой.
+    model_filepath = tmp_path / "broken.glb"
+    model_filepath.write_bytes(b"not a model")
+    missing = str(tmp_path / "missing.png")
+
+    with pytest.raises(GLBEditorException) as error:
+        _change_textures(str(model_filepath), result_dir, missing)
+
+    assert error.value.status_code == 400
+    assert missing in error.value.detail
@@ -0,0 +1,239 @@
+import struct
+
+import pytest
+from pygltflib import GLTF2
+
+from benchmarks.generate import make_png
+from src.data.compaction import compact
+from src.data.glb import BinChunk, gltf_to_document, read_gltf, write_glb
+
+FLOAT = 5126
+TRIANGLE = struct.pack("<9f", 0, 0, 0, 1, 0, 0, 0, 1, 0)
+
+
+class ModelBuilder:
+    """GLB-файл из bufferView, accessor, изображений, текстур и материалов."""
+
+    def __init__(self):
+        self.bin_chunk = BinChunk()
+        self.document = {
+            "asset": {"version": "2.0"},
+            "bufferViews": [],
+            "accessors": [],
+            "images": [],
+            "samplers": [{}],
+            "textures": [],
+            "materials": [],
+            "meshes": [],
+        }
+
+    def add_view(self, data: bytes) -> int:
+        offset = self.bin_chunk.append_bytes(data)
+        self.document["bufferViews"].append(
+            {"buffer": 0, "byteOffset": offset, "byteLength": len(data)}
+        )
+        return len(self.document["bufferViews"]) - 1
+
+    def add_accessor(self) -> int:
+        self.document["accessors"].append(
+            {
+                "bufferView": self.add_view(TRIANGLE),
+                "componentType": FLOAT,
+                "count": 3,
+                "type": "VEC3",
+            }
+        )
+        accessor_idx = len(self.document["accessors"]) - 1
+        self.document["meshes"].append(
+            {"primitives": [{"attributes": {"POSITION": accessor_idx}}]}
+        )
+        return accessor_idx
+
+    def add_image(self, data: bytes) -> int:
+        self.document["images"].append(
+            {"mimeType": "image/png", "bufferView": self.add_view(data)}
+        )
+        return len(self.document["images"]) - 1
+
+    def add_texture(self, image_idx: int) -> int:
+        self.document["textures"].append({"sampler": 0, "source": image_idx})
+        return len(self.document["textures"]) - 1
+
+    def add_material(self, name: str, **slots: int) -> None:
+        # slots: слот материала -> индекс текстуры.
+        material = {"name": name, "pbrMetallicRoughness": {}}
+        for slot, texture_idx in slots.items():
+            if slot in ("baseColorTexture", "metallicRoughnessTexture"):
+                material["pbrMetallicRoughness"][slot] = {"index": texture_idx}
+            else:
+                material[slot] = {"index": texture_idx}
+        self.document["materials"].append(material)
+
+    def write(self, filepath: str) -> str:
+        self.document["buffers"] = [{"byteLength": self.bin_chunk.length}]
+        write_glb(filepath, self.document, self.bin_chunk)
+        return filepath
+
+
+def _compact(source_filepath: str, result_filepath: str):
+    gltf, layout = read_gltf(source_filepath)
+    bytes_saved, bin_chunk = compact(
+        gltf, BinChunk.from_layout(layout), source_filepath
+    )
+    write_glb(result_filepath, gltf_to_document(gltf), bin_chunk, source_filepath)
+    return bytes_saved, GLTF2().load(result_filepath)
+
+
+def _view_data(gltf: GLTF2, view_idx: int) -> bytes:
+    view = gltf.bufferViews[view_idx]
+    offset = view.byteOffset or 0
+    return gltf.binary_blob()[offset:offset + view.byteLength]
+
+
+def _accessors_data(gltf: GLTF2) -> list:
+    return [_view_data(gltf, accessor.bufferView) for accessor in gltf.accessors]
+
+
+def _material_images(gltf: GLTF2) -> dict:
+    # Содержимое изображения в каждом слоте каждого материала.
+    images = {}
+    for material in gltf.materials:
+        slots = {
+            "baseColorTexture": material.pbrMetallicRoughness.baseColorTexture,
+            "normalTexture": material.normalTexture,
+            "occlusionTexture": material.occlusionTexture,
+            "emissiveTexture": material.emissiveTexture,
+        }
+        for slot, texture_info in slots.items():
+            if texture_info is None:
+                continue
+            texture = gltf.textures[texture_info.index]
+            image = gltf.images[texture.source]
+            images[material.name, slot] = _view_data(gltf, image.bufferView)
+    return images
+
+
+def _assert_content_unchanged(source: GLTF2, result: GLTF2) -> None:
+    assert _accessors_data(result) == _accessors_data(source)
+    assert _material_images(result) == _material_images(source)
+
+
+@pytest.fixture
+def images():
+    return [make_png(8, seed) for seed in range(3)]
+
+
+def test_duplicate_images_are_merged(tmp_path, images):
+    builder = ModelBuilder()
+    builder.add_accessor()
+    first = builder.add_texture(builder.add_image(images[0]))
+    second = builder.add_texture(builder.add_image(images[1]))
+    # То же содержимое, что и у первого изображения.
+    duplicate = builder.add_texture(builder.add_image(images[0]))
+    builder.add_accessor()
+    builder.add_material("first", baseColorTexture=first)
+    builder.add_material("second", baseColorTexture=second, normalTexture=duplicate)
+    source_filepath = builder.write(str(tmp_path / "source.glb"))
+    source = GLTF2().load(source_filepath)
+
+    bytes_saved, result = _compact(source_filepath, str(tmp_path / "result.glb"))
+
+    _assert_content_unchanged(source, result)
+    assert len(result.images) == 2
+    assert result.textures[duplicate].source == result.textures[first].source
+    # Текстуры не удаляются: на каждую ссылается материал.
+    assert [m.pbrMetallicRoughness.baseColorTexture.index for m in result.materials] == [
+        first, second,
+    ]
+    assert result.materials[1].normalTexture.index == duplicate
+    assert bytes_saved == len(source.binary_blob()) - len(result.binary_blob()) > 0
+
+
+def test_shared_textures_are_kept(tmp_path, images):
+    builder = ModelBuilder()
+    builder.add_accessor()
+    shared = builder.add_texture(builder.add_image(images[0]))
+    builder.add_texture(builder.add_image(images[1]))
+    last = builder.add_texture(builder.add_image(images[2]))
+    builder.add_material("first", baseColorTexture=shared)
+    builder.add_material("second", baseColorTexture=shared, emissiveTexture=last)
+    builder.add_material("third", occlusionTexture=shared)
+    source_filepath = builder.write(str(tmp_path / "source.glb"))
+    source = GLTF2().load(source_filepath)
+
+    _, result = _compact(source_filepath, str(tmp_path / "result.glb"))
+
+    _assert_content_unchanged(source, result)
+    assert len(result.textures) == 2 and len(result.images) == 2
+    assert images[1] not in (
+        _view_data(result, image.bufferView) for image in result.images
+    )
+    assert result.materials[0].pbrMetallicRoughness.baseColorTexture.index == shared
+    assert result.materials[2].occlusionTexture.index == shared
+    # Индекс текстуры после удаленной сдвигается.
+    assert result.materials[1].emissiveTexture.index == last - 1
+
+
+def test_unreferenced_buffer_view_is_removed(tmp_path, images):
+    builder = ModelBuilder()
+    builder.add_accessor()
+    builder.add_view(b"\x01" * 1000)
+    builder.add_accessor()
+    builder.add_material(
+        "material", baseColorTexture=builder.add_texture(builder.add_image(images[0]))
+    )
+    source_filepath = builder.write(str(tmp_path / "source.glb"))
+    source = GLTF2().load(source_filepath)
+
+    bytes_saved, result = _compact(source_filepath, str(tmp_path / "result.glb"))
+
+    _assert_content_unchanged(source, result)
+    assert len(result.bufferViews) == len(source.bufferViews) - 1
+    assert bytes_saved == len(source.binary_blob()) - len(result.binary_blob())
+    assert 1000 <= bytes_saved < 1004
+
+
+def test_generated_model_filler_is_removed_when_unreferenced(tmp_path, model_filepath):
+    # Заполнитель BIN-чанка benchmarks.generate - данные accessor. Пока
+    # на accessor есть ссылка, сжатие bufferView не удаляет.
+    source = GLTF2().load(model_filepath)
+    bytes_saved, result = _compact(model_filepath, str(tmp_path / "kept.glb"))
+    assert bytes_saved == 0
+    assert len(result.bufferViews) == len(source.bufferViews)
+    _assert_content_unchanged(source, result)
+    assert [m.pbrMetallicRoughness.baseColorTexture for m in result.materials] == [
+        m.pbrMetallicRoughness.baseColorTexture for m in source.materials
+    ]
+
+    filler = source.accessors.pop()
+    source.save(str(tmp_path / "unreferenced.glb"))
+    bytes_saved, result = _compact(
+        str(tmp_path / "unreferenced.glb"), str(tmp_path / "result.glb")
+    )
+    filler_length = source.bufferViews[filler.bufferView].byteLength
+    assert len(result.bufferViews) == len(source.bufferViews) - 1
+    assert bytes_saved >= filler_length
+    assert len(result.binary_blob()) <= len(source.binary_blob()) - filler_length
+    _assert_content_unchanged(source, result)
+
+
+def test_unknown_extension_is_not_compacted(tmp_path, images):
+    builder = ModelBuilder()
+    builder.add_accessor()
+    builder.add_view(b"\x01" * 1000)
+    builder.add_texture(builder.add_image(images[0]))
+    builder.add_texture(builder.add_image(images[0]))
+    builder.document["extensionsUsed"] = ["VENDOR_unknown"]
+    builder.document["materials"].append(
+        {"name": "material", "extensions": {"VENDOR_unknown": {"texture": 1}}}
+    )
+    source_filepath = builder.write(str(tmp_path / "source.glb"))
+    gltf, layout = read_gltf(source_filepath)
+    document = gltf_to_document(gltf)
+    bin_chunk = BinChunk.from_layout(layout)
+
+    bytes_saved, new_chunk = compact(gltf, bin_chunk, source_filepath)
+
+    assert bytes_saved == 0
+    assert new_chunk is bin_chunk
+    assert gltf_to_document(gltf) == document
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src import app
+from src.data import repositories
+from src.data.glb import read_glb
+from src.data.repositories import GLBEditRepository
+from src.domain.entities import EditData, _SingleTextureChange
+
+MATERIALS = [{"name": "Material_00006", "doubleSided": True}]
+
+
+@pytest.fixture
+def texture_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(filepath)
+    return filepath
+
+
+def _files(texture_filepath: str) -> list:
+    return [
+        {
+            "texturefilepath": texture_filepath,
+            "materials": [{"name": "Material_00006", "normalTexture": {}}],
+        }
+    ]
+
+
+def test_edit_writes_one_file(model_filepath, result_dir, texture_filepath):
+    with TestClient(app) as client:
+        response = client.post(
+            "/glbeditor/edit",
+            json={
+                "source_filepath": model_filepath,
+                "result_filepath": result_dir,
+                "materials": MATERIALS,
+                "files": _files(texture_filepath),
+            },
+        )
+
+    assert response.status_code == 201
+    result_filepath = response.json()["result"]
+    document, _ = read_glb(result_filepath)
+    material = document["materials"][6]
+    assert material["doubleSided"] is True
+    assert "normalTexture" in material
+    assert [
+        name for name in os.listdir(result_dir) if not name.startswith(".")
+    ] == [os.path.basename(result_filepath)]
+
+
+def test_edit_loads_model_once(
+    model_filepath, result_dir, texture_filepath, monkeypatch
+):
+    loads = []
+
+    def load_gltf(filepath, load_gltf=repositories.load_gltf):
+        loads.append(filepath)
+        return load_gltf(filepath)
+
+    monkeypatch.setattr(repositories, "load_gltf", load_gltf)
+    monkeypatch.setattr(repositories, "load_document", None)
+    monkeypatch.setattr(repositories, "_load_gltf_fully", None)
+
+    GLBEditRepository()._edit(
+        EditData(
+            source_filepath=model_filepath,
+            result_filepath=result_dir,
+            materials=MATERIALS,
+            files=[
+                _SingleTextureChange(**change) for change in _files(texture_filepath)
+            ],
+        )
+    )
+
+    assert loads == [model_filepath]
+
+
+def test_edit_validation_error(model_filepath, result_dir):
+    with TestClient(app) as client:
+        response = client.post(
+            "/glbeditor/edit",
+            json={"source_filepath": model_filepath, "files": [{"materials": []}]},
+        )
+
+    assert response.status_code == 422
@@ -0,0 +1,99 @@
+import base64
+
+import pytest
+from PIL import Image
+
+from src.core.settings import settings
+from src.data.glb import read_glb
+from src.data.repositories import GLBTexturesRepository
+from src.domain.entities import TexturesData, _SingleTextureChange
+
+
+@pytest.fixture
+def texture_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(filepath)
+    return filepath
+
+
+def _change_texture(model_filepath, result_dir, texture_filepath) -> str:
+    response = GLBTexturesRepository()._change_textures(
+        TexturesData(
+            source_glbfilepath=model_filepath,
+            result_filepath=result_dir,
+            files=[
+                _SingleTextureChange(
+                    texturefilepath=texture_filepath,
+                    materials=[
+                        {"name": "Material_00000", "pbrMetallicRoughness": {
+                            "baseColorTexture": {}}},
+                    ],
+                )
+            ],
+        )
+    )
+    return response["result"]
+
+
+def _read_images(filepath: str) -> dict:
+    # Изображения файла по имени (новое изображение - без имени).
+    document, layout = read_glb(filepath)
+    with open(filepath, "rb") as glb_file:
+        glb_file.seek(layout.bin_offset)
+        bin_data = glb_file.read(layout.bin_length)
+    images = {}
+    for image in document["images"]:
+        if "bufferView" in image:
+            buffer_view = document["bufferViews"][image["bufferView"]]
+            assert buffer_view.get("byteOffset", 0) % 4 == 0
+            offset = buffer_view.get("byteOffset", 0)
+            data = bin_data[offset:offset + buffer_view["byteLength"]]
+        else:
+            data = image["uri"]
+        images[image.get("name")] = (image.get("mimeType"), data)
+    return document, images
+
+
+def _get_base_color_image(document: dict) -> dict:
+    material = document["materials"][0]
+    texture = document["textures"][
+        material["pbrMetallicRoughness"]["baseColorTexture"]["index"]
+    ]
+    return document["images"][texture["source"]]
+
+
+def test_new_texture_is_appended_to_bin_chunk(
+    model_filepath, result_dir, texture_filepath, monkeypatch
+):
+    monkeypatch.setattr(settings.glb, "textures_embedding", "bufferview")
+
+    result_filepath = _change_texture(model_filepath, result_dir, texture_filepath)
+
+    _, source_images = _read_images(model_filepath)
+    document, images = _read_images(result_filepath)
+    image = _get_base_color_image(document)
+    assert "uri" not in image
+    assert image["mimeType"] == "image/png"
+    with open(texture_filepath, "rb") as texture_file:
+        assert images[image.get("name")] == ("image/png", texture_file.read())
+    # Изображения исходного файла не перекодируются.
+    for name, source_image in source_images.items():
+        assert images[name] == source_image
+
+
+# pygltflib.convert_images предупреждает о каждом изображении, bufferView
+# которого удаляет.
+@pytest.mark.filterwarnings("ignore:Removing bufferView")
+def test_new_texture_as_data_uri(
+    model_filepath, result_dir, texture_filepath, monkeypatch
+):
+    monkeypatch.setattr(settings.glb, "textures_embedding", "datauri")
+
+    result_filepath = _change_texture(model_filepath, result_dir, texture_filepath)
+
+    document, _ = _read_images(result_filepath)
+    image = _get_base_color_image(document)
+    with open(texture_filepath, "rb") as texture_file:
+        assert image["uri"] == "data:image/png;base64," + base64.b64encode(
+            texture_file.read()
+        ).decode()
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.core import executor
+from src.core.exceptions import GLBEditorException
+from src.core.executor import get_workers_stats, run_in_pool, shutdown_executor
+from src.core.settings import settings
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    monkeypatch.setattr(settings.pool, "workers", 1)
+    yield
+    shutdown_executor()
+
+
+def test_task_runs_in_pool_process():
+    pid = asyncio.run(run_in_pool(os.getpid))
+
+    assert pid != os.getpid()
+    assert executor.get_executor()._max_workers == 1
+    assert get_workers_stats()["workers"] == 1
+
+
+def test_event_loop_is_not_blocked():
+    async def scenario() -> int:
+        ticks = 0
+        task = asyncio.ensure_future(run_in_pool(time.sleep, 0.3))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        await task
+        return ticks
+
+    assert asyncio.run(scenario()) > 5
+
+
+def test_broken_pool_is_recreated():
+    with pytest.raises(GLBEditorException) as error:
+        asyncio.run(run_in_pool(os._exit, 1))
+
+    assert error.value.status_code == 500
+    assert asyncio.run(run_in_pool(abs, -1)) == 1
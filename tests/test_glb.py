@@ -0,0 +1,197 @@
+import os
+import struct
+
+import pytest
+from pygltflib import GLTF2
+
+from src.core.exceptions import GLBEditorException
+from src.data import glb
+from src.data.glb import (CHUNK_HEADER, GLB_HEADER, BinChunk, iter_glb,
+                          read_glb, read_glb_file, write_glb)
+
+# Новые данные нечетной длины - итоговый BIN-чанк нужно выравнивать.
+NEW_DATA = (b"abc", b"new-data!")
+
+
+def _fail(*args):
+    raise OSError("not supported")
+
+
+@pytest.fixture(params=["copy_file_range", "sendfile", "chunked"])
+def copy_calls(request, monkeypatch):
+    # Каждый способ копирования диапазонов исходного файла: ядро не умеет
+    # copy_file_range - sendfile, не умеет ни того, ни другого - блоками
+    # через память (блок меньше BIN-чанка, чтобы блоков было несколько).
+    # Ядро копирует не больше 1000 байт за вызов, как и блоки через память.
+    calls = {"copy_file_range": 0, "sendfile": 0, "chunked": 0}
+
+    def limit(name, kernel_copy):
+        def copy(source_fd, result_fd, offset, count):
+            calls[name] += 1
+            return kernel_copy(source_fd, result_fd, offset, min(count, 1000))
+        return copy
+
+    def pread(fd, count, offset, pread=os.pread):
+        calls["chunked"] += 1
+        return pread(fd, count, offset)
+
+    monkeypatch.setattr(
+        glb, "_copy_file_range", limit("copy_file_range", glb._copy_file_range)
+    )
+    monkeypatch.setattr(glb, "_sendfile", limit("sendfile", glb._sendfile))
+    monkeypatch.setattr(glb, "_COPY_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(glb.os, "pread", pread)
+    if request.param in ("sendfile", "chunked"):
+        monkeypatch.setattr(glb, "_copy_file_range", _fail)
+    if request.param == "chunked":
+        monkeypatch.setattr(glb, "_sendfile", _fail)
+    yield request.param, calls
+
+
+def _parse_chunks(data: bytes) -> list:
+    magic, version, length = GLB_HEADER.unpack_from(data)
+    assert (magic, version, length) == (b"glTF", 2, len(data))
+    chunks = []
+    offset = GLB_HEADER.size
+    while offset < len(data):
+        chunk_length, chunk_type = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        assert chunk_length % 4 == 0
+        chunks.append((chunk_type, data[offset:offset + chunk_length]))
+        offset += chunk_length
+    assert offset == len(data)
+    return chunks
+
+
+def _splice(model_filepath):
+    # Исходный BIN-чанк целиком, затем новые данные, как при добавлении
+    # изображений текстур.
+    document, layout = read_glb(model_filepath)
+    bin_chunk = BinChunk.from_layout(layout)
+    offsets = []
+    for data in NEW_DATA:
+        offsets.append(bin_chunk.append_bytes(data))
+        document["bufferViews"].append(
+            {"buffer": 0, "byteOffset": offsets[-1], "byteLength": len(data)}
+        )
+    document["buffers"][0]["byteLength"] = bin_chunk.length
+    return document, bin_chunk, offsets
+
+
+def test_write_glb_round_trip(model_filepath, tmp_path, copy_calls):
+    copy_path, calls = copy_calls
+    source = GLTF2().load(model_filepath)
+    source_blob = source.binary_blob()
+    document, bin_chunk, offsets = _splice(model_filepath)
+    result_filepath = str(tmp_path / "result.glb")
+
+    write_glb(result_filepath, document, bin_chunk, model_filepath)
+
+    assert calls[copy_path] >= len(source_blob) // 1000
+    with open(result_filepath, "rb") as result_file:
+        data = result_file.read()
+    (json_type, json_data), (bin_type, bin_data) = _parse_chunks(data)
+    assert (json_type, bin_type) == (b"JSON", b"BIN\x00")
+    assert json_data.rstrip(b" ").endswith(b"}")
+    assert bin_data[:len(source_blob)] == source_blob
+    # Новые данные выровнены по 4 байта, промежутки и конец чанка - нули.
+    expected = bytearray(source_blob)
+    for offset, new_data in zip(offsets, NEW_DATA):
+        assert offset % 4 == 0
+        expected += b"\x00" * (offset - len(expected)) + new_data
+    expected += b"\x00" * (-len(expected) % 4)
+    assert bin_data == expected
+
+    result = GLTF2().load(result_filepath)
+    assert result.binary_blob() == bin_data
+    assert result.buffers[0].byteLength == bin_chunk.length
+    for view, new_data in zip(result.bufferViews[-len(NEW_DATA):], NEW_DATA):
+        blob = result.binary_blob()
+        assert blob[view.byteOffset:view.byteOffset + view.byteLength] == new_data
+    # Данные исходных accessors не сдвинулись.
+    for source_view, result_view in zip(source.bufferViews, result.bufferViews):
+        assert result_view.byteOffset == source_view.byteOffset
+        assert result_view.byteLength == source_view.byteLength
+
+
+def test_iter_glb_matches_write_glb(model_filepath, tmp_path):
+    document, bin_chunk, _ = _splice(model_filepath)
+    result_filepath = str(tmp_path / "result.glb")
+    write_glb(result_filepath, document, bin_chunk, model_filepath)
+
+    with open(model_filepath, "rb") as source_file:
+        length, blocks = iter_glb(document, bin_chunk, source_file)
+        data = b"".join(blocks)
+    with open(result_filepath, "rb") as result_file:
+        assert data == result_file.read()
+    assert length == len(data)
+
+
+def test_bin_chunk_slices(model_filepath):
+    document, layout = read_glb(model_filepath)
+    source_blob = GLTF2().load(model_filepath).binary_blob()
+    bin_chunk = BinChunk.from_layout(layout)
+    offset = bin_chunk.append_bytes(NEW_DATA[1])
+
+    # Соседние диапазоны исходного файла объединяются в один.
+    copy = BinChunk()
+    copy.append_slice(bin_chunk, 0, 100)
+    copy.append_slice(bin_chunk, 100, layout.bin_length - 100)
+    assert copy.segments == [(layout.bin_offset, layout.bin_length)]
+
+    data = bin_chunk.read(offset - 8, len(NEW_DATA[1]) + 8, model_filepath)
+    assert data == source_blob[offset - 8:offset] + NEW_DATA[1]
+
+
+def test_write_glb_without_bin_chunk(tmp_path):
+    result_filepath = str(tmp_path / "result.glb")
+    write_glb(result_filepath, {"asset": {"version": "2.0"}}, BinChunk())
+    with open(result_filepath, "rb") as result_file:
+        chunks = _parse_chunks(result_file.read())
+    assert [chunk_type for chunk_type, _ in chunks] == [b"JSON"]
+    assert GLTF2().load(result_filepath).asset.version == "2.0"
+
+
+def test_read_glb_file_matches_read_glb(model_filepath):
+    document, layout = read_glb(model_filepath)
+    with open(model_filepath, "rb") as model_file:
+        assert read_glb_file(model_file, "model.glb") == (document, layout)
+
+
+def test_json_chunk_padded_with_zeros(tmp_path):
+    # Некоторые экспортеры дополняют JSON-чанк нулями, а не пробелами.
+    json_data = b'{"asset":{"version":"2.0"}}'
+    json_data += b"\x00" * (-len(json_data) % 4)
+    filepath = str(tmp_path / "zeros.glb")
+    with open(filepath, "wb") as model_file:
+        model_file.write(
+            GLB_HEADER.pack(b"glTF", 2, 20 + len(json_data))
+            + CHUNK_HEADER.pack(len(json_data), b"JSON")
+            + json_data
+        )
+    document, layout = read_glb(filepath)
+    assert document == {"asset": {"version": "2.0"}}
+    assert layout.bin_offset is None and layout.bin_length == 0
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"glTF",
+        struct.pack("<4sII", b"gltf", 2, 20) + CHUNK_HEADER.pack(0, b"JSON"),
+        # Чанк длиннее файла.
+        struct.pack("<4sII", b"glTF", 2, 28)
+        + CHUNK_HEADER.pack(64, b"JSON") + b"{}      ",
+        # Нет JSON-чанка.
+        struct.pack("<4sII", b"glTF", 2, 28)
+        + CHUNK_HEADER.pack(8, b"BIN\x00") + b"\x00" * 8,
+    ],
+    ids=["short", "magic", "truncated", "no-json"],
+)
+def test_invalid_glb(tmp_path, data):
+    filepath = str(tmp_path / "invalid.glb")
+    with open(filepath, "wb") as model_file:
+        model_file.write(data)
+    with pytest.raises(GLBEditorException) as error:
+        read_glb(filepath)
+    assert error.value.status_code == 422
@@ -0,0 +1,14 @@
+from src.data.helpers import is_source_pattern
+
+
+def test_existing_file_with_magic_characters_is_not_pattern(tmp_path):
+    filepath = tmp_path / "model[1].glb"
+    filepath.write_bytes(b"glTF")
+    assert not is_source_pattern(str(filepath))
+
+
+def test_directory_and_glob_are_patterns(tmp_path):
+    assert is_source_pattern(str(tmp_path))
+    assert is_source_pattern(str(tmp_path / "*.glb"))
+    assert is_source_pattern(str(tmp_path / "missing[1].glb"))
+    assert not is_source_pattern(str(tmp_path / "missing.glb"))
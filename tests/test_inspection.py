@@ -0,0 +1,73 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app
+from src.data import repositories
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def _inspect(client, path: str, **headers):
+    return client.get("/glbeditor/inspect", params={"path": path}, headers=headers)
+
+
+def test_inspect_glb(client, model_filepath, monkeypatch):
+    async def run_in_pool(*args, **kwargs):
+        raise AssertionError("Сводка не должна выполняться в пуле процессов")
+
+    monkeypatch.setattr(repositories, "run_in_pool", run_in_pool)
+
+    response = _inspect(client, model_filepath)
+
+    assert response.status_code == 200
+    summary = response.json()
+    assert len(summary["materials"]) == 8
+    assert summary["materials"][0]["textures"] == [
+        {"slot": "pbrMetallicRoughness.baseColorTexture", "texture": 0, "texCoord": 0}
+    ]
+    assert [texture["source"] for texture in summary["textures"]] == [
+        0, 1, 2, 3, 0, 1,
+    ]
+    assert {image["storage"] for image in summary["images"]} == {"bufferView"}
+    geometry = summary["geometry"]
+    assert geometry["meshes"] == geometry["primitives"] == 4
+    assert geometry["triangles"] == 4
+    assert geometry["binBytes"] >= 4096
+
+    # Неизмененный файл - 304 без тела.
+    etag = response.headers["ETag"]
+    cached = _inspect(client, model_filepath, **{"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_inspect_missing_file(client, tmp_path):
+    assert _inspect(client, str(tmp_path / "missing.glb")).status_code == 404
+
+
+@pytest.mark.parametrize(
+    "primitive",
+    [{"attributes": {"POSITION": 5}}, {"attributes": {"POSITION": 0}, "indices": 1}],
+)
+def test_inspect_invalid_accessor_index(client, tmp_path, primitive):
+    filepath = tmp_path / "broken.gltf"
+    filepath.write_text(
+        json.dumps(
+            {
+                "asset": {"version": "2.0"},
+                "accessors": [{"componentType": 5126, "count": 3, "type": "VEC3"}],
+                "meshes": [{"primitives": [primitive]}],
+            }
+        )
+    )
+
+    response = _inspect(client, str(filepath))
+
+    assert response.status_code == 422
+    assert "broken.gltf" in response.json()["detail"]
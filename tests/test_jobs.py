@@ -0,0 +1,114 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import orjson
+import pytest
+
+from src.core.jobs import (DONE, FAILED, INTERRUPTED_ERROR, QUEUED, RUNNING,
+                           Job, JobManager)
+from src.core.settings import settings
+
+TTL = 100
+
+
+@pytest.fixture
+def jobs_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.jobs, "directory", str(tmp_path))
+    monkeypatch.setattr(settings.jobs, "result_ttl", TTL)
+    return tmp_path
+
+
+def _write_job(
+    directory, name: str, status: str, age: float, finished_age=None, pid=None
+):
+    # age - сколько секунд назад задание создано и его файл изменен,
+    # finished_age - сколько секунд назад задание завершено.
+    now = time.time()
+    job = Job(id=name, kind="textures", status=status, created_at=now - age, pid=pid)
+    if finished_age is not None:
+        job.started_at = job.created_at
+        job.finished_at = now - finished_age
+    filepath = directory / f"{name}.json"
+    filepath.write_bytes(orjson.dumps(job.to_dict()))
+    os.utime(filepath, (now - age, now - age))
+
+
+def test_cleanup_removes_only_expired_finished_jobs(jobs_directory):
+    _write_job(jobs_directory, "done", DONE, 3 * TTL, 2 * TTL)
+    _write_job(jobs_directory, "failed", FAILED, 3 * TTL, 2 * TTL)
+    # Файл давно не изменялся, но задание завершилось недавно.
+    _write_job(jobs_directory, "done-recently", DONE, 3 * TTL, TTL / 2)
+    _write_job(jobs_directory, "queued", QUEUED, 3 * TTL)
+    _write_job(jobs_directory, "running", RUNNING, 3 * TTL)
+    _write_job(jobs_directory, "done-fresh", DONE, 1, 1)
+    stale_temp = jobs_directory / "lost.json.123.tmp"
+    stale_temp.write_bytes(b"{")
+    os.utime(stale_temp, (time.time() - 2 * TTL,) * 2)
+
+    JobManager()._cleanup()
+
+    assert sorted(os.listdir(jobs_directory)) == [
+        "done-fresh.json", "done-recently.json", "queued.json", "running.json",
+    ]
+
+
+def _read_job(directory, name: str) -> dict:
+    return orjson.loads((directory / f"{name}.json").read_bytes())
+
+
+def _get_dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def test_recover_fails_jobs_of_dead_workers(jobs_directory):
+    dead_pid = _get_dead_pid()
+    _write_job(jobs_directory, "queued-dead", QUEUED, 1, pid=dead_pid)
+    _write_job(jobs_directory, "running-dead", RUNNING, 1, pid=dead_pid)
+    # Задание другого, работающего воркера.
+    _write_job(jobs_directory, "running-alive", RUNNING, 1, pid=os.getppid())
+    _write_job(jobs_directory, "done-dead", DONE, 1, 1, pid=dead_pid)
+
+    JobManager().recover()
+
+    for name in ("queued-dead", "running-dead"):
+        job = _read_job(jobs_directory, name)
+        assert job["status"] == FAILED
+        assert job["status_code"] == 503
+        assert job["error"] == INTERRUPTED_ERROR
+        assert job["finished_at"] is not None
+    assert _read_job(jobs_directory, "running-alive")["status"] == RUNNING
+    assert _read_job(jobs_directory, "done-dead")["error"] is None
+
+
+def test_shutdown_fails_running_and_queued_jobs(jobs_directory, monkeypatch):
+    monkeypatch.setattr(settings.jobs, "concurrency", 1)
+    monkeypatch.setattr(settings.jobs, "queue_size", 4)
+
+    async def scenario():
+        manager = JobManager()
+        started = asyncio.Event()
+
+        async def run():
+            started.set()
+            await asyncio.sleep(60)
+
+        running = manager.submit("textures", run)
+        queued = manager.submit("textures", run)
+        await started.wait()
+        await manager.shutdown()
+        return running, queued
+
+    running, queued = asyncio.run(scenario())
+
+    for job in (running, queued):
+        state = _read_job(jobs_directory, job.id)
+        assert state["status"] == FAILED
+        assert state["status_code"] == 503
+        assert state["error"] == INTERRUPTED_ERROR
+    assert _read_job(jobs_directory, running.id)["started_at"] is not None
+    assert _read_job(jobs_directory, queued.id)["started_at"] is None
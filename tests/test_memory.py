@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import threading
+
+from src.core.settings import settings
+from src.data import repositories
+from src.data.memory import (BASE_BYTES, DATA_URI_FACTOR, JSON_FACTOR,
+                             _get_chunk_sizes, estimate_textures)
+from src.data.repositories import GLBParamsRepository
+from src.domain.entities import PropertiesData
+
+BUFFER_BYTES = 1000
+IMAGE_BYTES = 300
+
+
+def _write_gltf(directory) -> str:
+    # Внешние буфер и изображение (имя с пробелом) и буфер в DataURI,
+    # который уже входит в размер JSON-документа.
+    (directory / "scene.bin").write_bytes(b"\0" * BUFFER_BYTES)
+    (directory / "img 0.png").write_bytes(b"\0" * IMAGE_BYTES)
+    document = {
+        "asset": {"version": "2.0"},
+        "buffers": [
+            {"uri": "scene.bin", "byteLength": BUFFER_BYTES},
+            {"uri": "data:application/octet-stream;base64,AAAA", "byteLength": 3},
+        ],
+        "images": [{"uri": "img%200.png"}, {"uri": "missing.png"}],
+    }
+    filepath = directory / "scene.gltf"
+    filepath.write_text(json.dumps(document))
+    return str(filepath)
+
+
+def test_gltf_chunk_sizes_include_external_resources(tmp_path):
+    filepath = _write_gltf(tmp_path)
+
+    assert _get_chunk_sizes(filepath) == (
+        os.path.getsize(filepath), BUFFER_BYTES + IMAGE_BYTES
+    )
+
+
+def test_gltf_chunk_sizes_of_invalid_document(tmp_path):
+    filepath = tmp_path / "broken.gltf"
+    filepath.write_text("{")
+
+    assert _get_chunk_sizes(str(filepath)) == (1, 0)
+
+
+def test_embedding_estimate_counts_external_resources(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.glb, "gltf_resources", "embed")
+    filepath = _write_gltf(tmp_path)
+
+    assert estimate_textures(filepath, [], None) == (
+        BASE_BYTES
+        + JSON_FACTOR * os.path.getsize(filepath)
+        + DATA_URI_FACTOR * (BUFFER_BYTES + IMAGE_BYTES)
+    )
+
+
+def test_estimate_runs_outside_event_loop(model_filepath, result_dir, monkeypatch):
+    threads = []
+
+    def estimate(request_data_object):
+        threads.append(threading.get_ident())
+        return 0
+
+    async def run_in_pool(func, *args, memory_bytes):
+        return {"memory_bytes": memory_bytes}
+
+    monkeypatch.setattr(repositories, "estimate_parameters", estimate)
+    monkeypatch.setattr(repositories, "run_in_pool", run_in_pool)
+    request = PropertiesData(
+        source_filepath=model_filepath, result_filepath=result_dir, materials=[]
+    )
+
+    response = asyncio.run(GLBParamsRepository().change_parameters(request))
+
+    assert response == {"memory_bytes": 0}
+    assert threads and threads[0] != threading.get_ident()
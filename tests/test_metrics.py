@@ -0,0 +1,96 @@
+import contextvars
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app
+from src.core import metrics
+from src.core.metrics import Histogram, MetricsRecord
+from src.core.settings import settings
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings.metrics, "enabled", True)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_record_merge():
+    record = MetricsRecord()
+    record.add_stage("load", 0.5)
+    record.add_value("bytes_read", 100)
+    record.add_value("peak_rss_bytes", 300)
+    other = MetricsRecord(
+        stages={"load": 0.25, "save": 1.0},
+        values={"bytes_read": 50, "peak_rss_bytes": 200},
+        replayed_stages={"edit": 2.0},
+    )
+
+    record.merge(other)
+
+    assert record.stages == {"load": 0.75, "save": 1.0}
+    # Пиковая память не суммируется.
+    assert record.values == {"bytes_read": 150, "peak_rss_bytes": 300}
+    assert record.replayed_stages == {"edit": 2.0}
+    assert metrics.format_server_timing(record, 2.0) == (
+        "load;dur=750.0, save;dur=1000.0, edit;desc=replay;dur=2000.0, "
+        "total;dur=2000.0"
+    )
+
+
+def test_stages_are_recorded_in_current_context():
+    def run() -> MetricsRecord:
+        record = metrics.start_record()
+        with metrics.stage("edit"):
+            metrics.add_value("materials_changed", 2)
+        return record
+
+    record = contextvars.copy_context().run(run)
+
+    assert set(record.stages) == {"edit"}
+    assert record.values == {"materials_changed": 2}
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Тест.", (0.1, 1))
+    histogram.observe("a", 0.05)
+    histogram.observe("a", 0.5)
+    histogram.observe("a", 5)
+
+    assert histogram.render("stage").splitlines() == [
+        "# HELP test_seconds Тест.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1.0"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 5.55',
+        'test_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_edit_reports_stages(client, model_filepath, result_dir):
+    response = client.post(
+        "/glbeditor/parameters",
+        json={
+            "source_filepath": model_filepath,
+            "result_filepath": result_dir,
+            "materials": [{"name": "Material_00000", "doubleSided": True}],
+        },
+    )
+
+    assert response.status_code == 201
+    stages = dict(
+        re.fullmatch(r"([\w-]+)(?:;desc=\w+)?;dur=([\d.]+)", timing.strip()).groups()
+        for timing in response.headers["Server-Timing"].split(",")
+    )
+    assert {"pool", "load", "edit", "save", "total"} <= set(stages)
+
+    exported = client.get("/glbeditor/metrics")
+    assert exported.headers["content-type"].startswith("text/plain")
+    text = exported.text
+    endpoint = '{endpoint="/glbeditor/parameters"}'
+    assert f"glbeditor_request_duration_seconds_count{endpoint}" in text
+    assert f"glbeditor_materials_changed_count{endpoint}" in text
+    assert 'glbeditor_stage_duration_seconds_count{stage="save"}' in text
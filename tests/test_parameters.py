@@ -0,0 +1,123 @@
+import pytest
+from pygltflib import Material, PbrMetallicRoughness
+
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+from src.data.glb import read_glb
+from src.data.repositories import GLBParamsRepository
+from src.domain.entities import PropertiesData
+
+CHANGES = {
+    "pbrMetallicRoughness": {"baseColorFactor": [0.5, 0.25], "roughnessFactor": 1},
+    "emissiveFactor": [1.0, 0.0, 0.0],
+    "extras": {"tag": "red"},
+}
+
+
+def _document_material() -> dict:
+    return {
+        "name": "Fabric",
+        "pbrMetallicRoughness": {
+            "baseColorFactor": [1.0, 1.0, 1.0, 1.0],
+            "metallicFactor": 0.0,
+            "roughnessFactor": 0.5,
+        },
+    }
+
+
+def test_unite_json_material():
+    material = _document_material()
+
+    GLBParamsRepository._unite_object(material, CHANGES, Material)
+
+    assert material == {
+        "name": "Fabric",
+        "pbrMetallicRoughness": {
+            # Заменяются первые элементы списка, остальные сохраняются.
+            "baseColorFactor": [0.5, 0.25, 1.0, 1.0],
+            "metallicFactor": 0.0,
+            "roughnessFactor": 1,
+        },
+        "emissiveFactor": [1.0, 0.0, 0.0],
+        "extras": {"tag": "red"},
+    }
+
+
+def test_unite_material_object():
+    material = Material(
+        name="Fabric",
+        pbrMetallicRoughness=None,
+        extras={"keep": True},
+    )
+
+    GLBParamsRepository._unite_object(material, CHANGES)
+
+    assert isinstance(material.pbrMetallicRoughness, PbrMetallicRoughness)
+    assert material.pbrMetallicRoughness.baseColorFactor == [0.5, 0.25]
+    assert material.pbrMetallicRoughness.roughnessFactor == 1
+    assert material.emissiveFactor == [1.0, 0.0, 0.0]
+    assert material.extras == {"keep": True, "tag": "red"}
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"pbrMetallicRoughness": {"metallicFactor": "shiny"}},
+        {"pbrMetallicRoughness": {"glossiness": 1.0}},
+        {"pbrMetallicRoughness": 1.0},
+    ],
+)
+def test_invalid_changes_are_unprocessable(changes):
+    with pytest.raises(GLBEditorException) as error:
+        GLBParamsRepository._unite_object(_document_material(), changes, Material)
+
+    assert error.value.status_code == 422
+
+
+def test_changes_are_applied_to_copies():
+    source = [_document_material(), {**_document_material(), "name": "Metal"}]
+    materials = list(source)
+
+    changed = GLBParamsRepository._apply_material_changes(
+        materials,
+        [{"name": "Metal", **CHANGES}, {"name": "Metal", "doubleSided": True}],
+    )
+
+    assert changed == 1
+    assert materials[0] is source[0]
+    assert materials[1]["emissiveFactor"] == [1.0, 0.0, 0.0]
+    # Из нескольких изменений одного материала применяется первое.
+    assert "doubleSided" not in materials[1]
+    assert source[1] == {**_document_material(), "name": "Metal"}
+
+
+@pytest.mark.parametrize("zero_copy", [True, False])
+def test_edit_keeps_binary_data(model_filepath, result_dir, monkeypatch, zero_copy):
+    monkeypatch.setattr(settings.glb, "zero_copy", zero_copy)
+
+    response = GLBParamsRepository()._change_parameters(
+        PropertiesData(
+            source_filepath=model_filepath,
+            result_filepath=result_dir,
+            materials=[{"name": "Material_00001", **CHANGES}],
+        )
+    )
+
+    source_document, source_layout = read_glb(model_filepath)
+    document, layout = read_glb(response["result"])
+    assert document["materials"][1]["emissiveFactor"] == [1.0, 0.0, 0.0]
+    assert document["materials"][1]["pbrMetallicRoughness"]["baseColorFactor"] == [
+        0.5, 0.25, 1.0, 1.0,
+    ]
+    # Остальные материалы не изменяются.
+    assert document["materials"][0].get("emissiveFactor", [0, 0, 0]) == [0, 0, 0]
+    source_pbr = source_document["materials"][0]["pbrMetallicRoughness"]
+    pbr = document["materials"][0]["pbrMetallicRoughness"]
+    for factor in ("baseColorFactor", "metallicFactor", "roughnessFactor"):
+        assert pbr[factor] == source_pbr[factor]
+    with open(model_filepath, "rb") as source_file:
+        source_file.seek(source_layout.bin_offset)
+        source_bin = source_file.read(source_layout.bin_length)
+    with open(response["result"], "rb") as result_file:
+        result_file.seek(layout.bin_offset)
+        assert result_file.read(layout.bin_length) == source_bin
@@ -0,0 +1,99 @@
+import pytest
+from PIL import Image
+from pygltflib import GLTF2
+
+from src.data.glb import BinChunk, read_glb, read_gltf, write_glb
+from src.data.references import TextureReferences
+from src.data.repositories import GLBTexturesRepository
+from src.domain.entities import TexturesData, _SingleTextureChange
+
+# Material_00002 единолично владеет текстурой 2 и изображением 2
+# (см. benchmarks.generate), Material_00006 - без текстур.
+OWNER, OTHER, TEXTURE = "Material_00002", "Material_00006", 2
+
+# Слот другого материала, через который текстура становится общей, -
+# путь к объекту со ссылкой на текстуру.
+SLOTS = {
+    "occlusion": ("occlusionTexture",),
+    "emissive": ("emissiveTexture",),
+    "extension": ("extensions", "KHR_materials_clearcoat", "clearcoatTexture"),
+}
+
+
+@pytest.fixture(params=list(SLOTS))
+def slot(request):
+    return SLOTS[request.param]
+
+
+@pytest.fixture
+def shared_model_filepath(slot, model_filepath, tmp_path):
+    document, layout = read_glb(model_filepath)
+    material = next(m for m in document["materials"] if m["name"] == OTHER)
+    *parents, key = slot
+    for parent in parents:
+        material = material.setdefault(parent, {})
+    material[key] = {"index": TEXTURE}
+    if "extensions" in slot:
+        document["extensionsUsed"] = ["KHR_materials_clearcoat"]
+    filepath = str(tmp_path / "shared.glb")
+    write_glb(filepath, document, BinChunk.from_layout(layout), model_filepath)
+    return filepath
+
+
+def _image_data(gltf: GLTF2, image_idx: int) -> bytes:
+    view = gltf.bufferViews[gltf.images[image_idx].bufferView]
+    return gltf.binary_blob()[view.byteOffset:view.byteOffset + view.byteLength]
+
+
+def test_texture_shared_through_single_slot(shared_model_filepath, model_filepath):
+    gltf, _ = read_gltf(shared_model_filepath)
+    assert TextureReferences(gltf).is_texture_shared(TEXTURE)
+    gltf, _ = read_gltf(model_filepath)
+    assert not TextureReferences(gltf).is_texture_shared(TEXTURE)
+
+
+def _get_slot_texture(material, slot) -> int:
+    texture_info = material
+    for name in slot:
+        texture_info = (
+            texture_info[name] if isinstance(texture_info, dict)
+            else getattr(texture_info, name)
+        )
+    return texture_info["index"] if isinstance(texture_info, dict) else texture_info.index
+
+
+def test_shared_texture_is_not_overwritten(
+    shared_model_filepath, slot, result_dir, tmp_path
+):
+    texture_filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(texture_filepath)
+    with open(texture_filepath, "rb") as texture_file:
+        texture_data = texture_file.read()
+    source = GLTF2().load(shared_model_filepath)
+    source_image = _image_data(source, source.textures[TEXTURE].source)
+
+    response = GLBTexturesRepository()._change_textures(
+        TexturesData(
+            source_glbfilepath=shared_model_filepath,
+            result_filepath=result_dir,
+            files=[
+                _SingleTextureChange(
+                    texturefilepath=texture_filepath,
+                    materials=[
+                        {"name": OWNER, "pbrMetallicRoughness": {
+                            "baseColorTexture": {}}},
+                    ],
+                )
+            ],
+        )
+    )
+
+    result = GLTF2().load(response["result"])
+    materials = {material.name: material for material in result.materials}
+    owner_texture = materials[OWNER].pbrMetallicRoughness.baseColorTexture.index
+    assert owner_texture != TEXTURE
+    assert _image_data(result, result.textures[owner_texture].source) == texture_data
+    # Другой материал по-прежнему ссылается на исходную текстуру с исходным
+    # изображением.
+    assert _get_slot_texture(materials[OTHER], slot) == TEXTURE
+    assert _image_data(result, result.textures[TEXTURE].source) == source_image
@@ -0,0 +1,100 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from src import app
+from src.presentation.requests import (MaterialsRequestModel,
+                                       TexturesRequestModel)
+
+
+def test_only_sent_fields_reach_entity():
+    request_model = MaterialsRequestModel.model_validate_json(
+        orjson.dumps(
+            {
+                "source_filepath": "/models/model.glb",
+                "result_filepath": "/results",
+                "materials": [
+                    {
+                        "name": "Fabric",
+                        "normalTexture": {"index": 1},
+                        "emissiveFactor": [1, 0, 0],
+                    }
+                ],
+            }
+        )
+    )
+
+    data_object = request_model.to_entity()
+
+    # Значения по умолчанию моделей (например, scale) не попадают
+    # в изменения, а поля вне моделей пропускаются как есть.
+    assert data_object.materials == [
+        {"name": "Fabric", "normalTexture": {"index": 1}, "emissiveFactor": [1, 0, 0]}
+    ]
+    assert data_object.operations == []
+    assert data_object.dry_run is False
+
+
+def test_texture_changes_reach_entity():
+    request_model = TexturesRequestModel.model_validate_json(
+        orjson.dumps(
+            {
+                "source_glbfilepath": "/models/model.glb",
+                "result_filepath": "/results",
+                "files": [
+                    {
+                        "texturefilepath": "/textures/wood.png",
+                        "materials": [{"name": "Fabric", "normalTexture": {}}],
+                    }
+                ],
+                "processing": {"max_size": 512},
+            }
+        )
+    )
+
+    data_object = request_model.to_entity()
+
+    assert data_object.files[0].materials == [
+        {"name": "Fabric", "normalTexture": {}}
+    ]
+    assert data_object.processing.max_size == 512
+    assert data_object.processing.quality == 85
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        {"factor": "metallicFactor", "op": "clamp", "value": [1, 0]},
+        {"factor": "metallicFactor", "op": "hsv_shift", "value": [0, 0, 0]},
+        {"factor": "baseColorFactor", "op": "multiply", "value": [1, 1]},
+        {"factor": "baseColorFactor", "op": "set", "value": 1, "match": "regex",
+         "pattern": "("},
+    ],
+)
+def test_invalid_operation(operation):
+    with pytest.raises(ValidationError):
+        MaterialsRequestModel.model_validate(
+            {
+                "source_filepath": "/models/model.glb",
+                "result_filepath": "/results",
+                "operations": [{"pattern": "*", **operation}],
+            }
+        )
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"{", b'{"source_filepath": "/models/model.glb"}', b'{"materials": 1}'],
+)
+def test_invalid_body_is_unprocessable(body):
+    with TestClient(app) as client:
+        response = client.post(
+            "/glbeditor/parameters",
+            content=body,
+            headers={"Content-Type": "application/json"},
+        )
+
+    assert response.status_code == 422
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["description"].startswith("Ошибка валидации")
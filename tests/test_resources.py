@@ -0,0 +1,187 @@
+import json
+import os
+import struct
+from urllib.parse import unquote
+
+import pytest
+from PIL import Image
+
+from benchmarks.generate import make_png
+from src.core.exceptions import GLBEditorException
+from src.core.settings import settings
+from src.data import repositories
+from src.data.repositories import GLBParamsRepository, GLBTexturesRepository
+from src.data.resources import get_resources_directory
+from src.domain.entities import (PropertiesData, TexturesData,
+                                 _SingleTextureChange)
+
+TRIANGLE = struct.pack("<9f", 0, 0, 0, 1, 0, 0, 0, 1, 0)
+# Изображения исходного файла: одно внутри его директории, два - вне ее
+# с одинаковыми именами файлов.
+IMAGES = ["textures/img 0.png", "../shared/img.png", "../other/img.png"]
+
+
+@pytest.fixture
+def link_mode(monkeypatch):
+    monkeypatch.setattr(settings.glb, "gltf_resources", "link")
+
+
+@pytest.fixture
+def gltf_filepath(tmp_path) -> str:
+    # GLTF-файл с буфером и изображениями в отдельных файлах. Каждый
+    # материал единолично владеет своей текстурой.
+    directory = tmp_path / "source"
+    for number, image in enumerate(IMAGES):
+        image_filepath = directory / image
+        image_filepath.parent.mkdir(parents=True, exist_ok=True)
+        image_filepath.write_bytes(make_png(4, number))
+    (directory / "scene.bin").write_bytes(TRIANGLE)
+    document = {
+        "asset": {"version": "2.0"},
+        "buffers": [{"uri": "scene.bin", "byteLength": len(TRIANGLE)}],
+        "bufferViews": [{"buffer": 0, "byteLength": len(TRIANGLE)}],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": 3, "type": "VEC3"}
+        ],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}}]}],
+        "images": [{"uri": image.replace(" ", "%20")} for image in IMAGES],
+        "textures": [{"source": number} for number in range(len(IMAGES))],
+        "materials": [
+            {
+                "name": f"Material_{number}",
+                "pbrMetallicRoughness": {"baseColorTexture": {"index": number}},
+            }
+            for number in range(len(IMAGES))
+        ],
+    }
+    filepath = directory / "scene.gltf"
+    filepath.write_text(json.dumps(document))
+    return str(filepath)
+
+
+@pytest.fixture
+def texture_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(filepath)
+    return filepath
+
+
+def _change_texture(gltf_filepath, result_dir, texture_filepath):
+    # Изображение textures/img 0.png после замены не нужно ни одной текстуре,
+    # и сжатие удаляет его из документа.
+    return GLBTexturesRepository()._change_textures(
+        TexturesData(
+            source_glbfilepath=gltf_filepath,
+            result_filepath=result_dir,
+            files=[
+                _SingleTextureChange(
+                    texturefilepath=texture_filepath,
+                    materials=[
+                        {"name": "Material_0", "pbrMetallicRoughness": {
+                            "baseColorTexture": {}}},
+                    ],
+                )
+            ],
+        )
+    )
+
+
+def _list_files(directory: str) -> set:
+    return {
+        os.path.relpath(os.path.join(root, name), directory)
+        for root, _, names in os.walk(directory)
+        for name in names
+    }
+
+
+def test_only_resources_left_after_compaction_are_linked(
+    link_mode, gltf_filepath, result_dir, texture_filepath
+):
+    result_filepath = _change_texture(gltf_filepath, result_dir, texture_filepath)[
+        "result"
+    ]
+
+    with open(result_filepath) as result_file:
+        document = json.load(result_file)
+    uris = [document["buffers"][0]["uri"]] + [
+        image["uri"] for image in document["images"]
+    ]
+    resources_directory = get_resources_directory(result_filepath)
+    assert len(_list_files(resources_directory)) == len(uris) == 4
+    assert "textures/img 0.png" not in _list_files(resources_directory)
+
+    source_directory = os.path.dirname(gltf_filepath)
+    expected = [
+        os.path.join(source_directory, "scene.bin"),
+        texture_filepath,
+        *(os.path.join(source_directory, image) for image in IMAGES[1:]),
+    ]
+    result_directory = os.path.dirname(result_filepath)
+    contents = []
+    for uri in uris:
+        with open(os.path.join(result_directory, unquote(uri)), "rb") as file:
+            contents.append(file.read())
+    # Изображения с одинаковыми именами из разных директорий не затирают
+    # друг друга.
+    for filepath in expected:
+        with open(filepath, "rb") as file:
+            assert file.read() in contents
+    assert len(set(contents)) == len(contents)
+
+
+def test_resources_are_removed_if_write_fails(
+    link_mode, gltf_filepath, result_dir, texture_filepath, monkeypatch
+):
+    def fail(gltf, filepath):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(repositories, "_save_gltf", fail)
+    with pytest.raises(GLBEditorException):
+        _change_texture(gltf_filepath, result_dir, texture_filepath)
+
+    # Ни итогового файла, ни ресурсов, ни временных файлов.
+    assert _list_files(result_dir) == set()
+
+
+def test_dry_run_uses_result_relative_uri(
+    link_mode, gltf_filepath, result_dir, texture_filepath
+):
+    response = GLBTexturesRepository()._change_textures(
+        TexturesData(
+            source_glbfilepath=gltf_filepath,
+            result_filepath=result_dir,
+            files=[
+                _SingleTextureChange(
+                    texturefilepath=texture_filepath,
+                    materials=[{"name": "Material_0", "normalTexture": {}}],
+                )
+            ],
+            dry_run=True,
+        )
+    )
+    image = next(
+        change["new"] for change in response["changes"]
+        if change["path"].startswith("/images/")
+    )
+    assert image["uri"] == "scene_<digest>_files/<sha256>.png"
+    assert image["mimeType"] == "image/png"
+
+
+@pytest.mark.parametrize("missing", ["scene.bin", IMAGES[1]])
+def test_missing_resource_is_bad_request(
+    gltf_filepath, result_dir, monkeypatch, missing
+):
+    monkeypatch.setattr(settings.glb, "gltf_resources", "embed")
+    os.remove(os.path.join(os.path.dirname(gltf_filepath), missing))
+
+    with pytest.raises(GLBEditorException) as error:
+        GLBParamsRepository()._change_parameters(
+            PropertiesData(
+                source_filepath=gltf_filepath,
+                result_filepath=result_dir,
+                materials=[{"name": "Material_0", "doubleSided": True}],
+            )
+        )
+
+    assert error.value.status_code == 400
+    assert os.path.basename(missing) in error.value.detail
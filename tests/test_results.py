@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from PIL import Image
+
+from src.core import metrics
+from src.data.repositories import GLBParamsRepository, GLBTexturesRepository
+from src.domain.entities import (PropertiesData, TexturesData,
+                                 _SingleTextureChange)
+
+
+@pytest.fixture
+def texture_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(filepath)
+    return filepath
+
+
+def _change_textures(model_filepath, result_dir, texture_filepath):
+    request = TexturesData(
+        source_glbfilepath=model_filepath,
+        result_filepath=result_dir,
+        files=[
+            _SingleTextureChange(
+                texturefilepath=texture_filepath,
+                materials=[{"name": "Material_00000", "normalTexture": {}}],
+            )
+        ],
+    )
+    return GLBTexturesRepository()._change_textures(request)
+
+
+def _change_parameters(model_filepath, result_dir):
+    request = PropertiesData(
+        source_filepath=model_filepath,
+        result_filepath=result_dir,
+        materials=[
+            {"name": "Material_00001", "pbrMetallicRoughness": {"metallicFactor": 1.0}}
+        ],
+    )
+    return GLBParamsRepository()._change_parameters(request)
+
+
+def test_replayed_textures_edit_returns_same_response(
+    model_filepath, result_dir, texture_filepath
+):
+    first_record = metrics.start_record()
+    response = _change_textures(model_filepath, result_dir, texture_filepath)
+    assert "bytes_saved" in response
+    assert "load" in first_record.stages and "save" in first_record.stages
+
+    record = metrics.start_record()
+    assert _change_textures(model_filepath, result_dir, texture_filepath) == response
+    # Модель не загружалась: этапы исходной правки отдаются отдельно и в
+    # гистограммы не попадают.
+    assert "load" not in record.stages
+    assert record.replayed_stages["load"] == first_record.stages["load"]
+    assert "load;desc=replay;dur=" in metrics.format_server_timing(record, 0.1)
+
+
+def test_replayed_parameters_edit_returns_same_response(model_filepath, result_dir):
+    metrics.start_record()
+    response = _change_parameters(model_filepath, result_dir)
+
+    record = metrics.start_record()
+    assert _change_parameters(model_filepath, result_dir) == response
+    assert "save" in record.replayed_stages and "save" not in record.stages
+
+
+def test_result_without_replay_record(model_filepath, result_dir, texture_filepath):
+    # Итоговый файл, записанный без записи повтора (прежней версией),
+    # по-прежнему возвращается.
+    response = _change_textures(model_filepath, result_dir, texture_filepath)
+    for filename in os.listdir(result_dir):
+        if filename.endswith(".replay.json"):
+            os.remove(os.path.join(result_dir, filename))
+
+    assert _change_textures(model_filepath, result_dir, texture_filepath) == {
+        "status": "Готово",
+        "result": response["result"],
+    }
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.core.singleflight import SingleFlight
+from src.data.results import result_lock
+
+
+def test_identical_calls_are_coalesced():
+    calls = []
+
+    async def call(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return [value]
+
+    async def scenario():
+        single_flight = SingleFlight()
+        results = await asyncio.gather(
+            # Порядок ключей словаря не важен.
+            single_flight.run(("edit", {"a": 1, "b": 2}), lambda: call(1)),
+            single_flight.run(("edit", {"b": 2, "a": 1}), lambda: call(2)),
+            single_flight.run(("edit", {"a": 1, "b": 3}), lambda: call(3)),
+        )
+        # Завершенная правка не запоминается: повтор выполняется заново.
+        results.append(
+            await single_flight.run(("edit", {"a": 1, "b": 2}), lambda: call(4))
+        )
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert calls == [1, 3, 4]
+    assert results == [[1], [1], [3], [4]]
+    # Все ожидающие получают один и тот же объект результата.
+    assert results[0] is results[1]
+
+
+def test_error_is_shared():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def scenario():
+        single_flight = SingleFlight()
+        return await asyncio.gather(
+            single_flight.run("key", call),
+            single_flight.run("key", call),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        single_flight = SingleFlight()
+        first = asyncio.ensure_future(single_flight.run("key", call))
+        second = asyncio.ensure_future(single_flight.run("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_result_lock_serializes_writers(tmp_path):
+    result_filepath = str(tmp_path / "model_0123.glb")
+    events = []
+    locked = threading.Event()
+
+    def write(name: str) -> None:
+        with result_lock(result_filepath):
+            events.append(f"{name}:start")
+            locked.set()
+            time.sleep(0.05)
+            events.append(f"{name}:end")
+
+    first = threading.Thread(target=write, args=("first",))
+    first.start()
+    locked.wait(5)
+    second = threading.Thread(target=write, args=("second",))
+    second.start()
+    first.join()
+    second.join()
+
+    assert events == ["first:start", "first:end", "second:start", "second:end"]
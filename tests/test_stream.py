@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import app
+from src.core.settings import settings
+
+CHANGES = json.dumps({"materials": []})
+BOUNDARY = "glbeditor-test"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings.stream, "max_bytes", 64 * 1024)
+    with TestClient(app) as client:
+        yield client
+
+
+def _multipart_chunks(model: bytes, chunk_size: int = 8192):
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="changes"\r\n\r\n'
+        f"{CHANGES}\r\n--{BOUNDARY}\r\nContent-Disposition: form-data; "
+        'name="model"; filename="model.glb"\r\n'
+        "Content-Type: model/gltf-binary\r\n\r\n"
+    ).encode()
+    for offset in range(0, len(model), chunk_size):
+        yield model[offset:offset + chunk_size]
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _post_chunked(client, model: bytes):
+    # Тело-генератор отправляется без Content-Length (chunked).
+    return client.post(
+        "/glbeditor/stream/parameters",
+        content=_multipart_chunks(model),
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+
+
+def test_stream_edits_model(client, model_filepath):
+    with open(model_filepath, "rb") as model_file:
+        model = model_file.read()
+    response = _post_chunked(client, model)
+    assert response.status_code == 200
+    assert response.content[:4] == b"glTF"
+
+
+def test_chunked_body_over_limit_is_rejected(client):
+    # TestClient читает тело запроса целиком до вызова приложения, поэтому
+    # приложение вызывается напрямую: так видно, сколько тела оно прочитало.
+    chunks = list(_multipart_chunks(b"0" * settings.stream.max_bytes * 4))
+    received = 0
+    messages = []
+
+    async def receive():
+        nonlocal received
+        if received == len(chunks):
+            return {"type": "http.disconnect"}
+        received += 1
+        return {
+            "type": "http.request",
+            "body": chunks[received - 1],
+            "more_body": received < len(chunks),
+        }
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/glbeditor/stream/parameters",
+        "raw_path": b"/glbeditor/stream/parameters",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"transfer-encoding", b"chunked"),
+        ],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+        "app": app,
+    }
+    asyncio.run(app(scope, receive, send))
+
+    assert messages[0]["status"] == 413
+    # Тело не дочитывается до конца после превышения ограничения.
+    assert sum(len(chunk) for chunk in chunks[:received]) < (
+        settings.stream.max_bytes + 2 * len(chunks[1])
+    )
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-1", "1e3"])
+def test_invalid_content_length(client, content_length):
+    response = client.post(
+        "/glbeditor/stream/parameters",
+        content=b"",
+        headers={
+            "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+            "Content-Length": content_length,
+        },
+    )
+    assert response.status_code == 400
@@ -0,0 +1,109 @@
+import orjson
+import pytest
+from PIL import Image
+
+from src.core.settings import settings
+from src.data.glb import read_glb
+from src.data.repositories import GLBTexturesRepository
+from src.domain.entities import (TextureProcessing, TexturesData,
+                                 _SingleTextureChange)
+
+
+@pytest.fixture
+def webp_filepath(tmp_path) -> str:
+    filepath = str(tmp_path / "texture.webp")
+    Image.new("RGB", (32, 32), (200, 30, 30)).save(filepath, format="WEBP")
+    return filepath
+
+
+def _change_textures(model_filepath, result_dir, texture_filepath, **options):
+    request = TexturesData(
+        source_glbfilepath=model_filepath,
+        result_filepath=result_dir,
+        files=[
+            _SingleTextureChange(
+                texturefilepath=texture_filepath,
+                materials=[
+                    {"name": "Material_00000", "normalTexture": {}},
+                    {"name": "Material_00006", "normalTexture": {}},
+                ],
+            )
+        ],
+        **options,
+    )
+    return GLBTexturesRepository()._change_textures(request)
+
+
+def _assert_webp_declared(document: dict) -> None:
+    assert "EXT_texture_webp" in document["extensionsUsed"]
+    assert "EXT_texture_webp" in document["extensionsRequired"]
+    for name in ("Material_00000", "Material_00006"):
+        material = next(m for m in document["materials"] if m["name"] == name)
+        texture = document["textures"][material["normalTexture"]["index"]]
+        # WebP-изображение не может быть source текстуры.
+        assert "source" not in texture
+        image = document["images"][texture["extensions"]["EXT_texture_webp"]["source"]]
+        assert image["mimeType"] == "image/webp"
+    for texture in document["textures"]:
+        if "source" in texture:
+            assert document["images"][texture["source"]]["mimeType"] != "image/webp"
+
+
+@pytest.mark.parametrize(
+    "processing",
+    [None, TextureProcessing(max_size=16), TextureProcessing(format="webp")],
+    ids=["without-processing", "format-none", "format-webp"],
+)
+def test_webp_texture_declares_extension(
+    model_filepath, result_dir, webp_filepath, processing
+):
+    response = _change_textures(
+        model_filepath, result_dir, webp_filepath, processing=processing
+    )
+    document, _ = read_glb(response["result"])
+    _assert_webp_declared(document)
+
+
+def test_png_texture_does_not_declare_webp(model_filepath, result_dir, tmp_path):
+    png_filepath = str(tmp_path / "texture.png")
+    Image.new("RGB", (32, 32), (30, 200, 30)).save(png_filepath)
+    response = _change_textures(
+        model_filepath, result_dir, png_filepath, processing=TextureProcessing(max_size=16)
+    )
+    document, _ = read_glb(response["result"])
+    assert "EXT_texture_webp" not in document.get("extensionsUsed", [])
+
+
+def test_dry_run_declares_webp_extension(model_filepath, result_dir, webp_filepath):
+    response = _change_textures(
+        model_filepath,
+        result_dir,
+        webp_filepath,
+        processing=TextureProcessing(max_size=16),
+        dry_run=True,
+    )
+    paths = {change["path"]: change["new"] for change in response["changes"]}
+    assert "EXT_texture_webp" in paths["/extensionsUsed"]
+    assert "EXT_texture_webp" in paths["/extensionsRequired"]
+
+
+@pytest.mark.parametrize("embedding", ["bufferview", "datauri"])
+def test_dry_run_does_not_expose_texture_paths(
+    model_filepath, result_dir, webp_filepath, embedding, monkeypatch
+):
+    monkeypatch.setattr(settings.glb, "textures_embedding", embedding)
+    response = _change_textures(
+        model_filepath, result_dir, webp_filepath, dry_run=True
+    )
+    assert webp_filepath not in orjson.dumps(response).decode()
+    images = [
+        change["new"] for change in response["changes"]
+        if change["path"].startswith("/images/")
+    ]
+    assert len(images) == 1
+    if embedding == "bufferview":
+        assert "uri" not in images[0]
+        assert images[0]["mimeType"] == "image/webp"
+        assert isinstance(images[0]["bufferView"], int)
+    else:
+        assert images[0]["uri"].startswith("data:image/webp;base64,")